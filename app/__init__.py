@@ -1,5 +1,8 @@
+import os
+
 from flask import Flask, render_template
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event
 from flask_bcrypt import Bcrypt
 from flask_login import LoginManager
 from flask_migrate import Migrate
@@ -11,20 +14,69 @@ login_manager.login_view = 'auth.login'
 login_manager.login_message_category = 'info'
 migrate = Migrate()
 
-def create_app():
+def _engine_options(app):
+    options = dict(app.config.get('SQLALCHEMY_ENGINE_OPTIONS') or {})
+    if app.config['SQLALCHEMY_DATABASE_URI'].startswith('sqlite'):
+        # In-memory SQLite can't use a sized pool, and the pysqlite driver has
+        # its own lock timeout (seconds) on top of PRAGMA busy_timeout.
+        if app.config['SQLALCHEMY_DATABASE_URI'] in ('sqlite://', 'sqlite:///:memory:'):
+            for key in ('pool_size', 'max_overflow', 'pool_timeout'):
+                options.pop(key, None)
+        busy_ms = app.config.get('SQLITE_PRAGMAS', {}).get('busy_timeout', 5000)
+        options.setdefault('connect_args', {}).setdefault('timeout', busy_ms / 1000)
+    return options
+
+
+def _apply_sqlite_pragmas(app):
+    pragmas = app.config.get('SQLITE_PRAGMAS') or {}
+    if db.engine.dialect.name != 'sqlite' or not pragmas:
+        return
+
+    @event.listens_for(db.engine, 'connect')
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name}={value}')
+        cursor.close()
+
+
+def create_app(config_name=None):
+    from .config import config
+
     app = Flask(__name__, instance_relative_config=False)
-    app.config['SECRET_KEY'] = 'a_very_secret_key_that_you_should_change'
-    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///../instance/auth_app.db'
-    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-    
+    app.config.from_object(config[config_name or os.environ.get('APP_CONFIG', 'default')])
+    # FLASK_* environment variables override the profile (values parsed as JSON when possible).
+    app.config.from_prefixed_env()
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = _engine_options(app)
+
     db.init_app(app)
     bcrypt.init_app(app)
     login_manager.init_app(app)
     migrate.init_app(app, db)
 
+    from .counters import view_counter, ad_impressions
+    view_counter.init_app(app, 'VIEW_COUNTER')
+    ad_impressions.init_app(app, 'AD_IMPRESSIONS')
+    from .query_counter import query_counter
+    query_counter.init_app(app)
+    from .response_cache import response_cache
+    response_cache.init_app(app)
+    from .metrics import request_metrics
+    request_metrics.init_app(app)
+    from .notifications.outbox import outbox_worker
+    outbox_worker.init_app(app)
+    from .jobs import scheduler
+    scheduler.init_app(app)
+
     with app.app_context():
+        _apply_sqlite_pragmas(app)
+
         # Import models here to ensure they are registered with SQLAlchemy
         from . import models
+        from .refdata import refdata
+        refdata.init_app(app)
+        # Before the first connection: registers geo_distance_km() on SQLite connections.
+        from . import geo
 
         # Register Blueprints
         from app.users.routes import users_bp
@@ -43,6 +95,20 @@ def create_app():
         app.register_blueprint(forum_bp)
         from app.messages.routes import messages_bp
         app.register_blueprint(messages_bp)
+        from app.ads.routes import ads_bp
+        app.register_blueprint(ads_bp)
+        from app.ads.pool import ad_pool
+        ad_pool.init_app(app)
+        from app.directory.routes import directory_bp
+        app.register_blueprint(directory_bp)
+
+        from .aggregates import reconcile_command
+        app.cli.add_command(reconcile_command)
+        from .notifications.outbox import notifications_cli
+        app.cli.add_command(notifications_cli)
+        app.cli.add_command(geo.geo_cli)
+        from .jobs import jobs_cli
+        app.cli.add_command(jobs_cli)
 
         # IMPORTANT: populate_db() should NOT be called here.
         # It should be run as a separate script or Flask CLI command
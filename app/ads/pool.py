@@ -0,0 +1,106 @@
+# app/ads/pool.py
+
+import random
+import threading
+import time
+from collections import namedtuple
+from datetime import datetime
+
+from ..models import Ad
+from ..model_events import after_commit_of
+
+# In-memory set of currently eligible ads (active and inside their date
+# window), so serving an ad doesn't run ORDER BY RANDOM() over the ads table.
+#
+# The pool is rebuilt when:
+#   * an Ad is created, edited or deleted in this process (after commit),
+#   * the next start_date/end_date boundary passes, or
+#   * AD_POOL_TTL seconds have gone by, so other workers' edits show up too.
+#
+# Picks are O(1) with Walker's alias method over the ads' weights.
+
+AdSlot = namedtuple('AdSlot', 'id image_url link_url weight')
+
+_Snapshot = namedtuple('_Snapshot', 'slots prob alias valid_until')
+
+
+def build_alias_table(weights):
+    """Walker/Vose alias table: returns (prob, alias) lists for O(1) sampling."""
+    n = len(weights)
+    total = float(sum(weights))
+    prob = [w * n / total for w in weights]
+    alias = [0] * n
+    small = [i for i, p in enumerate(prob) if p < 1.0]
+    large = [i for i, p in enumerate(prob) if p >= 1.0]
+    while small and large:
+        s, l = small.pop(), large.pop()
+        alias[s] = l
+        prob[l] = prob[l] + prob[s] - 1.0
+        (small if prob[l] < 1.0 else large).append(l)
+    for i in small + large:
+        prob[i] = 1.0
+    return prob, alias
+
+
+class AdPool:
+
+    def __init__(self, ttl=60):
+        self.ttl = ttl
+        self._snapshot = None
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.ttl = app.config.get('AD_POOL_TTL', self.ttl)
+
+    def invalidate(self):
+        self._snapshot = None
+
+    def refresh(self):
+        """Rebuild the pool now (jobs.refresh_ad_pool); returns the number of eligible ads."""
+        snapshot = self._load()
+        with self._lock:
+            self._snapshot = snapshot
+        return len(snapshot.slots)
+
+    def pick(self):
+        """Return a random eligible AdSlot (weighted), or None if there are none."""
+        snapshot = self._current()
+        if not snapshot.slots:
+            return None
+        i = random.randrange(len(snapshot.slots))
+        if random.random() >= snapshot.prob[i]:
+            i = snapshot.alias[i]
+        return snapshot.slots[i]
+
+    def _current(self):
+        snapshot = self._snapshot
+        if snapshot is not None and snapshot.valid_until > time.monotonic():
+            return snapshot
+        with self._lock:
+            snapshot = self._snapshot
+            if snapshot is None or snapshot.valid_until <= time.monotonic():
+                snapshot = self._snapshot = self._load()
+        return snapshot
+
+    def _load(self):
+        now = datetime.utcnow()
+        active = Ad.query.filter(Ad.is_active == True, Ad.end_date >= now).all()
+        eligible = [ad for ad in active if ad.start_date <= now]
+        slots = [AdSlot(ad.id, ad.image_url, ad.link_url, max(ad.weight or 1, 1)) for ad in eligible]
+        prob, alias = build_alias_table([s.weight for s in slots]) if slots else ([], [])
+
+        # Rebuild at the next moment an ad enters or leaves its window.
+        boundaries = [ad.start_date for ad in active if ad.start_date > now]
+        boundaries += [ad.end_date for ad in eligible]
+        ttl = self.ttl
+        if boundaries:
+            ttl = min(ttl, max((min(boundaries) - now).total_seconds(), 1))
+        return _Snapshot(slots, prob, alias, time.monotonic() + ttl)
+
+
+ad_pool = AdPool()
+
+
+@after_commit_of(Ad)
+def _ads_changed():
+    ad_pool.invalidate()
@@ -1,9 +1,11 @@
 # app/ads/routes.py
 
-from flask import Blueprint, render_template, redirect, url_for, flash, request
+from flask import Blueprint, render_template, redirect, url_for, flash, request, jsonify
 from flask_login import login_required, current_user
 from ..models import Ad
 from .. import db
+from ..counters import ad_impressions
+from .pool import ad_pool
 from datetime import datetime
 
 ads_bp = Blueprint('ads', __name__, url_prefix='/ads')
@@ -34,7 +36,8 @@ def new_ad():
                 image_url=image_url, 
                 link_url=link_url, 
                 start_date=datetime.fromisoformat(start_date), 
-                end_date=datetime.fromisoformat(end_date)
+                end_date=datetime.fromisoformat(end_date),
+                weight=request.form.get('weight', 1, type=int)
             )
             db.session.add(ad)
             db.session.commit()
@@ -55,6 +58,7 @@ def edit_ad(ad_id):
         ad.start_date = datetime.fromisoformat(request.form.get('start_date'))
         ad.end_date = datetime.fromisoformat(request.form.get('end_date'))
         ad.is_active = 'is_active' in request.form
+        ad.weight = request.form.get('weight', ad.weight, type=int)
         db.session.commit()
         flash('Ad updated successfully!', 'success')
         return redirect(url_for('ads.manage_ads'))
@@ -72,4 +76,13 @@ def delete_ad(ad_id):
     flash('Ad deleted successfully!', 'success')
     return redirect(url_for('ads.manage_ads'))
 
+@ads_bp.route('/serve')
+def serve_ad():
+    # Lets response-cached pages rotate ads client-side.
+    ad = ad_pool.pick()
+    if ad is None:
+        return jsonify({}), 204
+    ad_impressions.increment(ad.id)
+    return jsonify({'id': ad.id, 'image_url': ad.image_url, 'link_url': ad.link_url})
+
 # Can you implement the backend stuff on the frontend? for example: ads, directory, forum, messages, subscriptions, 
\ No newline at end of file
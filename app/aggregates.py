@@ -0,0 +1,70 @@
+# app/aggregates.py
+
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import case, func, select
+
+from . import db
+from .models import Business, ForumComment, ForumPost, Review, User
+
+# Denormalised counters kept next to the rows they describe, so pages can
+# show "4.5 stars (12 reviews)" or "8 replies, last 2h ago" without loading
+# every review/comment. The record_* helpers are called from the routes that
+# add the child row, before the same commit, and use SQL-side increments
+# (col = col + n) so concurrent writers don't lose updates.
+# `flask reconcile-aggregates` recomputes everything from scratch.
+
+
+def record_business_review(business, rating):
+    business.review_count = Business.review_count + 1
+    business.rating_sum = Business.rating_sum + rating
+    # The right-hand sides all see the row's old values.
+    business.rating_avg = (Business.rating_sum + rating) * 1.0 / (Business.review_count + 1)
+
+
+def record_seller_review(seller, rating):
+    seller.seller_review_count = User.seller_review_count + 1
+    seller.seller_rating_sum = User.seller_rating_sum + rating
+
+
+def record_forum_comment(post, timestamp):
+    post.comment_count = ForumPost.comment_count + 1
+    post.last_activity = timestamp
+
+
+def reconcile():
+    """Recompute every aggregate column with set-based UPDATEs."""
+    rating_total = func.coalesce(func.sum(Review.rating), 0)
+
+    business_reviews = select(func.count(Review.id)).where(Review.business_id == Business.id)
+    db.session.execute(db.update(Business).values(
+        review_count=business_reviews.scalar_subquery(),
+        rating_sum=business_reviews.with_only_columns(rating_total).scalar_subquery(),
+    ))
+    db.session.execute(db.update(Business).values(
+        rating_avg=case((Business.review_count > 0, Business.rating_sum * 1.0 / Business.review_count), else_=0)
+    ))
+
+    seller_reviews = select(func.count(Review.id)).where(Review.seller_id == User.id)
+    db.session.execute(db.update(User).values(
+        seller_review_count=seller_reviews.scalar_subquery(),
+        seller_rating_sum=seller_reviews.with_only_columns(rating_total).scalar_subquery(),
+    ))
+
+    comments = select(func.count(ForumComment.id)).where(ForumComment.post_id == ForumPost.id)
+    db.session.execute(db.update(ForumPost).values(
+        comment_count=comments.scalar_subquery(),
+        last_activity=func.coalesce(
+            comments.with_only_columns(func.max(ForumComment.timestamp)).scalar_subquery(),
+            ForumPost.timestamp
+        ),
+    ))
+    db.session.commit()
+
+
+@click.command('reconcile-aggregates')
+@with_appcontext
+def reconcile_command():
+    """Recompute review/rating and forum comment aggregates."""
+    reconcile()
+    click.echo('Aggregates reconciled.')
@@ -0,0 +1,113 @@
+# app/counters.py
+
+import atexit
+import threading
+from collections import Counter
+
+from sqlalchemy import bindparam, func
+
+
+class BufferedCounter:
+    """Accumulates integer increments in memory and writes them in batches.
+
+    Instead of a write transaction per event (e.g. one per page view), callers
+    do counter.increment(row_id) and the pending deltas are flushed as a
+    single executemany of
+
+        UPDATE <table> SET <column> = COALESCE(<column>, 0) + :delta WHERE id = :row_id
+
+    every flush_interval seconds, as soon as max_pending distinct rows are
+    waiting, and once more at interpreter shutdown. Increments from all
+    threads are merged under a lock, so concurrent views are never lost.
+    """
+
+    def __init__(self, table_name, column_name, flush_interval=5.0, max_pending=500):
+        self.table_name = table_name
+        self.column_name = column_name
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.app = None
+        self._pending = Counter()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def init_app(self, app, prefix):
+        """Read <prefix>_FLUSH_INTERVAL / <prefix>_MAX_PENDING from config."""
+        self.app = app
+        self.flush_interval = app.config.get(f'{prefix}_FLUSH_INTERVAL', self.flush_interval)
+        self.max_pending = app.config.get(f'{prefix}_MAX_PENDING', self.max_pending)
+        atexit.register(self.shutdown)
+
+    def increment(self, key, n=1):
+        with self._lock:
+            self._pending[key] += n
+            full = len(self._pending) >= self.max_pending
+        self._ensure_thread()
+        if full:
+            self.flush()
+
+    def pending(self, key):
+        """Increments for key that have not been written yet."""
+        with self._lock:
+            return self._pending.get(key, 0)
+
+    def flush(self):
+        """Write all pending increments. Returns the number of rows updated."""
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, Counter()
+            if not batch:
+                return 0
+            try:
+                self._write(batch)
+            except Exception:
+                # Put the deltas back so the next flush retries them.
+                with self._lock:
+                    self._pending.update(batch)
+                raise
+            return len(batch)
+
+    def _write(self, batch):
+        from . import db
+
+        table = db.metadata.tables[self.table_name]
+        column = table.c[self.column_name]
+        stmt = (
+            table.update()
+            .where(table.c.id == bindparam('row_id'))
+            .values({column: func.coalesce(column, 0) + bindparam('delta')})
+        )
+        params = [{'row_id': key, 'delta': n} for key, n in batch.items()]
+        with self.app.app_context():
+            with db.engine.begin() as connection:
+                connection.execute(stmt, params)
+
+    def _ensure_thread(self):
+        # Started lazily so CLI commands and migrations don't spawn a thread.
+        if self._thread is not None or self.app is None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='buffered-counter', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception:
+                self.app.logger.exception('Failed to flush %s.%s', self.table_name, self.column_name)
+
+    def shutdown(self):
+        self._stop.set()
+        if self.app is not None:
+            self.flush()
+
+
+# Listing page views, see listings.view_listing.
+view_counter = BufferedCounter('listings', 'views_count')
+
+# Ad impressions, see ads.pool and main.index.
+ad_impressions = BufferedCounter('ads', 'impressions')
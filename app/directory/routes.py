@@ -2,21 +2,81 @@
 
 from flask import Blueprint, render_template, redirect, url_for, flash, request
 from flask_login import login_required, current_user
-from ..models import Business, Review, User
+import click
+from sqlalchemy import false
+from ..models import Business, BusinessCategory, Review, User
 from .. import db
+from .. import geo, loading, refdata
+from ..aggregates import record_business_review
+from ..model_events import after_commit_of, mark_changed
+from ..pagination import keyset_paginate, cached_count, clear_count_cache
+from ..upsert import insert_ignoring_duplicates
+from . import search
+from ..notifications.outbox import enqueue
 
 directory_bp = Blueprint('directory', __name__, url_prefix='/directory')
 
 @directory_bp.route('/')
 def businesses():
-    businesses = Business.query.all()
-    return render_template('directory/businesses.html', title='Business Directory', businesses=businesses)
+    query = request.args.get('q', '').strip()
+    category_id = request.args.get('category_id', type=int)
+    businesses_query = Business.query.options(*loading.BUSINESS_ROW)
+
+    # Keyword search through businesses_fts (see search.py); rank is None on the LIKE fallback.
+    rank = None
+    if query:
+        businesses_query, rank = search.search(businesses_query, query)
+    if category_id:
+        businesses_query = businesses_query.filter(Business.category_id == category_id)
+    # near=lat,lng or a place name, radius in km (see geo.py)
+    near_error = None
+    try:
+        near = geo.parse_near(request.args)
+    except ValueError as e:
+        # Unknown place: no results rather than every business.
+        near, near_error = None, str(e)
+        businesses_query = businesses_query.filter(false())
+    distance = None
+    if near:
+        businesses_query = businesses_query.filter(geo.near_condition(Business, near))
+        distance = geo.distance(Business, near)
+
+    sort_keys = {
+        'name': [(Business.name, False), (Business.id, False)],
+        'rating': [(Business.rating_avg, True), (Business.review_count, True), (Business.id, True)],
+        'newest': [(Business.id, True)],
+    }
+    if rank is not None:
+        sort_keys['relevance'] = [(rank, False), (Business.id, True)]
+    if distance is not None:
+        sort_keys['distance'] = [(distance, False), (Business.id, True)]
+    sort = request.args.get('sort')
+    if sort not in sort_keys:
+        sort = 'relevance' if rank is not None else 'distance' if distance is not None else 'name'
+
+    pagination = keyset_paginate(
+        businesses_query,
+        sort_keys[sort],
+        per_page=20,
+        after=request.args.get('after'),
+        before=request.args.get('before'),
+        total=cached_count(businesses_query)
+    )
+    return render_template('directory/businesses.html', title='Business Directory', businesses=pagination.items,
+                           pagination=pagination, categories=refdata.business_categories(),
+                           sorts=list(sort_keys), sort=sort, near=near, near_error=near_error)
 
 @directory_bp.route('/business/<int:business_id>')
 def business(business_id):
     business = Business.query.get_or_404(business_id)
-    reviews = Review.query.filter_by(business_id=business_id).order_by(Review.timestamp.desc()).all()
-    return render_template('directory/business.html', title=business.name, business=business, reviews=reviews)
+    pagination = keyset_paginate(
+        Review.query.options(*loading.REVIEW_ROW).filter_by(business_id=business_id),
+        [(Review.timestamp, True), (Review.id, True)],
+        per_page=10,
+        after=request.args.get('after'),
+        before=request.args.get('before')
+    )
+    return render_template('directory/business.html', title=business.name, business=business, reviews=pagination.items, pagination=pagination)
 
 @directory_bp.route('/new_business', methods=['GET', 'POST'])
 @login_required
@@ -24,27 +84,52 @@ def new_business():
     if request.method == 'POST':
         name = request.form.get('name')
         description = request.form.get('description')
-        category = request.form.get('category')
+        category = ' '.join((request.form.get('category') or '').split())
         address = request.form.get('address')
         phone = request.form.get('phone')
         website = request.form.get('website')
         if name and description and category:
-            business = Business(name=name, description=description, category=category, address=address, phone=phone, website=website, user_id=current_user.id)
+            business = Business(name=name, description=description, category=_category_named(category), address=address, phone=phone, website=website, user_id=current_user.id)
             db.session.add(business)
             db.session.commit()
             flash('Your business has been listed!', 'success')
             return redirect(url_for('directory.business', business_id=business.id))
-    return render_template('directory/new_business.html', title='New Business')
+    return render_template('directory/new_business.html', title='New Business', categories=refdata.business_categories())
 
 @directory_bp.route('/new_review/<int:business_id>', methods=['POST'])
 @login_required
 def new_review(business_id):
     business = Business.query.get_or_404(business_id)
-    rating = request.form.get('rating')
+    rating = request.form.get('rating', type=int)
     comment = request.form.get('comment')
     if rating and comment:
         review = Review(rating=rating, comment=comment, user_id=current_user.id, business_id=business_id)
         db.session.add(review)
+        record_business_review(business, rating)
+        enqueue(business.user_id, 'business_review', f'{current_user.username} reviewed {business.name} ({rating} stars)',
+                url_for('directory.business', business_id=business_id), actor_id=current_user.id)
         db.session.commit()
         flash('Your review has been posted!', 'success')
-    return redirect(url_for('directory.business', business_id=business_id))
\ No newline at end of file
+    return redirect(url_for('directory.business', business_id=business_id))
+
+def _category_named(name):
+    """The BusinessCategory called name (ignoring case), created if new."""
+    key = name.casefold()
+    # INSERT ... ON CONFLICT DO NOTHING, then re-read: safe when two requests
+    # add the same category at once, whatever case each typed it in.
+    db.session.execute(insert_ignoring_duplicates(BusinessCategory.__table__, ['key']),
+                       [{'name': name, 'key': key}])
+    mark_changed(db.session, BusinessCategory)
+    return BusinessCategory.query.filter_by(key=key).one()
+
+@after_commit_of(Business, BusinessCategory)
+def _businesses_changed():
+    # Cached directory totals may count the changed rows.
+    clear_count_cache()
+
+
+@directory_bp.cli.command('reindex')
+def reindex():
+    """Rebuild the full-text search index for the business directory."""
+    count = search.rebuild_index()
+    click.echo(f'Indexed {count} businesses.')
@@ -0,0 +1,18 @@
+# app/directory/search.py
+
+from ..fts import FtsIndex
+from ..models import Business
+
+# Keyword search for the business directory through businesses_fts (see
+# fts.py). Name hits rank above address hits, which rank above description
+# hits; without FTS5 search falls back to LIKE on name and description.
+index = FtsIndex(
+    Business, 'businesses_fts',
+    columns=('name', 'description', 'address'),
+    weights=(10.0, 1.0, 2.0),
+    like_columns=('name', 'description')
+)
+
+search = index.search
+rebuild_index = index.rebuild
+is_enabled = index.is_enabled
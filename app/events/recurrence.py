@@ -0,0 +1,345 @@
+# app/events/recurrence.py
+
+import calendar
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+from sqlalchemy import and_, event as sa_event, or_
+
+from ..models import Event, EventException
+
+# Recurring events: one Event row carries an RRULE and its occurrences are
+# generated on demand, only for the calendar window being shown.
+#
+# Supported RRULE subset (RFC 5545):
+#   FREQ=DAILY|WEEKLY|MONTHLY|YEARLY   required
+#   INTERVAL=n                         every n periods (default 1)
+#   COUNT=n | UNTIL=<date[time]>       optional end of the series
+#   BYDAY=MO,WE,FR                     DAILY/WEEKLY: which weekdays
+#   BYDAY=1SA | -1FR                   MONTHLY: nth weekday of the month
+#   BYMONTHDAY=1,15,-1                 MONTHLY: days of the month
+# e.g. "FREQ=WEEKLY;BYDAY=SA" for a Saturday market.
+#
+# expand() jumps straight to the first period that can touch the window
+# (arithmetic on days/months since DTSTART) and walks forward from there, so
+# the cost depends on the window, not on how long the series has run. COUNT
+# is turned into a last occurrence once, when the event is saved
+# (series_end), so expansion never has to count from the start.
+
+WEEKDAYS = ('MO', 'TU', 'WE', 'TH', 'FR', 'SA', 'SU')
+FREQUENCIES = ('DAILY', 'WEEKLY', 'MONTHLY', 'YEARLY')
+
+# Upper bound for COUNT, which is resolved by iterating once at save time.
+MAX_COUNT = 5000
+
+# recurrence_end for series that never end; keeps the column indexable.
+FOREVER = datetime(9999, 12, 31)
+
+# Duration used when asking expand() about single points in time.
+_INSTANT = timedelta(microseconds=1)
+
+Rule = namedtuple('Rule', 'freq interval count until byday bymonthday')
+Occurrence = namedtuple('Occurrence', 'event original_start start end title location')
+
+
+def parse_rrule(text):
+    """Parse an RRULE string (with or without the 'RRULE:' prefix) into a Rule.
+
+    Raises ValueError for anything outside the supported subset.
+    """
+    if not text or not text.strip():
+        raise ValueError('empty recurrence rule')
+    text = text.strip()
+    if text.upper().startswith('RRULE:'):
+        text = text[len('RRULE:'):]
+    parts = {}
+    for part in text.split(';'):
+        if not part:
+            continue
+        key, sep, value = part.partition('=')
+        if not sep:
+            raise ValueError(f'malformed rule part {part!r}')
+        parts[key.strip().upper()] = value.strip().upper()
+
+    unsupported = set(parts) - {'FREQ', 'INTERVAL', 'COUNT', 'UNTIL', 'BYDAY', 'BYMONTHDAY', 'WKST'}
+    if unsupported:
+        raise ValueError(f'unsupported rule parts: {", ".join(sorted(unsupported))}')
+    freq = parts.get('FREQ')
+    if freq not in FREQUENCIES:
+        raise ValueError('FREQ must be one of ' + ', '.join(FREQUENCIES))
+    interval = int(parts.get('INTERVAL', 1))
+    if interval < 1:
+        raise ValueError('INTERVAL must be positive')
+    if 'COUNT' in parts and 'UNTIL' in parts:
+        raise ValueError('COUNT and UNTIL are mutually exclusive')
+    count = int(parts['COUNT']) if 'COUNT' in parts else None
+    if count is not None and not 1 <= count <= MAX_COUNT:
+        raise ValueError(f'COUNT must be between 1 and {MAX_COUNT}')
+    until = _parse_until(parts['UNTIL']) if 'UNTIL' in parts else None
+
+    byday = ()
+    if 'BYDAY' in parts:
+        byday = tuple(_parse_byday(item, freq) for item in parts['BYDAY'].split(','))
+    bymonthday = ()
+    if 'BYMONTHDAY' in parts:
+        if freq != 'MONTHLY':
+            raise ValueError('BYMONTHDAY is only supported with FREQ=MONTHLY')
+        bymonthday = tuple(sorted({int(day) for day in parts['BYMONTHDAY'].split(',')}))
+        if any(day == 0 or not -31 <= day <= 31 for day in bymonthday):
+            raise ValueError('BYMONTHDAY values must be 1..31 or -31..-1')
+    if freq == 'YEARLY' and byday:
+        raise ValueError('BYDAY is not supported with FREQ=YEARLY')
+    return Rule(freq, interval, count, until, byday, bymonthday)
+
+
+def _parse_until(value):
+    value = value.rstrip('Z')
+    for fmt in ('%Y%m%dT%H%M%S', '%Y%m%d'):
+        try:
+            until = datetime.strptime(value, fmt)
+        except ValueError:
+            continue
+        # A date-only UNTIL includes that whole day.
+        return until if 'T' in value else until + timedelta(days=1, microseconds=-1)
+    raise ValueError(f'bad UNTIL value {value!r}')
+
+
+def _parse_byday(item, freq):
+    item = item.strip()
+    weekday = item[-2:]
+    if weekday not in WEEKDAYS:
+        raise ValueError(f'bad BYDAY value {item!r}')
+    ordinal = int(item[:-2]) if item[:-2] else None
+    if ordinal is not None and (freq != 'MONTHLY' or ordinal == 0 or not -5 <= ordinal <= 5):
+        raise ValueError(f'BYDAY ordinal {item!r} is only valid with FREQ=MONTHLY (1..5 or -1..-5)')
+    return ordinal, WEEKDAYS.index(weekday)
+
+
+# --- Expansion ---
+
+def expand(dtstart, duration, rule, window_start, window_end, last_start=None):
+    """Yield start times of occurrences overlapping [window_start, window_end), in order.
+
+    last_start bounds the series (from series_end); without it UNTIL is used
+    and COUNT is ignored, so resolve COUNT with series_end first.
+    """
+    limit = last_start or rule.until
+    # Anything starting before this can't reach into the window.
+    earliest = max(dtstart, window_start - duration)
+    for period in _periods_from(dtstart, rule, earliest, window_end):
+        for start in _candidates(dtstart, rule, period):
+            if start < earliest or start < dtstart:
+                continue
+            if start >= window_end or (limit is not None and start > limit):
+                return
+            if start + duration > window_start:
+                yield start
+
+
+def series_end(dtstart, duration, rule):
+    """End of the last occurrence, or FOREVER. Sets the bound expand() needs for COUNT."""
+    if rule.count is not None:
+        last = None
+        for n, start in enumerate(_walk(dtstart, rule), 1):
+            last = start
+            if n == rule.count:
+                break
+        return (last or dtstart) + duration
+    if rule.until is not None:
+        # Look back from UNTIL a couple of periods at a time (widening for
+        # sparse rules such as Feb 29), not forward from DTSTART.
+        lookback = _period_length(rule) * 2
+        while True:
+            window_start = max(dtstart, rule.until - lookback)
+            starts = list(expand(dtstart, _INSTANT, rule, window_start, rule.until + _INSTANT))
+            if starts or window_start == dtstart:
+                return (starts[-1] if starts else dtstart) + duration
+            lookback *= 2
+    return FOREVER
+
+
+def _walk(dtstart, rule):
+    for period in _periods_from(dtstart, rule, dtstart, FOREVER):
+        for start in _candidates(dtstart, rule, period):
+            if start >= dtstart:
+                yield start
+
+
+def _period_length(rule):
+    days = {'DAILY': 1, 'WEEKLY': 7, 'MONTHLY': 31, 'YEARLY': 366}[rule.freq]
+    return timedelta(days=days * rule.interval)
+
+
+def _periods_from(dtstart, rule, moment, stop):
+    """Period numbers k, starting at the one containing `moment`, while the period begins before `stop`."""
+    if rule.freq == 'DAILY':
+        elapsed = (moment.date() - dtstart.date()).days // rule.interval
+    elif rule.freq == 'WEEKLY':
+        elapsed = (_week_start(moment.date()) - _week_start(dtstart.date())).days // (7 * rule.interval)
+    elif rule.freq == 'MONTHLY':
+        elapsed = ((moment.year - dtstart.year) * 12 + moment.month - dtstart.month) // rule.interval
+    else:
+        elapsed = (moment.year - dtstart.year) // rule.interval
+    k = max(elapsed, 0)
+    while True:
+        begins = _period_start(dtstart, rule, k)
+        if begins is None or begins >= stop:
+            return
+        yield k
+        k += 1
+
+
+def _period_start(dtstart, rule, k):
+    """First day of period k as a datetime, or None past the last representable year."""
+    try:
+        if rule.freq == 'DAILY':
+            day = dtstart.date() + timedelta(days=k * rule.interval)
+        elif rule.freq == 'WEEKLY':
+            day = _week_start(dtstart.date()) + timedelta(weeks=k * rule.interval)
+        elif rule.freq == 'MONTHLY':
+            month_index = dtstart.month - 1 + k * rule.interval
+            day = datetime(dtstart.year + month_index // 12, month_index % 12 + 1, 1).date()
+        else:
+            day = datetime(dtstart.year + k * rule.interval, 1, 1).date()
+    except (OverflowError, ValueError):
+        return None
+    return datetime.combine(day, datetime.min.time())
+
+
+def _candidates(dtstart, rule, k):
+    """Sorted occurrence starts in period k (may include ones before DTSTART)."""
+    time_of_day = dtstart - datetime.combine(dtstart.date(), datetime.min.time())
+
+    if rule.freq == 'DAILY':
+        day = dtstart.date() + timedelta(days=k * rule.interval)
+        if rule.byday and day.weekday() not in {weekday for _, weekday in rule.byday}:
+            return []
+        return [datetime.combine(day, datetime.min.time()) + time_of_day]
+
+    if rule.freq == 'WEEKLY':
+        week = _week_start(dtstart.date()) + timedelta(weeks=k * rule.interval)
+        weekdays = sorted({weekday for _, weekday in rule.byday}) if rule.byday else [dtstart.weekday()]
+        return [datetime.combine(week + timedelta(days=w), datetime.min.time()) + time_of_day for w in weekdays]
+
+    if rule.freq == 'MONTHLY':
+        month_index = dtstart.month - 1 + k * rule.interval
+        year, month = dtstart.year + month_index // 12, month_index % 12 + 1
+        days_in_month = calendar.monthrange(year, month)[1]
+        days = set()
+        for day in rule.bymonthday:
+            day = day if day > 0 else days_in_month + day + 1
+            if 1 <= day <= days_in_month:
+                days.add(day)
+        for ordinal, weekday in rule.byday:
+            days.update(_nth_weekdays(year, month, ordinal, weekday, days_in_month))
+        if not rule.bymonthday and not rule.byday and dtstart.day <= days_in_month:
+            days.add(dtstart.day)   # months without that day are skipped, as RFC 5545 says
+        return [datetime(year, month, day) + time_of_day for day in sorted(days)]
+
+    year = dtstart.year + k * rule.interval
+    if dtstart.month == 2 and dtstart.day == 29 and not calendar.isleap(year):
+        return []
+    return [datetime(year, dtstart.month, dtstart.day) + time_of_day]
+
+
+def _nth_weekdays(year, month, ordinal, weekday, days_in_month):
+    first = (weekday - calendar.weekday(year, month, 1)) % 7 + 1
+    days = list(range(first, days_in_month + 1, 7))
+    if ordinal is None:
+        return days
+    index = ordinal - 1 if ordinal > 0 else ordinal
+    return [days[index]] if -len(days) <= index < len(days) else []
+
+
+def _week_start(day):
+    return day - timedelta(days=day.weekday())
+
+
+# --- Events with exceptions ---
+
+def occurrences(event, window_start, window_end, exceptions=None):
+    """Occurrence tuples of a recurring Event inside the window, with its exceptions applied.
+
+    Cancelled occurrences are dropped; overridden ones take the override's
+    time, title and location (and may move into or out of the window).
+    `exceptions` defaults to all of event.exceptions; callers expanding many
+    series pass just the ones near the window (see exceptions_near).
+    """
+    rule, duration, last_start = _series(event)
+    exceptions = {e.original_start: e for e in (event.exceptions if exceptions is None else exceptions)}
+    result = []
+
+    for start in expand(event.start_time, duration, rule, window_start, window_end, last_start):
+        exception = exceptions.pop(start, None)
+        if exception is None:
+            result.append(Occurrence(event, start, start, start + duration, event.title, event.location))
+        elif not exception.is_cancelled:
+            result.append(_overridden(event, exception, duration))
+
+    # Overrides whose original slot is outside the window but which were moved into it.
+    for exception in exceptions.values():
+        if exception.is_cancelled or exception.start_time is None:
+            continue
+        result.append(_overridden(event, exception, duration))
+
+    return sorted(
+        (o for o in result if o.start < window_end and o.end > window_start),
+        key=lambda o: o.start
+    )
+
+
+def is_occurrence(event, moment):
+    """True if the series has an occurrence starting exactly at `moment`."""
+    rule, _, last_start = _series(event)
+    return moment in expand(event.start_time, _INSTANT, rule, moment, moment + _INSTANT, last_start)
+
+
+def _series(event):
+    rule = parse_rrule(event.rrule)
+    duration = event.end_time - event.start_time
+    last_start = None
+    if event.recurrence_end is not None and event.recurrence_end != FOREVER:
+        last_start = event.recurrence_end - duration
+    return rule, duration, last_start
+
+
+def _overridden(event, exception, duration):
+    start = exception.start_time or exception.original_start
+    end = exception.end_time or start + duration
+    return Occurrence(event, exception.original_start, start, end,
+                      exception.title or event.title, exception.location or event.location)
+
+
+def exceptions_near(event_ids, window_start, window_end, max_duration):
+    """{event_id: [EventException]} that can affect the window, in one query.
+
+    That is exceptions whose original slot, or overridden start, falls in the
+    window widened by the longest occurrence (plus a day of slack for
+    overrides that lengthen an occurrence).
+    """
+    if not event_ids:
+        return {}
+    earliest = window_start - max_duration - timedelta(days=1)
+    rows = EventException.query.filter(
+        EventException.event_id.in_(event_ids),
+        or_(
+            and_(EventException.original_start >= earliest, EventException.original_start < window_end),
+            and_(EventException.start_time >= earliest, EventException.start_time < window_end)
+        )
+    )
+    by_event = {event_id: [] for event_id in event_ids}
+    for row in rows:
+        by_event[row.event_id].append(row)
+    return by_event
+
+
+# --- Keep Event.recurrence_end in step with the rule ---
+
+@sa_event.listens_for(Event, 'before_insert')
+@sa_event.listens_for(Event, 'before_update')
+def _set_recurrence_end(mapper, connection, target):
+    if target.rrule:
+        rule = parse_rrule(target.rrule)
+        target.recurrence_end = series_end(target.start_time, target.end_time - target.start_time, rule)
+    else:
+        target.recurrence_end = None
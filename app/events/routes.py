@@ -1,31 +1,169 @@
 # app/events/routes.py
 
-from flask import Blueprint, render_template, redirect, url_for, flash, request, jsonify
+import hashlib
+import heapq
+import json
+
+from flask import Blueprint, Response, abort, render_template, redirect, url_for, flash, request, stream_with_context
 from flask_login import login_required, current_user
-from ..models import Event, User
+from sqlalchemy import and_, func, or_
+from werkzeug.http import parse_date
+from ..models import Event, EventException, User
 from .. import db
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
+from . import recurrence
+from .. import geo
 
 events_bp = Blueprint('events', __name__, url_prefix='/events')
 
+# Feed window when the calendar doesn't send one, and the widest it may ask for.
+DEFAULT_RANGE = timedelta(days=42)
+MAX_RANGE = timedelta(days=400)
+FEED_BATCH_SIZE = 500
+# How far ahead an event page lists a series' next dates.
+UPCOMING_RANGE = timedelta(days=90)
+# Longest a (one-off) event may last. Enforced on save, so the feed can put a
+# lower bound on start_time and only scan the index from start - this.
+MAX_EVENT_DURATION = timedelta(days=31)
+
 @events_bp.route('/')
 def calendar():
     return render_template('events/calendar.html', title='Event Calendar')
 
 @events_bp.route('/data')
 def data():
-    events = Event.query.all()
-    return jsonify([{
-        'title': event.title,
-        'start': event.start_time.isoformat(),
-        'end': event.end_time.isoformat(),
-        'url': url_for('events.event', event_id=event.id)
-    } for event in events])
+    """Events overlapping FullCalendar's [start, end) window, as a streamed JSON array.
+
+    since=<ISO time> returns only events changed after it: pass back the
+    previous response's X-Sync-Token (Last-Modified works too, but only has
+    second precision so may repeat a few events). ETag/Last-Modified come from a cheap
+    count/max(updated_at) over the same range, so an unchanged range is
+    answered 304 without loading a single event.
+
+    since= only reports events that still exist: deleting an event (there is
+    no route for it, but an admin may) is not signalled. Incremental clients
+    must reload the full range now and then (e.g. whenever the view changes)
+    to drop events that are gone.
+
+    near=<lat,lng or place>&radius=<km> limits the feed to events around a point.
+    """
+    try:
+        start, end = _range(request.args)
+        since = _parse_time(request.args.get('since'))
+        # near=lat,lng or a place name, radius in km: only events around there (see geo.py).
+        near = geo.parse_near(request.args)
+    except ValueError:
+        abort(400)
+
+    # One-off events: overlap test served by ix_events_start_time_end_time. No
+    # event lasts longer than MAX_EVENT_DURATION, which bounds the start_time range.
+    one_off = [Event.rrule.is_(None), Event.start_time > start - MAX_EVENT_DURATION,
+               Event.start_time < end, Event.end_time > start]
+    # Recurring series whose lifetime overlaps the window (ix_events_recurrence_end);
+    # their occurrences are expanded below.
+    series = [Event.rrule.is_not(None), Event.recurrence_end > start, Event.start_time < end]
+    if since is not None:
+        one_off.append(Event.updated_at > since)
+        series.append(Event.updated_at > since)
+    if near:
+        one_off.append(geo.near_condition(Event, near))
+        series.append(geo.near_condition(Event, near))
+
+    count, last_modified = db.session.query(func.count(Event.id), func.max(Event.updated_at)) \
+        .filter(or_(and_(*one_off), and_(*series))).one()
+    version = f'{start.isoformat()}|{end.isoformat()}|{since}|{near}|{count}|{last_modified}'
+
+    events = Event.query.filter(*one_off).order_by(Event.start_time, Event.id) \
+        .with_entities(Event.id, Event.title, Event.start_time, Event.end_time) \
+        .yield_per(FEED_BATCH_SIZE)
+
+    def one_off_items():
+        for event in events:
+            yield event.start_time, {
+                'id': event.id,
+                'title': event.title,
+                'start': event.start_time.isoformat(),
+                'end': event.end_time.isoformat(),
+                'url': url_for('events.event', event_id=event.id)
+            }
+
+    def occurrence_items():
+        recurring = Event.query.filter(*series).all()
+        if not recurring:
+            return
+        longest = max(e.end_time - e.start_time for e in recurring)
+        exceptions = recurrence.exceptions_near([e.id for e in recurring], start, end, longest)
+        for occurrence in heapq.merge(
+            *(recurrence.occurrences(e, start, end, exceptions[e.id]) for e in recurring),
+            key=lambda o: o.start
+        ):
+            yield occurrence.start, {
+                'id': f'{occurrence.event.id}@{occurrence.original_start.isoformat()}',
+                'groupId': occurrence.event.id,
+                'title': occurrence.title,
+                'start': occurrence.start.isoformat(),
+                'end': occurrence.end.isoformat(),
+                'url': url_for('events.event', event_id=occurrence.event.id)
+            }
+
+    def generate():
+        yield '['
+        merged = heapq.merge(one_off_items(), occurrence_items(), key=lambda item: item[0])
+        for i, (_, item) in enumerate(merged):
+            yield (',' if i else '') + json.dumps(item)
+        yield ']'
+
+    response = Response(stream_with_context(generate()), mimetype='application/json')
+    response.set_etag(hashlib.md5(version.encode()).hexdigest(), weak=True)
+    if last_modified is not None:
+        response.last_modified = last_modified.replace(tzinfo=timezone.utc)
+        response.headers['X-Sync-Token'] = last_modified.isoformat()
+    elif since is not None:
+        response.headers['X-Sync-Token'] = since.isoformat()
+    response.cache_control.no_cache = True   # always revalidate, but reuse on 304
+    return response.make_conditional(request)
+
+
+def _parse_time(value):
+    """ISO date/datetime or HTTP date -> naive datetime, or None if not given.
+
+    Event times are stored as naive wall-clock times (as typed into the
+    form), so an offset sent by the calendar is dropped, not converted.
+    """
+    if not value:
+        return None
+    try:
+        # A '+' in an offset arrives as a space unless the client escaped it.
+        return datetime.fromisoformat(value.replace(' ', '+')).replace(tzinfo=None)
+    except ValueError:
+        parsed = parse_date(value)   # e.g. a Last-Modified value passed back as since=
+        if parsed is None:
+            raise
+        return parsed.replace(tzinfo=None)
+
+
+def _range(args):
+    start = _parse_time(args.get('start'))
+    end = _parse_time(args.get('end'))
+    if start is None and end is None:
+        start = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=7)
+    if start is None:
+        start = end - DEFAULT_RANGE
+    if end is None:
+        end = start + DEFAULT_RANGE
+    if end <= start:
+        raise ValueError('end must be after start')
+    return start, min(end, start + MAX_RANGE)
+
 
 @events_bp.route('/<int:event_id>')
 def event(event_id):
     event = Event.query.get_or_404(event_id)
-    return render_template('events/event.html', title=event.title, event=event)
+    upcoming = []
+    if event.rrule:
+        now = datetime.utcnow()
+        upcoming = recurrence.occurrences(event, now, now + UPCOMING_RANGE)[:10]
+    return render_template('events/event.html', title=event.title, event=event, upcoming=upcoming)
 
 @events_bp.route('/new', methods=['GET', 'POST'])
 @login_required
@@ -36,13 +174,30 @@ def new_event():
         start_time = request.form.get('start_time')
         end_time = request.form.get('end_time')
         location = request.form.get('location')
+        # Optional repeat rule, e.g. FREQ=WEEKLY;BYDAY=SA (see recurrence.py)
+        rrule = (request.form.get('rrule') or '').strip() or None
+        if rrule:
+            try:
+                recurrence.parse_rrule(rrule)
+            except ValueError as e:
+                flash(f'Invalid repeat rule: {e}', 'danger')
+                return render_template('events/new_event.html', title='New Event')
         if title and description and start_time and end_time:
+            try:
+                start_time, end_time = datetime.fromisoformat(start_time), datetime.fromisoformat(end_time)
+            except ValueError:
+                flash('Please enter valid start and end times.', 'danger')
+                return render_template('events/new_event.html', title='New Event')
+            if not start_time < end_time <= start_time + MAX_EVENT_DURATION:
+                flash(f'An event must end after it starts and last at most {MAX_EVENT_DURATION.days} days.', 'danger')
+                return render_template('events/new_event.html', title='New Event')
             event = Event(
                 title=title, 
                 description=description, 
-                start_time=datetime.fromisoformat(start_time), 
-                end_time=datetime.fromisoformat(end_time), 
+                start_time=start_time, 
+                end_time=end_time, 
                 location=location, 
+                rrule=rrule,
                 user_id=current_user.id
             )
             db.session.add(event)
@@ -50,3 +205,40 @@ def new_event():
             flash('Your event has been created!', 'success')
             return redirect(url_for('events.calendar'))
     return render_template('events/new_event.html', title='New Event')
+
+@events_bp.route('/<int:event_id>/occurrence', methods=['POST'])
+@login_required
+def edit_occurrence(event_id):
+    """Cancel or change one occurrence of a recurring event (author only)."""
+    event = Event.query.get_or_404(event_id)
+    if event.user_id != current_user.id:
+        abort(403)
+    if not event.rrule:
+        abort(400)
+    try:
+        original_start = datetime.fromisoformat(request.form['original_start'])
+        start_time = _parse_time(request.form.get('start_time'))
+        end_time = _parse_time(request.form.get('end_time'))
+    except (KeyError, ValueError):
+        abort(400)
+    if not recurrence.is_occurrence(event, original_start):
+        abort(400)
+
+    exception = EventException.query.filter_by(event_id=event.id, original_start=original_start).first()
+    if request.form.get('action') == 'restore':
+        if exception is not None:
+            db.session.delete(exception)
+    else:
+        if exception is None:
+            exception = EventException(event_id=event.id, original_start=original_start)
+            db.session.add(exception)
+        exception.is_cancelled = request.form.get('action') == 'cancel'
+        exception.start_time = start_time
+        exception.end_time = end_time
+        exception.title = request.form.get('title') or None
+        exception.location = request.form.get('location') or None
+    # The feed's ETag and since= sync key off the series row.
+    event.updated_at = datetime.utcnow()
+    db.session.commit()
+    flash('The occurrence has been updated.', 'success')
+    return redirect(url_for('events.event', event_id=event.id))
@@ -1,28 +1,85 @@
 # app/forum/routes.py
 
-from flask import Blueprint, render_template, redirect, url_for, flash, request
+from flask import Blueprint, abort, current_app, render_template, redirect, url_for, flash, request, jsonify
 from flask_login import login_required, current_user
 from ..models import ForumCategory, ForumPost, ForumComment, User
 from .. import db
+from sqlalchemy import func, select
+from ..pagination import keyset_paginate, page_cursor_for, cached_query_result, clear_count_cache
+from ..model_events import after_commit_of
+from .. import loading, refdata
+from ..aggregates import record_forum_comment
+from ..notifications.outbox import enqueue
+from collections import namedtuple
+from datetime import datetime
 
 forum_bp = Blueprint('forum', __name__, url_prefix='/forum')
 
+CategoryStats = namedtuple('CategoryStats', 'threads posts last_activity')
+LastReply = namedtuple('LastReply', 'author timestamp')
+
+# Thread order, oldest first; ix_forum_comments_post_id_timestamp covers it.
+COMMENT_ORDER = [(ForumComment.timestamp, False), (ForumComment.id, False)]
+
 @forum_bp.route('/')
 def categories():
-    categories = ForumCategory.query.all()
-    return render_template('forum/categories.html', title='Forum', categories=categories)
+    categories = refdata.forum_categories()
+    return render_template('forum/categories.html', title='Forum', categories=categories, stats=_category_stats())
 
 @forum_bp.route('/category/<int:category_id>')
 def category(category_id):
     category = ForumCategory.query.get_or_404(category_id)
-    posts = ForumPost.query.filter_by(category_id=category_id).order_by(ForumPost.timestamp.desc()).all()
-    return render_template('forum/category.html', title=category.name, category=category, posts=posts)
+    pagination = keyset_paginate(
+        ForumPost.query.options(*loading.FORUM_POST_ROW).filter_by(category_id=category_id),
+        [(ForumPost.last_activity, True), (ForumPost.id, True)],
+        per_page=20,
+        after=request.args.get('after'),
+        before=request.args.get('before'),
+        total=_thread_count(category_id)
+    )
+    return render_template('forum/category.html', title=category.name, category=category, posts=pagination.items,
+                           pagination=pagination, last_replies=_last_replies(pagination.items))
 
 @forum_bp.route('/post/<int:post_id>')
 def post(post_id):
-    post = ForumPost.query.get_or_404(post_id)
-    comments = ForumComment.query.filter_by(post_id=post_id).order_by(ForumComment.timestamp.asc()).all()
-    return render_template('forum/post.html', title=post.title, post=post, comments=comments)
+    """A thread, COMMENT_ORDER cursor paging; ?format=json returns just the comments, for "load more"."""
+    post = ForumPost.query.options(*loading.FORUM_POST_ROW).get_or_404(post_id)
+    pagination = keyset_paginate(
+        ForumComment.query.options(*loading.FORUM_COMMENT_ROW).filter_by(post_id=post_id),
+        COMMENT_ORDER,
+        per_page=current_app.config['FORUM_COMMENT_PAGE_SIZE'],
+        after=request.args.get('after'),
+        before=request.args.get('before')
+    )
+    if request.args.get('format') == 'json':
+        return jsonify(
+            comments=[{
+                'id': comment.id,
+                'author': comment.author.username,
+                'body': comment.body,
+                'timestamp': comment.timestamp.isoformat() if comment.timestamp else None,
+                'url': url_for('forum.comment', comment_id=comment.id),
+            } for comment in pagination.items],
+            next_url=pagination.next_url(),
+        )
+    return render_template('forum/post.html', title=post.title, post=post, comments=pagination.items, pagination=pagination)
+
+@forum_bp.route('/comment/<int:comment_id>')
+def comment(comment_id):
+    """Permalink: redirect to the page of the thread holding the comment."""
+    row = db.session.execute(
+        select(ForumComment.post_id, ForumComment.timestamp, ForumComment.id).where(ForumComment.id == comment_id)
+    ).one_or_none()
+    if row is None:
+        abort(404)
+    cursor = page_cursor_for(
+        ForumComment.query.filter_by(post_id=row.post_id),
+        COMMENT_ORDER,
+        (row.timestamp, row.id),
+        per_page=current_app.config['FORUM_COMMENT_PAGE_SIZE']
+    )
+    args = {'after': cursor} if cursor else {}
+    return redirect(url_for('forum.post', post_id=row.post_id, _anchor=f'comment-{comment_id}', **args))
 
 @forum_bp.route('/new_post/<int:category_id>', methods=['GET', 'POST'])
 @login_required
@@ -45,9 +102,59 @@ def new_comment(post_id):
     post = ForumPost.query.get_or_404(post_id)
     body = request.form.get('body')
     if body:
-        comment = ForumComment(body=body, user_id=current_user.id, post_id=post_id)
+        comment = ForumComment(body=body, user_id=current_user.id, post_id=post_id, timestamp=datetime.utcnow())
         db.session.add(comment)
+        record_forum_comment(post, comment.timestamp)
+        db.session.flush()
+        enqueue(post.user_id, 'forum_reply', f'{current_user.username} replied to "{post.title}"',
+                url_for('forum.comment', comment_id=comment.id), actor_id=current_user.id)
         db.session.commit()
         flash('Your comment has been posted!', 'success')
+        # The newest comment is on the last page, not the first.
+        return redirect(url_for('forum.comment', comment_id=comment.id))
     return redirect(url_for('forum.post', post_id=post_id))
 
+
+def _category_stats():
+    """{category_id: CategoryStats}; posts counts threads plus their replies."""
+    query = db.session.query(
+        ForumPost.category_id,
+        func.count(ForumPost.id),
+        func.coalesce(func.sum(ForumPost.comment_count), 0),
+        func.max(ForumPost.last_activity)
+    ).group_by(ForumPost.category_id)
+    rows = cached_query_result(query, 'forum_category_stats', lambda q: q.all())
+    return {category_id: CategoryStats(threads, threads + replies, last)
+            for category_id, threads, replies, last in rows}
+
+def _thread_count(category_id):
+    """Threads in one category; a count over ix_forum_posts_category_id_last_activity."""
+    query = ForumPost.query.filter(ForumPost.category_id == category_id)
+    return cached_query_result(query, 'forum_category_threads', lambda q: q.count())
+
+def _last_replies(posts):
+    """{post_id: LastReply} for the latest comment of each post, in one query.
+
+    Reply counts come from ForumPost.comment_count (see aggregates.py); each
+    latest comment is one seek on ix_forum_comments_post_id_timestamp.
+    """
+    ids = [post.id for post in posts if post.comment_count]
+    if not ids:
+        return {}
+    latest_id = select(ForumComment.id) \
+        .where(ForumComment.post_id == ForumPost.id) \
+        .order_by(ForumComment.timestamp.desc(), ForumComment.id.desc()) \
+        .limit(1).correlate(ForumPost).scalar_subquery()
+    rows = db.session.execute(
+        select(ForumPost.id, User.username, ForumComment.timestamp)
+        .join(ForumComment, ForumComment.id == latest_id)
+        .join(User, User.id == ForumComment.user_id)
+        .where(ForumPost.id.in_(ids))
+    )
+    return {post_id: LastReply(username, timestamp) for post_id, username, timestamp in rows}
+
+@after_commit_of(ForumPost, ForumComment)
+def _forum_changed():
+    # Cached per-category totals count the changed threads and replies;
+    # other cached counts (listing facets, browse totals) are left alone.
+    clear_count_cache('forum_category_stats', 'forum_category_threads')
@@ -0,0 +1,130 @@
+# app/fts.py
+
+import re
+import unicodedata
+
+from sqlalchemy import Float, Integer, column, event, inspect, or_, text
+
+from . import db
+from .schema import TableCheck
+
+# Keyword search for listings and the business directory.
+#
+# On SQLite each searchable model has a standalone FTS5 table (listings_fts,
+# businesses_fts) whose rowid mirrors the model's id, kept in sync from
+# mapper events in the same transaction. unicode61 with remove_diacritics 2
+# folds accents both when indexing and when parsing the MATCH expression, so
+# "cafe" finds "Café" and "Cuenca - El Centro" matches "cuenca centro".
+# Without the table (another database, or before `flask ... reindex`) search
+# falls back to LIKE on a few columns.
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def fold(value):
+    """Lower-case and strip accents, e.g. 'Cuenca - El Centro' -> 'cuenca - el centro'."""
+    decomposed = unicodedata.normalize('NFKD', value or '')
+    return ''.join(c for c in decomposed if not unicodedata.combining(c)).lower()
+
+
+def build_match_query(query):
+    """Turn free text into an FTS5 MATCH expression of quoted prefix terms.
+
+    Every term must match (implicit AND) and is treated as a prefix, so
+    'apart cuenc' finds 'Apartment in Cuenca'. Returns None when the input has
+    no searchable terms.
+    """
+    terms = _TOKEN_RE.findall(fold(query))
+    if not terms:
+        return None
+    return ' '.join(f'"{term}"*' for term in terms)
+
+
+class FtsIndex:
+    """FTS5 table upkeep and MATCH search for one model."""
+
+    def __init__(self, model, table_name, columns, weights, like_columns=None):
+        self.model = model
+        self.table_name = table_name
+        self.columns = tuple(columns)
+        # Column weights handed to bm25(), in column order.
+        self.weights = tuple(weights)
+        self.like_columns = tuple(like_columns or columns)
+        self.create_sql = (
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {table_name} USING fts5("
+            f"{', '.join(self.columns)}, "
+            "tokenize = 'unicode61 remove_diacritics 2')"
+        )
+        self.exists = TableCheck(table_name)
+        event.listen(model, 'after_insert', self._after_insert)
+        event.listen(model, 'after_update', self._after_update)
+        event.listen(model, 'after_delete', self._after_delete)
+
+    def is_enabled(self, connection=None):
+        """True when the current engine is SQLite and the FTS table exists."""
+        return self.exists(connection)
+
+    def search(self, model_query, query):
+        """Restrict model_query to rows matching query.
+
+        Returns (filtered_query, rank_column). rank_column is the BM25 score
+        (lower is better) to order by, or None on the LIKE fallback.
+        """
+        if not self.is_enabled():
+            return model_query.filter(
+                or_(*(getattr(self.model, name).ilike(f'%{query}%') for name in self.like_columns))
+            ), None
+
+        match = build_match_query(query)
+        if match is None:
+            return model_query, None
+
+        weights = ', '.join(str(w) for w in self.weights)
+        ranked = text(
+            f"SELECT rowid AS row_id, bm25({self.table_name}, {weights}) AS rank "
+            f"FROM {self.table_name} WHERE {self.table_name} MATCH :match"
+        ).bindparams(match=match).columns(
+            column('row_id', Integer),
+            column('rank', Float)
+        ).subquery(f'{self.table_name}_match')
+        return model_query.join(ranked, ranked.c.row_id == self.model.id), ranked.c.rank
+
+    def rebuild(self):
+        """Drop and repopulate the FTS table from the model's table."""
+        source = self.model.__table__.name
+        values = ', '.join(f"COALESCE({name}, '')" for name in self.columns)
+        with db.engine.begin() as connection:
+            connection.execute(text(f"DROP TABLE IF EXISTS {self.table_name}"))
+            connection.execute(text(self.create_sql))
+            connection.execute(text(
+                f"INSERT INTO {self.table_name} (rowid, {', '.join(self.columns)}) "
+                f"SELECT id, {values} FROM {source}"
+            ))
+            count = connection.execute(text(f"SELECT count(*) FROM {self.table_name}")).scalar()
+        self.exists.mark_present()
+        return count
+
+    def _index(self, connection, target):
+        connection.execute(text(f"DELETE FROM {self.table_name} WHERE rowid = :rowid"), {'rowid': target.id})
+        connection.execute(
+            text(f"INSERT INTO {self.table_name} (rowid, {', '.join(self.columns)}) "
+                 f"VALUES (:rowid, {', '.join(':' + name for name in self.columns)})"),
+            {'rowid': target.id, **{name: getattr(target, name) or '' for name in self.columns}}
+        )
+
+    # --- Mapper events (same transaction as the write) ---
+
+    def _after_insert(self, mapper, connection, target):
+        if self.is_enabled(connection):
+            self._index(connection, target)
+
+    def _after_update(self, mapper, connection, target):
+        if not self.is_enabled(connection):
+            return
+        state = inspect(target)
+        if any(state.attrs[name].history.has_changes() for name in self.columns):
+            self._index(connection, target)
+
+    def _after_delete(self, mapper, connection, target):
+        if self.is_enabled(connection):
+            connection.execute(text(f"DELETE FROM {self.table_name} WHERE rowid = :rowid"), {'rowid': target.id})
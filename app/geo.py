@@ -0,0 +1,300 @@
+# app/geo.py
+
+import math
+import re
+import sqlite3
+from collections import namedtuple
+
+import click
+from flask.cli import AppGroup
+from sqlalchemy import Column, Float, Integer, MetaData, Table, and_, bindparam, event, func, inspect, literal, select, update
+from sqlalchemy.engine import Engine
+
+from . import db
+from .fts import fold
+from .model_events import after_commit_of
+from .schema import TableCheck
+from .models import Business, Event, Listing, Place
+
+# "Near me" search for listings, businesses and events.
+#
+# Rows carry latitude/longitude, filled in from their free-text location or
+# address by matching it against the places table (an offline gazetteer of
+# our neighbourhoods) unless coordinates were set explicitly. On SQLite each
+# model also has an R*Tree table (listings_geo, ...) keyed by row id and kept
+# in sync from mapper events in the same transaction, like the FTS index.
+#
+# near=lat,lng (or near=<place name>) and radius=<km> then filter in two steps:
+#   1. bounding box: the R*Tree returns the ids whose point lies in the
+#      lat/lng box around the circle (a range filter on the columns
+#      elsewhere);
+#   2. exact distance: the haversine distance of those candidates only is
+#      compared with the radius (geo_distance_km(), a Python function
+#      registered on every SQLite connection).
+
+EARTH_RADIUS_KM = 6371.0088
+DEFAULT_RADIUS_KM = 5.0
+MAX_RADIUS_KM = 100.0
+
+Near = namedtuple('Near', 'lat lng radius')
+
+# Seed data for the places table (the migration inserts the same rows).
+LOCAL_PLACES = (
+    ('Cuenca', -2.9001, -79.0059),
+    ('El Centro', -2.8974, -79.0045),
+    ('San Sebastián', -2.8967, -79.0125),
+    ('El Vergel', -2.9050, -79.0010),
+    ('Totoracocha', -2.8930, -78.9790),
+    ('Gringolandia', -2.8945, -79.0230),
+    ('Challuabamba', -2.8720, -78.9330),
+    ('Misicata', -2.9020, -79.0500),
+    ('Ricaurte', -2.8530, -78.9520),
+    ('Baños', -2.9190, -79.0650),
+    ('Turi', -2.9280, -79.0040),
+    ('El Batán', -2.8990, -79.0190),
+    ('Yanuncay', -2.9120, -79.0200),
+    ('Monay', -2.8960, -78.9700),
+    ('Puertas del Sol', -2.9070, -79.0250),
+    ('Las Pencas', -2.9150, -79.0120),
+)
+
+_COORDINATES_RE = re.compile(r'\s*(-?\d+(?:\.\d+)?)\s*,\s*(-?\d+(?:\.\d+)?)\s*')
+
+# The R*Tree tables are created with raw SQL, so they live outside db.metadata
+# (create_all and autogenerate leave them alone).
+_rtree_metadata = MetaData()
+
+
+class GeoIndex:
+    """Coordinates and R*Tree upkeep for one model."""
+
+    def __init__(self, model, text_column, table_name):
+        self.model = model
+        self.text_column = text_column
+        self.rtree = Table(
+            table_name, _rtree_metadata,
+            Column('id', Integer, primary_key=True),
+            Column('min_lat', Float), Column('max_lat', Float),
+            Column('min_lng', Float), Column('max_lng', Float),
+        )
+        self.create_sql = (
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {table_name} "
+            "USING rtree(id, min_lat, max_lat, min_lng, max_lng)"
+        )
+        self.exists = TableCheck(table_name)
+        event.listen(model, 'before_insert', self._before_insert)
+        event.listen(model, 'before_update', self._before_update)
+        event.listen(model, 'after_insert', self._after_write)
+        event.listen(model, 'after_update', self._after_write)
+        event.listen(model, 'after_delete', self._after_delete)
+
+    def is_enabled(self, connection=None):
+        return self.exists(connection)
+
+    def candidates(self, south, north, west, east):
+        """SELECT of the ids whose point lies inside the box."""
+        r = self.rtree.c
+        return select(r.id).where(r.min_lat <= north, r.max_lat >= south, r.min_lng <= east, r.max_lng >= west)
+
+    def rebuild(self):
+        """Geocode rows without coordinates, then reload the R*Tree table."""
+        table = self.model.__table__
+        text_column = table.c[self.text_column]
+        rows = db.session.execute(
+            select(table.c.id, text_column).where(table.c.latitude.is_(None), text_column.is_not(None))
+        ).all()
+        located = [(row_id, geocode(value)) for row_id, value in rows]
+        params = [{'row_id': row_id, 'lat': point[0], 'lng': point[1]} for row_id, point in located if point]
+        if params:
+            db.session.execute(
+                update(table).where(table.c.id == bindparam('row_id'))
+                .values(latitude=bindparam('lat'), longitude=bindparam('lng')),
+                params
+            )
+        db.session.commit()
+
+        if db.engine.dialect.name != 'sqlite':
+            return len(params)
+        with db.engine.begin() as connection:
+            connection.exec_driver_sql(f"DROP TABLE IF EXISTS {self.rtree.name}")
+            connection.exec_driver_sql(self.create_sql)
+            connection.execute(self.rtree.insert().from_select(
+                ['id', 'min_lat', 'max_lat', 'min_lng', 'max_lng'],
+                select(table.c.id, table.c.latitude, table.c.latitude, table.c.longitude, table.c.longitude)
+                .where(table.c.latitude.is_not(None), table.c.longitude.is_not(None))
+            ))
+            count = connection.execute(select(func.count()).select_from(self.rtree)).scalar()
+        self.exists.mark_present()
+        return count
+
+    # --- Mapper events ---
+
+    def _before_insert(self, mapper, connection, target):
+        if target.latitude is None and target.longitude is None:
+            self._geocode(connection, target)
+
+    def _before_update(self, mapper, connection, target):
+        state = inspect(target)
+        if state.attrs.latitude.history.has_changes() or state.attrs.longitude.history.has_changes():
+            return   # set explicitly
+        if state.attrs[self.text_column].history.has_changes():
+            self._geocode(connection, target)
+
+    def _geocode(self, connection, target):
+        point = geocode(getattr(target, self.text_column), connection)
+        target.latitude, target.longitude = point or (None, None)
+
+    def _after_write(self, mapper, connection, target):
+        if not self.is_enabled(connection):
+            return
+        state = inspect(target)
+        if not (state.attrs.latitude.history.has_changes() or state.attrs.longitude.history.has_changes()):
+            return
+        connection.execute(self.rtree.delete().where(self.rtree.c.id == target.id))
+        if target.latitude is not None and target.longitude is not None:
+            connection.execute(self.rtree.insert().values(
+                id=target.id, min_lat=target.latitude, max_lat=target.latitude,
+                min_lng=target.longitude, max_lng=target.longitude
+            ))
+
+    def _after_delete(self, mapper, connection, target):
+        if self.is_enabled(connection):
+            connection.execute(self.rtree.delete().where(self.rtree.c.id == target.id))
+
+
+INDEXES = {
+    Listing: GeoIndex(Listing, 'location', 'listings_geo'),
+    Business: GeoIndex(Business, 'address', 'businesses_geo'),
+    Event: GeoIndex(Event, 'location', 'events_geo'),
+}
+
+
+# --- Geocoding ---
+
+# [(pattern, lat, lng)], longest name first so "El Centro" beats "Cuenca".
+_gazetteer = None
+
+
+def _places(connection=None):
+    global _gazetteer
+    if _gazetteer is None:
+        rows = (connection or db.session).execute(select(Place.name, Place.latitude, Place.longitude)).all()
+        rows = sorted(rows, key=lambda row: -len(row.name))
+        _gazetteer = [
+            (re.compile(r'\b' + re.escape(fold(row.name)) + r'\b'), row.latitude, row.longitude)
+            for row in rows
+        ]
+    return _gazetteer
+
+
+@after_commit_of(Place)
+def _forget_places():
+    global _gazetteer
+    _gazetteer = None
+
+
+def geocode(value, connection=None):
+    """(lat, lng) of the first known place named in value, or None."""
+    folded = fold(value)
+    if not folded.strip():
+        return None
+    for pattern, lat, lng in _places(connection):
+        if pattern.search(folded):
+            return lat, lng
+    return None
+
+
+def seed_places():
+    """Insert the LOCAL_PLACES rows that are missing; returns how many were added."""
+    existing = set(db.session.scalars(select(Place.name)))
+    missing = [dict(name=name, latitude=lat, longitude=lng) for name, lat, lng in LOCAL_PLACES if name not in existing]
+    if missing:
+        db.session.execute(Place.__table__.insert(), missing)
+        db.session.commit()
+        _forget_places()
+    return len(missing)
+
+
+# --- Distance filter ---
+
+def parse_near(args):
+    """Near from request args near=lat,lng|place and radius=km, or None if near is not given.
+
+    Raises ValueError when near is given but can't be used (coordinates out
+    of range, or a place we can't find), so callers don't quietly drop the
+    filter and show everything.
+    """
+    raw = (args.get('near') or '').strip()
+    if not raw:
+        return None
+    radius = args.get('radius', DEFAULT_RADIUS_KM, type=float) or DEFAULT_RADIUS_KM
+    radius = min(max(radius, 0.1), MAX_RADIUS_KM)
+    match = _COORDINATES_RE.fullmatch(raw)
+    if match:
+        lat, lng = float(match[1]), float(match[2])
+        if not (-90 <= lat <= 90 and -180 <= lng <= 180):
+            raise ValueError(f'{raw} is not a valid latitude,longitude.')
+    else:
+        point = geocode(raw)
+        if point is None:
+            raise ValueError(f'Could not find a place called "{raw}".')
+        lat, lng = point
+    return Near(lat, lng, radius)
+
+
+def bounding_box(near):
+    """(south, north, west, east) of the box around the circle."""
+    dlat = math.degrees(near.radius / EARTH_RADIUS_KM)
+    cos_lat = math.cos(math.radians(near.lat))
+    dlng = 180.0 if cos_lat < 1e-6 else min(180.0, math.degrees(near.radius / (EARTH_RADIUS_KM * cos_lat)))
+    return near.lat - dlat, near.lat + dlat, near.lng - dlng, near.lng + dlng
+
+
+def distance(model, near):
+    """SQL expression: km between each row's point and near (NULL without coordinates)."""
+    if db.engine.dialect.name == 'sqlite':
+        return func.geo_distance_km(model.latitude, model.longitude, near.lat, near.lng, type_=Float)
+    lat1, lng1 = func.radians(model.latitude), func.radians(model.longitude)
+    lat2, lng2 = math.radians(near.lat), math.radians(near.lng)
+    a = func.power(func.sin((lat1 - lat2) / 2), 2) + \
+        func.cos(lat1) * math.cos(lat2) * func.power(func.sin((lng1 - lng2) / 2), 2)
+    return literal(2 * EARTH_RADIUS_KM) * func.asin(func.sqrt(a))
+
+
+def near_condition(model, near):
+    """WHERE clause: bounding-box prefilter, then exact distance <= radius."""
+    south, north, west, east = bounding_box(near)
+    index = INDEXES[model]
+    if index.is_enabled():
+        prefilter = model.id.in_(index.candidates(south, north, west, east))
+    else:
+        prefilter = and_(model.latitude.between(south, north), model.longitude.between(west, east))
+    return and_(prefilter, distance(model, near) <= near.radius)
+
+
+def distance_km(lat1, lng1, lat2, lng2):
+    if None in (lat1, lng1, lat2, lng2):
+        return None
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    a = math.sin((phi2 - phi1) / 2) ** 2 + \
+        math.cos(phi1) * math.cos(phi2) * math.sin(math.radians(lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+@event.listens_for(Engine, 'connect')
+def _register_sqlite_functions(dbapi_connection, connection_record):
+    if isinstance(dbapi_connection, sqlite3.Connection):
+        dbapi_connection.create_function('geo_distance_km', 4, distance_km, deterministic=True)
+
+
+geo_cli = AppGroup('geo', help='Geocoding and spatial indexes.')
+
+
+@geo_cli.command('reindex')
+def reindex_command():
+    """Seed missing places, geocode rows without coordinates and rebuild the R*Tree tables."""
+    added = seed_places()
+    if added:
+        click.echo(f'Added {added} places.')
+    for index in INDEXES.values():
+        click.echo(f'{index.rtree.name}: {index.rebuild()} rows.')
@@ -0,0 +1,262 @@
+# app/jobs.py
+
+import atexit
+import threading
+import time
+import uuid
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+import click
+from flask.cli import AppGroup
+from sqlalchemy import or_, select, update
+from sqlalchemy.exc import IntegrityError
+
+from . import db
+from .model_events import mark_changed
+from .models import JobLock, Listing, User
+
+# Periodic maintenance jobs, run without an external broker.
+#
+# Jobs register with @scheduler.job(name, interval). JobRunner.run_pending()
+# runs every job that is due, and is driven either by a background thread in
+# the web process (JOBS_SCHEDULER_THREAD, started on the first request) or by
+# a separate process:
+#
+#   flask jobs run            # run due jobs every JOBS_TICK_INTERVAL seconds
+#   flask jobs run --once     # run due jobs, then exit (e.g. from cron)
+#   flask jobs exec <name>    # run one job now, due or not
+#   flask jobs list
+#
+# Several web workers and CLI runners can be up at once: an exclusive job
+# first takes its job_locks row with one conditional UPDATE (free lease and
+# interval elapsed since the last start), so it runs once per interval across
+# all of them. Leases expire after JOBS_LOCK_TIMEOUT in case a runner dies.
+# Non-exclusive jobs act on per-process state (e.g. the in-memory counters)
+# and run in every process on their own timer.
+
+Job = namedtuple('Job', 'name func interval exclusive')
+
+
+class JobRunner:
+
+    def __init__(self):
+        self.app = None
+        self.jobs = {}
+        self._last_local_run = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def init_app(self, app):
+        self.app = app
+        app.before_request(self.wake)
+        atexit.register(self.shutdown)
+
+    def job(self, name, interval, exclusive=True):
+        """Register func as a job run every interval seconds."""
+        def decorator(func):
+            self.jobs[name] = Job(name, func, interval, exclusive)
+            return func
+        return decorator
+
+    def run_pending(self):
+        """Run every due job once (needs an app context); returns {name: result}."""
+        results = {}
+        for job in list(self.jobs.values()):
+            try:
+                ran, result = self.run(job.name)
+            except Exception:
+                db.session.rollback()
+                self.app.logger.exception('Job %s failed', job.name)
+                continue
+            if ran:
+                results[job.name] = result
+        return results
+
+    def run(self, name, force=False):
+        """Run one job if it is due and free; returns (ran, result)."""
+        job = self.jobs[name]
+        if not job.exclusive:
+            now = time.monotonic()
+            with self._lock:
+                if not force and now - self._last_local_run.get(name, float('-inf')) < job.interval:
+                    return False, None
+                self._last_local_run[name] = now
+            return True, job.func()
+
+        token = self._acquire(job, force)
+        if token is None:
+            return False, None
+        error = None
+        try:
+            return True, job.func()
+        except Exception as e:
+            db.session.rollback()
+            error = repr(e)
+            raise
+        finally:
+            self._release(job, token, error)
+
+    def _acquire(self, job, force):
+        now = datetime.utcnow()
+        token = uuid.uuid4().hex
+        conditions = [
+            JobLock.name == job.name,
+            or_(JobLock.locked_until.is_(None), JobLock.locked_until < now),
+        ]
+        if not force:
+            conditions.append(or_(
+                JobLock.last_started_at.is_(None),
+                JobLock.last_started_at <= now - timedelta(seconds=job.interval)
+            ))
+        for _ in range(2):
+            claimed = db.session.execute(
+                update(JobLock).where(*conditions)
+                .values(locked_by=token, locked_until=now + timedelta(seconds=self.app.config['JOBS_LOCK_TIMEOUT']),
+                        last_started_at=now)
+                .execution_options(synchronize_session=False)
+            ).rowcount
+            db.session.commit()
+            if claimed:
+                return token
+            if db.session.get(JobLock, job.name) is not None:
+                return None
+            # First run anywhere: create the row, then race for it like everyone else.
+            try:
+                db.session.add(JobLock(name=job.name))
+                db.session.commit()
+            except IntegrityError:
+                db.session.rollback()
+        return None
+
+    def _release(self, job, token, error):
+        db.session.execute(
+            update(JobLock).where(JobLock.name == job.name, JobLock.locked_by == token)
+            .values(locked_by=None, locked_until=None, last_finished_at=datetime.utcnow(), last_error=error)
+            .execution_options(synchronize_session=False)
+        )
+        db.session.commit()
+
+    def wake(self):
+        # Started lazily so CLI commands and migrations don't spawn a thread.
+        if self._thread is not None or self.app is None or not self.app.config.get('JOBS_SCHEDULER_THREAD'):
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='job-scheduler', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.app.config['JOBS_TICK_INTERVAL']):
+            try:
+                with self.app.app_context():
+                    self.run_pending()
+            except Exception:
+                self.app.logger.exception('Failed to run scheduled jobs')
+
+    def shutdown(self):
+        self._stop.set()
+
+
+scheduler = JobRunner()
+
+
+def _in_batches(model, condition, values, changed=()):
+    """UPDATE model SET values WHERE condition, JOBS_BATCH_SIZE rows per transaction.
+
+    Short transactions keep the SQLite write lock from blocking requests for
+    the whole run. Returns the number of rows updated.
+    """
+    batch_size = scheduler.app.config['JOBS_BATCH_SIZE']
+    total = 0
+    while True:
+        ids = select(model.id).where(condition).limit(batch_size)
+        count = db.session.execute(
+            update(model).where(model.id.in_(ids)).values(**values)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        if count:
+            mark_changed(db.session, *changed)
+        db.session.commit()
+        total += count
+        if count < batch_size:
+            return total
+
+
+@scheduler.job('expire-subscriptions', interval=300)
+def expire_subscriptions():
+    """Move premium users whose subscription has ended back to the free plan."""
+    now = datetime.utcnow()
+    return _in_batches(
+        User,
+        (User.subscription_status == 'premium') & (User.subscription_end_date <= now),
+        dict(subscription_status='free'),
+        changed=(User,)
+    )
+
+
+@scheduler.job('expire-boosts', interval=300)
+def expire_boosts():
+    """Stop sponsoring listings whose boost has run out."""
+    now = datetime.utcnow()
+    return _in_batches(
+        Listing,
+        (Listing.is_sponsored == True) & (Listing.sponsored_until <= now),
+        dict(is_sponsored=False, sponsored_until=None),
+        changed=(Listing,)
+    )
+
+
+@scheduler.job('refresh-ad-pool', interval=30, exclusive=False)
+def refresh_ad_pool():
+    """Reload this process's ad pool, so requests don't pay for it when it expires."""
+    from .ads.pool import ad_pool
+    return ad_pool.refresh()
+
+
+@scheduler.job('flush-counters', interval=60, exclusive=False)
+def flush_counters():
+    """Write this process's buffered view and impression counts."""
+    from .counters import ad_impressions, view_counter
+    return view_counter.flush() + ad_impressions.flush()
+
+
+jobs_cli = AppGroup('jobs', help='Periodic maintenance jobs.')
+
+
+@jobs_cli.command('list')
+def list_command():
+    """Show the registered jobs and when they last ran."""
+    locks = {lock.name: lock for lock in JobLock.query}
+    for job in scheduler.jobs.values():
+        lock = locks.get(job.name)
+        last = f'{lock.last_started_at:%Y-%m-%d %H:%M:%S}' if lock and lock.last_started_at else 'never'
+        state = ' (running)' if lock and lock.locked_by else ''
+        scope = '' if job.exclusive else ', per process'
+        click.echo(f'{job.name:<24} every {job.interval}s{scope}; last run {last}{state}')
+
+
+@jobs_cli.command('run')
+@click.option('--once', is_flag=True, help='Run the jobs that are due, then exit.')
+def run_command(once):
+    """Run due jobs until interrupted."""
+    interval = scheduler.app.config['JOBS_TICK_INTERVAL']
+    if not once:
+        click.echo(f'Running due jobs every {interval}s (Ctrl+C to stop).')
+    while True:
+        for name, result in scheduler.run_pending().items():
+            click.echo(f'{name}: {result}')
+        if once:
+            break
+        time.sleep(interval)
+
+
+@jobs_cli.command('exec')
+@click.argument('name')
+def exec_command(name):
+    """Run one job now, even if it isn't due (still waits for no other runner to hold it)."""
+    if name not in scheduler.jobs:
+        raise click.BadParameter(f'unknown job {name!r}; see `flask jobs list`', param_hint='NAME')
+    ran, result = scheduler.run(name, force=True)
+    click.echo(f'{name}: {result}' if ran else f'{name} is running elsewhere.')
@@ -0,0 +1,86 @@
+# app/listings/facets.py
+
+from collections import namedtuple
+
+from sqlalchemy import case, func, literal, null, select, true, union_all
+
+from ..models import Listing, Tag, listing_tags
+from ..pagination import cached_query_result
+from .. import db, refdata
+
+# Sidebar counts for the browse page: listings per category, per price
+# bucket and per tag, for whatever filter is active. All three come from a
+# single statement: the filtered listings go into a CTE that three GROUP BY
+# branches read, joined with UNION ALL.
+#
+# Results are memoised with the page totals (pagination.cached_query_result).
+# The key is the compiled SQL and its parameters, which is already a
+# normalised filter key: search terms are folded, tags normalised and
+# resolved to ids, and empty arguments never reach the query. The cache is
+# cleared whenever a listing, category or tag write commits.
+#
+# Every listing has a category, so the category counts also add up to the
+# page's "N listings found" total and no separate COUNT is needed.
+
+# Upper bounds of the price buckets; the last bucket is "PRICE_EDGES[-1] and up".
+PRICE_EDGES = (50, 100, 250, 500, 1000, 2500, 5000)
+TOP_TAGS = 15
+
+Facets = namedtuple('Facets', 'total categories prices tags')
+CategoryFacet = namedtuple('CategoryFacet', 'id name count')
+PriceFacet = namedtuple('PriceFacet', 'min max count')   # max is None for the open-ended bucket
+TagFacet = namedtuple('TagFacet', 'name count')
+
+
+def compute(listings_query, exclude_tags=()):
+    """Facets for the listings matched by `listings_query` (cached)."""
+    return cached_query_result(listings_query, 'facets', lambda q: _compute(q, tuple(exclude_tags)))
+
+
+def _compute(listings_query, exclude_tags):
+    matching = listings_query.order_by(None) \
+        .with_entities(Listing.id, Listing.category_id, Listing.price).cte('matching')
+    n = func.count().label('n')
+
+    by_category = select(
+        literal('category').label('facet'), matching.c.category_id.label('value'),
+        null().label('label'), n
+    ).group_by(matching.c.category_id)
+
+    bucket = case(
+        *[(matching.c.price < edge, i) for i, edge in enumerate(PRICE_EDGES)],
+        else_=len(PRICE_EDGES)
+    )
+    by_price = select(
+        literal('price').label('facet'), bucket.label('value'), null().label('label'), n
+    ).where(matching.c.price.is_not(None)).group_by(bucket)
+
+    top_tags = select(
+        literal('tag').label('facet'), Tag.id.label('value'), Tag.name.label('label'), n
+    ).select_from(matching) \
+        .join(listing_tags, listing_tags.c.listing_id == matching.c.id) \
+        .join(Tag, Tag.id == listing_tags.c.tag_id) \
+        .where(Tag.name.not_in(exclude_tags) if exclude_tags else true()) \
+        .group_by(Tag.id, Tag.name) \
+        .order_by(n.desc(), Tag.name) \
+        .limit(TOP_TAGS) \
+        .subquery()
+
+    rows = db.session.execute(union_all(by_category, by_price, select(top_tags))).all()
+
+    category_counts = {value: count for facet, value, _, count in rows if facet == 'category'}
+    categories = [
+        CategoryFacet(c.id, c.name, category_counts[c.id])
+        for c in refdata.categories() if c.id in category_counts
+    ]
+    price_counts = {value: count for facet, value, _, count in rows if facet == 'price'}
+    bounds = (0,) + PRICE_EDGES + (None,)
+    prices = [
+        PriceFacet(bounds[i], bounds[i + 1], price_counts[i])
+        for i in range(len(PRICE_EDGES) + 1) if i in price_counts
+    ]
+    tags = sorted(
+        (TagFacet(label, count) for facet, _, label, count in rows if facet == 'tag'),
+        key=lambda t: (-t.count, t.name)
+    )
+    return Facets(sum(category_counts.values()), categories, prices, tags)
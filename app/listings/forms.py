@@ -4,7 +4,7 @@ from flask_wtf import FlaskForm
 from wtforms import StringField, TextAreaField, FloatField, SelectField, SubmitField
 # Make sure to import Optional from wtforms.validators!
 from wtforms.validators import DataRequired, Length, Optional, URL, Email 
-from ..models import Category
+from .. import refdata
 
 class ListingForm(FlaskForm):
     title = StringField('Title', validators=[DataRequired(), Length(min=1, max=120)])
@@ -19,4 +19,4 @@ class ListingForm(FlaskForm):
 
     def __init__(self, *args, **kwargs):
         super(ListingForm, self).__init__(*args, **kwargs)
-        self.category.choices = [(c.id, c.name) for c in Category.query.order_by('name').all()]
\ No newline at end of file
+        self.category.choices = refdata.category_choices()
\ No newline at end of file
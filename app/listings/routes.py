@@ -1,38 +1,45 @@
 # app/listings/routes.py
 
+import click
 from flask import Blueprint, abort, render_template, redirect, url_for, flash, request, current_app
 from flask_login import login_required, current_user
 from .forms import ListingForm
-from ..models import Listing, Category, User
+from . import facets, search, tags
+from ..models import Listing, Category, Tag, User
 from .. import db
+from ..pagination import keyset_paginate, clear_count_cache
+from ..counters import view_counter
+from .. import geo, loading, refdata
+from ..model_events import after_commit_of
+from ..response_cache import response_cache
 from datetime import datetime, timedelta
+from sqlalchemy import false
 
 listings_bp = Blueprint('listings', __name__, url_prefix='/listings')
 
 # ONLY ONE DEFINITION OF ALL_LISTINGS, WITH SEARCH/FILTER LOGIC
 @listings_bp.route('/') # This makes /listings also show all listings
 @listings_bp.route('/all')
+@response_cache.cached(tag='listings')
 def all_listings():
-    page = request.args.get('page', 1, type=int)
+    after = request.args.get('after')
+    before = request.args.get('before')
     per_page = 12
     query = request.args.get('q', '').strip()
     category_id = request.args.get('category_id', type=int)
     min_price = request.args.get('min_price', type=float)
     max_price = request.args.get('max_price', type=float)
     # ... (keep your print statements for debugging) ...
-    listings_query = Listing.query.filter_by(status='published')
-    # Apply search filter if 'q' (keyword query) is provided
+    listings_query = Listing.query.options(*loading.LISTING_CARD).filter_by(status='published')
+    # Apply search filter if 'q' (keyword query) is provided.
+    # Uses the FTS5 index (see search.py); rank is None on the LIKE fallback.
+    rank = None
     if query:
-        listings_query = listings_query.filter(
-            or_(
-                Listing.title.ilike(f'%{query}%'),
-                Listing.description.ilike(f'%{query}%')
-            )
-        )
+        listings_query, rank = search.search(listings_query, query)
 
     # Apply category filter if category_id is provided
     if category_id:
-        listings_query = listings_query.filter_by(category_id=category_id)
+        listings_query = listings_query.filter(Listing.category_id == category_id)
 
     # Apply minimum price filter if min_price is provided
     if min_price is not None:
@@ -42,33 +49,68 @@ def all_listings():
     if max_price is not None:
         listings_query = listings_query.filter(Listing.price <= max_price)
 
-    # Apply tags filter
-    tags = request.args.get('tags', '').strip()
-    if tags:
-        tag_names = [tag.strip() for tag in tags.split(',') if tag.strip()]
-        if tag_names:
-            for tag_name in tag_names:
-                listings_query = listings_query.filter(Listing.tags.any(name=tag_name))
-
-    # --- MODIFIED ORDERING: Sponsored first, then by creation date ---
-    paginated_listings = listings_query.order_by(
-        Listing.is_sponsored.desc(), # True (1) comes before False (0)
-        Listing.created_at.desc()
-    ).paginate(
-        page=page,
+    # Apply tags filter: all of `tags`, any of `tags_any`, none of `tags_not`
+    tag_filter = tags.parse_filter(request.args)
+    listings_query = tags.apply_filter(listings_query, tag_filter)
+
+    # Apply distance filter: near=lat,lng or a place name, radius in km (see geo.py)
+    near_error = None
+    try:
+        near = geo.parse_near(request.args)
+    except ValueError as e:
+        # Unknown place: no results rather than every listing.
+        near, near_error = None, str(e)
+        listings_query = listings_query.filter(false())
+    distance = None
+    if near:
+        listings_query = listings_query.filter(geo.near_condition(Listing, near))
+        distance = geo.distance(Listing, near)
+    # Sidebar counts for this filter (categories, price buckets, tags), cached
+    listing_facets = facets.compute(listings_query, exclude_tags=tag_filter.all)
+
+    # --- MODIFIED ORDERING: Sponsored first, then relevance (when searching), then by creation date ---
+    # Keyset pagination: id breaks ties so the sort key is unique.
+    key_columns = [(Listing.is_sponsored, True)] # True (1) comes before False (0)
+    if rank is not None:
+        key_columns.append((rank, False)) # bm25: lower is more relevant
+    if distance is not None:
+        key_columns.append((distance, False)) # nearest first
+    key_columns += [(Listing.created_at, True), (Listing.id, True)]
+    paginated_listings = keyset_paginate(
+        listings_query,
+        key_columns,
         per_page=per_page,
-        error_out=False
+        after=after,
+        before=before,
+        total=listing_facets.total
     )
     # -----------------------------------------------------------------
 
     listings = paginated_listings.items
-    categories = Category.query.order_by(Category.name).all()
+    categories = refdata.categories()
 
     return render_template('listings/all_listings.html', 
                            title='All Listings', 
                            listings=listings,
                            categories=categories,
-                           pagination=paginated_listings)
+                           pagination=paginated_listings,
+                           facets=listing_facets,
+                           near=near,
+                           near_error=near_error,
+                           browse_url=_browse_url)
+
+
+def _browse_url(add_tag=None, **changes):
+    """The current browse URL with some filters changed (None removes one), back on page 1."""
+    args = {k: v for k, v in request.args.items() if k not in ('after', 'before', 'page')}
+    if add_tag:
+        args['tags'] = ','.join(tags.parse(args.get('tags')) + [add_tag])
+    for key, value in changes.items():
+        if value is None:
+            args.pop(key, None)
+        else:
+            args[key] = value
+    return url_for('listings.all_listings', **args)
 
 @listings_bp.route('/new', methods=['GET', 'POST'])
 @login_required # Only logged-in users can create listings
@@ -78,31 +120,22 @@ def new_listing():
         flash('You have reached your free listing limit. Please upgrade to a premium plan to post more listings.', 'warning')
         return redirect(url_for('main.profile')) # Redirect to profile or a subscription page
 
-    form = ListingForm()
-    form.category.choices = [(c.id, c.name) for c in Category.query.order_by('name').all()]
+    form = ListingForm() # Category choices come from the reference-data cache
 
     if form.validate_on_submit():
-        category = Category.query.get(form.category.data) # Get the Category object
         listing = Listing(
             title=form.title.data,
             description=form.description.data,
-            category=category, # Assign the Category object
+            category_id=form.category.data,
             user_id=current_user.id, # Assign the current logged-in user as the owner
             location=form.location.data,
             contact_email=form.contact_email.data,
             contact_phone=form.contact_phone.data,
             price=form.price.data,
         )
-        # Handle tags
-        tag_names = [tag.strip() for tag in form.tags.data.split(',') if tag.strip()] if form.tags.data else []
-        for tag_name in tag_names:
-            tag = Tag.query.filter_by(name=tag_name).first()
-            if not tag:
-                tag = Tag(name=tag_name)
-                db.session.add(tag)
-            listing.tags.append(tag)
-
         db.session.add(listing)
+        # Handle tags: resolved and linked in bulk (see tags.py)
+        tags.set_listing_tags(listing, form.tags.data)
         # Increment listing count for free users
         if current_user.subscription_status == 'free':
             current_user.listing_count += 1
@@ -113,11 +146,12 @@ def new_listing():
 
 @listings_bp.route('/<int:listing_id>')
 def view_listing(listing_id):
-    listing = Listing.query.get_or_404(listing_id)
-    # Optionally increment views count here
-    listing.views_count += 1
-    db.session.commit()
-    return render_template('listings/view_listing.html', title=listing.title, listing=listing)
+    listing = Listing.query.options(*loading.LISTING_DETAIL).get_or_404(listing_id)
+    # Views are buffered in memory and written in batches (see counters.py),
+    # so a page view no longer needs a write transaction.
+    view_counter.increment(listing.id)
+    views_count = (listing.views_count or 0) + view_counter.pending(listing.id)
+    return render_template('listings/view_listing.html', title=listing.title, listing=listing, views_count=views_count)
 
 @listings_bp.route('/<int:listing_id>/edit', methods=['GET', 'POST'])
 @login_required
@@ -130,11 +164,7 @@ def edit_listing(listing_id):
     if listing.author != current_user:
         abort(403) # Forbidden
 
-    form = ListingForm()
-
-    # Populate category choices for the form (same as create_listing)
-    categories = Category.query.order_by(Category.name).all()
-    form.category.choices = [(c.id, c.name) for c in categories]
+    form = ListingForm() # Category choices come from the reference-data cache
 
     if form.validate_on_submit():
         listing.title = form.title.data
@@ -143,17 +173,11 @@ def edit_listing(listing_id):
         listing.price = form.price.data if form.price.data is not None else None
         listing.location = form.location.data
         listing.contact_email = form.contact_email.data
-        listing.contact_phone.data = form.contact_phone.data
-
-        # Handle tags
-        listing.tags.clear()
-        tag_names = [tag.strip() for tag in form.tags.data.split(',') if tag.strip()]
-        for tag_name in tag_names:
-            tag = Tag.query.filter_by(name=tag_name).first()
-            if not tag:
-                tag = Tag(name=tag_name)
-                db.session.add(tag)
-            listing.tags.append(tag)
+        listing.contact_phone = form.contact_phone.data
+
+        # Handle tags: only links that changed are written (see tags.py)
+        tags.set_listing_tags(listing, form.tags.data)
+        db.session.commit()
         flash('Your listing has been updated!', 'success')
         return redirect(url_for('listings.view_listing', listing_id=listing.id))
     elif request.method == 'GET':
@@ -177,8 +201,10 @@ def boost_listing(listing_id):
     if listing.author != current_user:
         abort(403)
     listing.is_sponsored = True
+    until = datetime.utcnow() + timedelta(days=current_app.config['LISTING_BOOST_DAYS'])
+    listing.sponsored_until = until
     db.session.commit()
-    flash('Your listing has been boosted!', 'success')
+    flash(f'Your listing has been boosted until {until:%b %d, %Y}!', 'success')
     return redirect(url_for('main.my_listings'))
 
 @listings_bp.route('/<int:listing_id>/delete', methods=['POST'])
@@ -192,4 +218,17 @@ def delete_listing(listing_id):
     db.session.delete(listing)
     db.session.commit()
     flash('Your listing has been deleted!', 'success')
-    return redirect(url_for('main.my_listings'))
\ No newline at end of file
+    return redirect(url_for('main.my_listings'))
+
+@after_commit_of(Listing, Category, Tag)
+def _listings_changed():
+    # Cached browse pages and totals may show the changed rows.
+    response_cache.delete_tag('listings')
+    clear_count_cache()
+
+
+@listings_bp.cli.command('reindex')
+def reindex():
+    """Rebuild the full-text search index for listings."""
+    count = search.rebuild_index()
+    click.echo(f'Indexed {count} listings.')
@@ -0,0 +1,18 @@
+# app/listings/search.py
+
+from ..fts import FtsIndex
+from ..models import Listing
+
+# Keyword search for listings through listings_fts (see fts.py). Title hits
+# rank above location hits, which rank above description hits; without
+# FTS5 search falls back to LIKE on title and description.
+index = FtsIndex(
+    Listing, 'listings_fts',
+    columns=('title', 'description', 'location'),
+    weights=(10.0, 1.0, 2.0),
+    like_columns=('title', 'description')
+)
+
+search = index.search
+rebuild_index = index.rebuild
+is_enabled = index.is_enabled
@@ -0,0 +1,130 @@
+# app/listings/tags.py
+
+import re
+import unicodedata
+from collections import namedtuple
+
+from sqlalchemy import delete, false, func, select
+
+from ..models import Listing, Tag, listing_tags
+from ..model_events import mark_changed
+from ..upsert import insert_ignoring_duplicates
+from .. import db
+
+# Set-based tag handling for listing create/edit.
+#
+# Names are normalised (accents stripped, lower-cased, whitespace collapsed)
+# so "Pet  Friendly", "pet friendly" and "Pét friendly" are one tag. A save
+# then costs a fixed number of statements however many tags it has: one IN
+# query to resolve names, one INSERT ... ON CONFLICT DO NOTHING for the
+# missing ones (safe when two requests create the same tag at once), and
+# only the added/removed rows are written to listing_tags.
+#
+# Browsing filters by tag with set operations over listing_tags (the
+# "postings" of each tag), after resolving every requested name in one query:
+#   tags=a,b       listings with all of them   IN (... GROUP BY listing HAVING count = 2)
+#   tags_any=c,d   with at least one of them   IN (... WHERE tag_id IN (c, d))
+#   tags_not=e     with none of them           NOT IN (...)
+
+MAX_TAG_LENGTH = 64
+
+TagFilter = namedtuple('TagFilter', 'all any none')
+
+_WHITESPACE_RE = re.compile(r'\s+')
+
+
+def normalize(name):
+    decomposed = unicodedata.normalize('NFKD', name or '')
+    folded = ''.join(c for c in decomposed if not unicodedata.combining(c)).casefold()
+    return _WHITESPACE_RE.sub(' ', folded).strip()[:MAX_TAG_LENGTH].strip()
+
+
+def parse(raw):
+    """Comma-separated input -> normalised, de-duplicated names in input order."""
+    names = (normalize(part) for part in (raw or '').split(','))
+    return list(dict.fromkeys(name for name in names if name))
+
+
+def resolve(names, create=False):
+    """Map normalised names to tag ids with one query; with create=True, add missing tags."""
+    names = list(dict.fromkeys(names))
+    if not names:
+        return {}
+    found = _lookup(names)
+    missing = [name for name in names if name not in found]
+    if create and missing:
+        db.session.execute(insert_ignoring_duplicates(Tag.__table__, ['name']),
+                           [{'name': name} for name in missing])
+        # Re-read rather than trust lastrowid: a concurrent request may have won the insert.
+        found.update(_lookup(missing))
+        mark_changed(db.session, Tag)
+    return found
+
+
+def parse_filter(args):
+    """TagFilter from request args tags / tags_any / tags_not."""
+    return TagFilter(parse(args.get('tags')), parse(args.get('tags_any')), parse(args.get('tags_not')))
+
+
+def apply_filter(listings_query, tag_filter):
+    """Restrict a Listing query by a TagFilter, resolving all names in one query."""
+    if not any(tag_filter):
+        return listings_query
+    ids = resolve(tag_filter.all + tag_filter.any + tag_filter.none)
+
+    if tag_filter.all:
+        if any(name not in ids for name in tag_filter.all):
+            return listings_query.filter(false())
+        all_ids = {ids[name] for name in tag_filter.all}
+        postings = _postings(all_ids)
+        if len(all_ids) > 1:
+            # Pairs are unique, so a listing with every tag has exactly len(all_ids) rows.
+            postings = postings.group_by(listing_tags.c.listing_id).having(func.count() == len(all_ids))
+        listings_query = listings_query.filter(Listing.id.in_(postings))
+
+    if tag_filter.any:
+        any_ids = {ids[name] for name in tag_filter.any if name in ids}
+        if not any_ids:
+            return listings_query.filter(false())
+        listings_query = listings_query.filter(Listing.id.in_(_postings(any_ids)))
+
+    none_ids = {ids[name] for name in tag_filter.none if name in ids}
+    if none_ids:
+        listings_query = listings_query.filter(Listing.id.not_in(_postings(none_ids)))
+    return listings_query
+
+
+def set_listing_tags(listing, raw):
+    """Make the listing's tags exactly the ones in `raw`, writing only the difference."""
+    if listing.id is None:
+        db.session.flush()
+    wanted = set(resolve(parse(raw), create=True).values())
+    current = set(db.session.scalars(
+        select(listing_tags.c.tag_id).where(listing_tags.c.listing_id == listing.id)
+    ))
+
+    removed = current - wanted
+    added = wanted - current
+    if removed:
+        db.session.execute(delete(listing_tags).where(
+            listing_tags.c.listing_id == listing.id,
+            listing_tags.c.tag_id.in_(removed)
+        ))
+    if added:
+        db.session.execute(
+            insert_ignoring_duplicates(listing_tags, ['listing_id', 'tag_id']),
+            [{'listing_id': listing.id, 'tag_id': tag_id} for tag_id in sorted(added)]
+        )
+    if removed or added:
+        # The rows were written behind the ORM's back.
+        db.session.expire(listing, ['tags'])
+        mark_changed(db.session, Listing)
+    return added, removed
+
+
+def _postings(tag_ids):
+    return select(listing_tags.c.listing_id).where(listing_tags.c.tag_id.in_(sorted(tag_ids)))
+
+
+def _lookup(names):
+    return dict(db.session.execute(select(Tag.name, Tag.id).where(Tag.name.in_(names))).all())
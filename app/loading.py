@@ -0,0 +1,59 @@
+# app/loading.py
+
+# Eager-loading options, one set per kind of page.
+#
+# Templates walk relationships like listing.author or review.author for every
+# row; left lazy, that is one extra SELECT per row. Each route passes the set
+# matching what its template renders, e.g.
+#
+#     Listing.query.options(*loading.LISTING_CARD)
+#
+# Many-to-one relationships use joinedload (same SELECT), collections use
+# selectinload (one extra SELECT ... WHERE id IN (...) for the whole page).
+
+from sqlalchemy.orm import joinedload, selectinload
+
+from .models import Business, Conversation, ForumComment, ForumPost, Listing, Message, Review
+
+# listings/_listings_cards.html and the homepage.
+LISTING_CARD = (
+    joinedload(Listing.author),
+    joinedload(Listing.category),
+    selectinload(Listing.tags),
+)
+
+# listings/view_listing.html and edit_listing.html.
+LISTING_DETAIL = LISTING_CARD
+
+# forum/category.html
+FORUM_POST_ROW = (
+    joinedload(ForumPost.author),
+)
+
+# forum/post.html
+FORUM_COMMENT_ROW = (
+    joinedload(ForumComment.author),
+)
+
+# directory/businesses.html
+BUSINESS_ROW = (
+    joinedload(Business.category),
+)
+
+# users/profile.html and directory/business.html
+REVIEW_ROW = (
+    joinedload(Review.author),
+)
+
+# messages/conversation.html
+MESSAGE_ROW = (
+    joinedload(Message.sender),
+)
+
+# messages/conversations.html
+CONVERSATION_ROW = (
+    joinedload(Conversation.listing),
+    joinedload(Conversation.user_a),
+    joinedload(Conversation.user_b),
+    joinedload(Conversation.last_message),
+)
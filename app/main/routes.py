@@ -1,24 +1,25 @@
 # app/main/routes.py
 
-from flask import Blueprint, render_template, url_for
+from flask import Blueprint, render_template, redirect, url_for
 from flask_login import login_required, current_user
-from ..models import Listing, User, Category, Role, Ad
+from ..models import Listing, User, Category, Role
 from app.listings.forms import ListingForm 
-from app import db 
-from datetime import datetime 
+from app import loading
+from app.response_cache import response_cache
 
 # Create a Blueprint
 main_bp = Blueprint('main', __name__)
 
 @main_bp.route('/')
 @main_bp.route('/index')
+@response_cache.cached(tag='listings')
 def index():
     """Homepage."""
     # Query for the 5 most recent listings
-    recent_listings = Listing.query.order_by(Listing.created_at.desc()).limit(5).all()
-    
-    # Query for a random active ad
-    random_ad = Ad.query.filter(Ad.is_active == True, Ad.start_date <= datetime.utcnow(), Ad.end_date >= datetime.utcnow()).order_by(db.func.random()).first()
+    recent_listings = Listing.query.options(*loading.LISTING_CARD).order_by(Listing.created_at.desc()).limit(5).all()
+
+    # No ad here: the page is response-cached, so index.html fetches one
+    # per visit from ads.serve_ad (weighted pick, impression counted).
 
     all_listings_url = url_for('listings.all_listings')
     create_listing_url = url_for('listings.new_listing')
@@ -29,7 +30,7 @@ def index():
         listings=recent_listings,  # Pass the listings to the template
         all_listings_url=all_listings_url, 
         create_listing_url=create_listing_url,
-        random_ad=random_ad
+        ad_serve_url=url_for('ads.serve_ad')
     )
 
 @main_bp.route('/profile')
@@ -49,7 +50,7 @@ def create_listing():
 def my_listings():
     # Query listings belonging to the current user, ordered by creation date (newest first)
     # Note: current_user.listings is available because of the 'backref' in Listing model's author relationship
-    user_listings = current_user.listings.order_by(Listing.created_at.desc()).all()
+    user_listings = current_user.listings.options(*loading.LISTING_CARD).order_by(Listing.created_at.desc()).all()
 
     return render_template('my_listings.html', title='My Listings', listings=user_listings)
 
@@ -0,0 +1,53 @@
+# app/messages/broker.py
+
+import threading
+from collections import OrderedDict
+
+
+class NotificationBroker:
+    """In-process wake-ups for long-polling clients, one channel per key.
+
+    A poller takes a token *before* checking the database, then waits:
+
+        token = broker.token(key)
+        ...query, nothing new...
+        broker.wait(key, token, timeout)
+
+    publish(key) after a commit wakes every waiter on that key. Anything
+    published between token() and wait() makes wait() return at once, so a
+    message can't slip in unnoticed between the query and the wait. Idle
+    waiters cost a sleeping thread and no database work.
+
+    Only requests in the same process are woken. Under several workers a
+    poller also re-checks the database when its wait times out, so a message
+    sent through another worker arrives within one poll timeout.
+    """
+
+    def __init__(self, max_channels=10000):
+        self.max_channels = max_channels
+        self._condition = threading.Condition()
+        self._sequence = 0
+        # key -> sequence number of its latest publish, oldest first.
+        self._latest = OrderedDict()
+
+    def token(self, key):
+        with self._condition:
+            return self._sequence
+
+    def publish(self, key):
+        with self._condition:
+            self._sequence += 1
+            self._latest[key] = self._sequence
+            self._latest.move_to_end(key)
+            # Forgetting a quiet channel only costs its waiters a timeout.
+            while len(self._latest) > self.max_channels:
+                self._latest.popitem(last=False)
+            self._condition.notify_all()
+
+    def wait(self, key, token, timeout):
+        """Block until key is published after token, or timeout. True if it was."""
+        with self._condition:
+            return self._condition.wait_for(lambda: self._latest.get(key, 0) > token, timeout)
+
+
+message_broker = NotificationBroker()
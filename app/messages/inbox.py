@@ -0,0 +1,102 @@
+# app/messages/inbox.py
+
+from sqlalchemy import case, delete, func, insert, or_, select, update
+
+from ..models import Conversation, Message
+from .. import db
+from ..upsert import dialect_insert
+
+# One Conversation row per thread (listing + two users) carries what the
+# inbox shows: the last message and each side's unread count. send_message
+# calls record_message before its commit, so the message and the summary are
+# written in the same transaction, with a single INSERT ... ON CONFLICT DO
+# UPDATE whose increments are done in SQL (no lost updates between writers).
+#
+# The inbox is then one query over the two (user, last_message_at) indexes
+# instead of a DISTINCT over every message the user has sent or received.
+#
+# rebuild() recomputes all rows from messages (unread counts start at zero).
+
+_KEY = ('listing_id', 'user_a_id', 'user_b_id')
+
+
+def thread_key(listing_id, user_id, other_id):
+    """(listing_id, user_a_id, user_b_id) in the canonical user order."""
+    user_a, user_b = sorted((user_id, other_id))
+    return listing_id, user_a, user_b
+
+
+def record_message(message):
+    """Update (or start) the message's thread; call before the commit."""
+    if message.id is None:
+        db.session.flush()
+    listing_id, user_a, user_b = thread_key(message.listing_id, message.sender_id, message.recipient_id)
+    sent_by_a = message.sender_id == user_a
+    table = Conversation.__table__
+    # The recipient gets one more unread message; replying means the sender has read the thread.
+    unread_col, read_col = ('unread_b', 'unread_a') if sent_by_a else ('unread_a', 'unread_b')
+    changes = {
+        'last_message_id': message.id,
+        'last_message_at': message.timestamp,
+        unread_col: table.c[unread_col] + 1,
+        read_col: 0,
+    }
+
+    upsert = dialect_insert(table)
+    if upsert is not None:
+        db.session.execute(upsert.values(
+            listing_id=listing_id, user_a_id=user_a, user_b_id=user_b,
+            last_message_id=message.id, last_message_at=message.timestamp,
+            **{unread_col: 1, read_col: 0}
+        ).on_conflict_do_update(index_elements=list(_KEY), set_=changes))
+        return
+
+    updated = db.session.execute(update(table).where(
+        table.c.listing_id == listing_id, table.c.user_a_id == user_a, table.c.user_b_id == user_b
+    ).values(changes))
+    if updated.rowcount == 0:
+        db.session.execute(insert(table).values(
+            listing_id=listing_id, user_a_id=user_a, user_b_id=user_b,
+            last_message_id=message.id, last_message_at=message.timestamp,
+            **{unread_col: 1, read_col: 0}
+        ))
+
+
+def find(listing_id, user_id, other_id):
+    listing_id, user_a, user_b = thread_key(listing_id, user_id, other_id)
+    return Conversation.query.filter_by(listing_id=listing_id, user_a_id=user_a, user_b_id=user_b).first()
+
+
+def mark_read(conversation, user_id):
+    """Zero user_id's unread count; returns True if anything changed (caller commits)."""
+    if conversation is None or not conversation.unread_for(user_id):
+        return False
+    if user_id == conversation.user_a_id:
+        conversation.unread_a = 0
+    else:
+        conversation.unread_b = 0
+    return True
+
+
+def for_user(user_id):
+    """Query for the user's threads; order by last_message_at, id (both descending)."""
+    return Conversation.query.filter(or_(
+        Conversation.user_a_id == user_id,
+        Conversation.user_b_id == user_id,
+    ))
+
+
+def rebuild():
+    """Recreate every Conversation row from messages with one INSERT ... SELECT."""
+    user_a = case((Message.sender_id < Message.recipient_id, Message.sender_id), else_=Message.recipient_id)
+    user_b = case((Message.sender_id < Message.recipient_id, Message.recipient_id), else_=Message.sender_id)
+    threads = select(
+        Message.listing_id, user_a, user_b, func.max(Message.id), func.max(Message.timestamp)
+    ).where(Message.sender_id != Message.recipient_id).group_by(Message.listing_id, user_a, user_b)
+
+    db.session.execute(delete(Conversation))
+    result = db.session.execute(insert(Conversation).from_select(
+        ['listing_id', 'user_a_id', 'user_b_id', 'last_message_id', 'last_message_at'], threads
+    ))
+    db.session.commit()
+    return result.rowcount
@@ -1,9 +1,14 @@
 # app/messages/routes.py
 
-from flask import Blueprint, render_template, redirect, url_for, flash, request
+from flask import Blueprint, current_app, render_template, redirect, url_for, flash, request, jsonify
 from flask_login import login_required, current_user
-from ..models import Message, User, Listing
+from ..models import Conversation, Message, User, Listing
 from .. import db
+from .. import loading
+from ..pagination import keyset_paginate
+from . import inbox
+from .broker import message_broker
+from ..notifications.outbox import enqueue
 from sqlalchemy import or_
 
 messages_bp = Blueprint('messages', __name__, url_prefix='/messages')
@@ -11,28 +16,75 @@ messages_bp = Blueprint('messages', __name__, url_prefix='/messages')
 @messages_bp.route('/')
 @login_required
 def conversations():
-    conversations = db.session.query(Message.listing_id, User.id, User.username).join(User, or_(Message.sender_id == User.id, Message.recipient_id == User.id)).filter(or_(Message.sender_id == current_user.id, Message.recipient_id == current_user.id)).filter(User.id != current_user.id).distinct().all()
-    return render_template('messages/conversations.html', title='Conversations', conversations=conversations)
+    pagination = keyset_paginate(
+        inbox.for_user(current_user.id).options(*loading.CONVERSATION_ROW),
+        [(Conversation.last_message_at, True), (Conversation.id, True)],
+        per_page=20,
+        after=request.args.get('after'),
+        before=request.args.get('before')
+    )
+    return render_template('messages/conversations.html', title='Conversations', conversations=pagination.items, pagination=pagination)
 
 @messages_bp.route('/conversation/<int:listing_id>/<int:recipient_id>', methods=['GET', 'POST'])
 @login_required
 def conversation(listing_id, recipient_id):
     listing = Listing.query.get_or_404(listing_id)
     recipient = User.query.get_or_404(recipient_id)
-    messages = Message.query.filter(
-        Message.listing_id == listing_id,
-        or_(
-            (Message.sender_id == current_user.id) & (Message.recipient_id == recipient_id),
-            (Message.sender_id == recipient_id) & (Message.recipient_id == current_user.id)
-        )
-    ).order_by(Message.timestamp.asc()).all()
-    return render_template('messages/conversation.html', title='Conversation', messages=messages, listing=listing, recipient=recipient)
+    # Newest page first; "after" walks back to earlier messages. Message ids
+    # follow send order, so the id alone is the cursor, and the newest id on
+    # the page is where polling for new messages starts.
+    pagination = keyset_paginate(
+        _thread_messages(listing_id, current_user.id, recipient_id).options(*loading.MESSAGE_ROW),
+        [(Message.id, True)],
+        per_page=current_app.config['MESSAGE_PAGE_SIZE'],
+        after=request.args.get('after'),
+        before=request.args.get('before')
+    )
+    messages = list(reversed(pagination.items))
+    if inbox.mark_read(inbox.find(listing_id, current_user.id, recipient_id), current_user.id):
+        db.session.commit()
+    return render_template('messages/conversation.html', title='Conversation', messages=messages, pagination=pagination,
+                           listing=listing, recipient=recipient, poll_timeout=current_app.config['MESSAGE_POLL_TIMEOUT'])
+
+@messages_bp.route('/conversation/<int:listing_id>/<int:recipient_id>/poll')
+@login_required
+def poll(listing_id, recipient_id):
+    """Long poll: messages in the thread with id > after_id, waiting up to timeout seconds for one."""
+    user_id = current_user.id
+    after_id = request.args.get('after_id', 0, type=int)
+    max_timeout = current_app.config['MESSAGE_POLL_TIMEOUT']
+    timeout = min(max(request.args.get('timeout', max_timeout, type=float), 0), max_timeout)
+    key = inbox.thread_key(listing_id, user_id, recipient_id)
+
+    token = message_broker.token(key)
+    messages = _newer_messages(listing_id, user_id, recipient_id, after_id)
+    if not messages and timeout:
+        # Hand the connection back to the pool while this request sleeps.
+        db.session.close()
+        message_broker.wait(key, token, timeout)
+        messages = _newer_messages(listing_id, user_id, recipient_id, after_id)
+
+    if any(m.recipient_id == user_id for m in messages):
+        if inbox.mark_read(inbox.find(listing_id, user_id, recipient_id), user_id):
+            db.session.commit()
+    return jsonify(
+        messages=[{
+            'id': m.id,
+            'sender': m.sender.username,
+            'mine': m.sender_id == user_id,
+            'body': m.body,
+            'timestamp': m.timestamp.isoformat() if m.timestamp else None,
+        } for m in messages],
+        last_id=messages[-1].id if messages else after_id,
+    )
 
 @messages_bp.route('/send/<int:listing_id>/<int:recipient_id>', methods=['POST'])
 @login_required
 def send_message(listing_id, recipient_id):
     body = request.form.get('body')
-    if body:
+    if recipient_id == current_user.id:
+        flash('You cannot send a message to yourself.', 'warning')
+    elif body:
         message = Message(
             sender_id=current_user.id,
             recipient_id=recipient_id,
@@ -40,6 +92,29 @@ def send_message(listing_id, recipient_id):
             body=body
         )
         db.session.add(message)
+        inbox.record_message(message)
+        # No body in the summary: it ends up in email subjects and logs.
+        enqueue(recipient_id, 'message', f'New message from {current_user.username}',
+                url_for('messages.conversation', listing_id=listing_id, recipient_id=current_user.id),
+                actor_id=current_user.id)
         db.session.commit()
+        message_broker.publish(inbox.thread_key(listing_id, current_user.id, recipient_id))
         flash('Your message has been sent!', 'success')
-    return redirect(url_for('messages.conversation', listing_id=listing_id, recipient_id=recipient_id))
\ No newline at end of file
+    return redirect(url_for('messages.conversation', listing_id=listing_id, recipient_id=recipient_id))
+
+def _thread_messages(listing_id, user_id, other_id):
+    return Message.query.filter(
+        Message.listing_id == listing_id,
+        or_(
+            (Message.sender_id == user_id) & (Message.recipient_id == other_id),
+            (Message.sender_id == other_id) & (Message.recipient_id == user_id)
+        )
+    )
+
+
+def _newer_messages(listing_id, user_id, other_id, after_id):
+    return _thread_messages(listing_id, user_id, other_id).options(*loading.MESSAGE_ROW) \
+        .filter(Message.id > after_id) \
+        .order_by(Message.id.asc()) \
+        .limit(current_app.config['MESSAGE_PAGE_SIZE']) \
+        .all()
@@ -0,0 +1,200 @@
+# app/metrics.py
+
+import hmac
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+
+from flask import Blueprint, Response, abort, before_render_template, g, has_request_context, request, template_rendered
+from flask_login import current_user
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Per-endpoint request instrumentation: wall time, SQL statement count and
+# time, template render time and response size, aggregated into cumulative
+# histograms and exposed in Prometheus text format on /metrics (admins, or a
+# scraper sending "Authorization: Bearer <METRICS_TOKEN>").
+# Requests slower than SLOW_REQUEST_THRESHOLD seconds are logged with their SQL.
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200)
+SIZE_BUCKETS = (1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+# Keep at most this many statements per request for the slow-request log.
+MAX_LOGGED_STATEMENTS = 50
+
+
+class Histogram:
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)   # last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def lines(self, name, labels):
+        cumulative = 0
+        for bound, n in zip(self.buckets + ('+Inf',), self.counts):
+            cumulative += n
+            yield f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}'
+        yield f'{name}_sum{{{labels}}} {self.sum}'
+        yield f'{name}_count{{{labels}}} {self.count}'
+
+
+# name -> (help text, buckets)
+HISTOGRAMS = {
+    'http_request_duration_seconds': ('Wall time per request.', DURATION_BUCKETS),
+    'db_statements_per_request': ('SQL statements executed per request.', COUNT_BUCKETS),
+    'db_time_seconds': ('Time spent in SQL per request.', DURATION_BUCKETS),
+    'template_render_seconds': ('Time spent rendering templates per request.', DURATION_BUCKETS),
+    'http_response_size_bytes': ('Response body size.', SIZE_BUCKETS),
+}
+
+
+class RequestMetrics:
+
+    def __init__(self):
+        self.app = None
+        self.slow_threshold = 0.5
+        self._histograms = defaultdict(dict)   # metric name -> endpoint -> Histogram
+        self._requests = defaultdict(int)      # (endpoint, status) -> count
+        self._lock = threading.Lock()
+        self._listening = False
+
+    def init_app(self, app):
+        self.app = app
+        self.slow_threshold = app.config.get('SLOW_REQUEST_THRESHOLD', self.slow_threshold)
+        if not self._listening:
+            event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+            event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+            self._listening = True
+        before_render_template.connect(_before_render, app)
+        template_rendered.connect(_after_render, app)
+        app.before_request(_start_request)
+        app.after_request(self._finish_request)
+        app.register_blueprint(metrics_bp)
+
+    def _finish_request(self, response):
+        stats = g.pop('request_metrics', None)
+        if stats is None:
+            return response
+        elapsed = time.perf_counter() - stats['start']
+        endpoint = request.endpoint or 'unknown'
+        size = None if response.is_streamed else response.calculate_content_length()
+
+        with self._lock:
+            self._requests[(endpoint, response.status_code)] += 1
+            self._observe('http_request_duration_seconds', endpoint, elapsed)
+            self._observe('db_statements_per_request', endpoint, stats['sql_count'])
+            self._observe('db_time_seconds', endpoint, stats['sql_time'])
+            self._observe('template_render_seconds', endpoint, stats['render_time'])
+            if size is not None:
+                self._observe('http_response_size_bytes', endpoint, size)
+
+        if elapsed >= self.slow_threshold:
+            statements = '\n'.join(
+                f'  {duration * 1000:.1f}ms {" ".join(sql.split())[:300]}'
+                for sql, duration in stats['statements']
+            )
+            self.app.logger.warning(
+                'Slow request %s %s (%s): %.0fms total, %d SQL statements in %.0fms, render %.0fms\n%s',
+                request.method, request.full_path, endpoint, elapsed * 1000,
+                stats['sql_count'], stats['sql_time'] * 1000, stats['render_time'] * 1000, statements
+            )
+        return response
+
+    def _observe(self, name, endpoint, value):
+        per_endpoint = self._histograms[name]
+        if endpoint not in per_endpoint:
+            per_endpoint[endpoint] = Histogram(HISTOGRAMS[name][1])
+        per_endpoint[endpoint].observe(value)
+
+    def render(self):
+        """All metrics in Prometheus text exposition format."""
+        lines = [
+            '# HELP http_requests_total Requests handled, by endpoint and status.',
+            '# TYPE http_requests_total counter',
+        ]
+        with self._lock:
+            for (endpoint, status), n in sorted(self._requests.items()):
+                lines.append(f'http_requests_total{{endpoint="{endpoint}",status="{status}"}} {n}')
+            for name, (help_text, _) in HISTOGRAMS.items():
+                lines.append(f'# HELP {name} {help_text}')
+                lines.append(f'# TYPE {name} histogram')
+                for endpoint, histogram in sorted(self._histograms[name].items()):
+                    lines.extend(histogram.lines(name, f'endpoint="{endpoint}"'))
+        return '\n'.join(lines) + '\n'
+
+
+def _stats():
+    if has_request_context():
+        return g.get('request_metrics')
+    return None
+
+
+def _start_request():
+    g.request_metrics = {
+        'start': time.perf_counter(),
+        'sql_count': 0,
+        'sql_time': 0.0,
+        'render_time': 0.0,
+        'render_starts': [],
+        'statements': [],
+    }
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('metrics_query_start', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.get('metrics_query_start')
+    if not started:
+        return
+    duration = time.perf_counter() - started.pop()
+    stats = _stats()
+    if stats is not None:
+        stats['sql_count'] += 1
+        stats['sql_time'] += duration
+        if len(stats['statements']) < MAX_LOGGED_STATEMENTS:
+            stats['statements'].append((statement, duration))
+
+
+def _before_render(sender, template, context, **extra):
+    stats = _stats()
+    if stats is not None:
+        stats['render_starts'].append(time.perf_counter())
+
+
+def _after_render(sender, template, context, **extra):
+    stats = _stats()
+    if stats is not None and stats['render_starts']:
+        stats['render_time'] += time.perf_counter() - stats['render_starts'].pop()
+
+
+metrics_bp = Blueprint('metrics', __name__)
+
+
+def _authorized():
+    token = request_metrics.app.config.get('METRICS_TOKEN')
+    if token:
+        sent = request.headers.get('Authorization', '')
+        if hmac.compare_digest(sent, f'Bearer {token}'):
+            return True
+    return current_user.is_authenticated and current_user.has_role('admin')
+
+
+@metrics_bp.route('/metrics')
+def metrics():
+    if not _authorized():
+        abort(403)
+    return Response(request_metrics.render(), mimetype='text/plain; version=0.0.4')
+
+
+request_metrics = RequestMetrics()
@@ -0,0 +1,56 @@
+# app/model_events.py
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session, object_session
+
+# Run callbacks after a commit that inserted, updated or deleted rows of a
+# given model. Caches use this to drop derived data only once the write is
+# visible to other connections, and not at all if it was rolled back:
+#
+#     @after_commit_of(Listing)
+#     def _clear_listing_pages():
+#         response_cache.delete_tag('listings')
+
+_handlers = {}
+
+
+def after_commit_of(*models):
+    def decorator(fn):
+        for model in models:
+            if model not in _handlers:
+                _handlers[model] = []
+                _watch(model)
+            _handlers[model].append(fn)
+        return fn
+    return decorator
+
+
+def _watch(model):
+    def changed(mapper, connection, target):
+        session = object_session(target)
+        if session is not None:
+            session.info.setdefault('changed_models', set()).add(model)
+
+    for event_name in ('after_insert', 'after_update', 'after_delete'):
+        event.listen(model, event_name, changed)
+
+
+def mark_changed(session, *models):
+    """For writes made with Core statements, which don't fire mapper events."""
+    session.info.setdefault('changed_models', set()).update(models)
+
+
+@event.listens_for(Session, 'after_commit')
+def _run_handlers(session):
+    changed = session.info.pop('changed_models', ())
+    called = set()
+    for model in changed:
+        for fn in _handlers.get(model, ()):
+            if fn not in called:
+                called.add(fn)
+                fn()
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard(session):
+    session.info.pop('changed_models', None)
@@ -18,7 +18,11 @@ user_roles = db.Table('user_roles',
 # Many-to-many association table for Listings and Tags
 listing_tags = db.Table('listing_tags',
     db.Column('listing_id', db.Integer, db.ForeignKey('listings.id')),
-    db.Column('tag_id', db.Integer, db.ForeignKey('tags.id'))
+    db.Column('tag_id', db.Integer, db.ForeignKey('tags.id')),
+    # Tag filter looks listings up by tag; loading a listing's tags goes the other way.
+    # The unique one also lets tags.py insert pairs with ON CONFLICT DO NOTHING.
+    db.Index('ix_listing_tags_tag_id_listing_id', 'tag_id', 'listing_id'),
+    db.Index('ix_listing_tags_listing_id_tag_id', 'listing_id', 'tag_id', unique=True)
 )
 
 class User(db.Model, UserMixin, SerializerMixin):
@@ -30,7 +34,11 @@ class User(db.Model, UserMixin, SerializerMixin):
     about_me = db.Column(db.String(140))
     listing_count = db.Column(db.Integer, default=0)
     subscription_status = db.Column(db.String(20), default='free')
-    subscription_end_date = db.Column(db.DateTime, nullable=True)
+    # Premium ends here; jobs.expire_subscriptions moves the user back to 'free'.
+    subscription_end_date = db.Column(db.DateTime, nullable=True, index=True)
+    # Aggregates of Review rows where this user is the seller, see aggregates.py
+    seller_review_count = db.Column(db.Integer, default=0, nullable=False, server_default='0')
+    seller_rating_sum = db.Column(db.Integer, default=0, nullable=False, server_default='0')
     roles = db.relationship('Role', secondary=user_roles, backref=db.backref('users', lazy='dynamic'))
 
     def set_password(self, password):
@@ -41,6 +49,12 @@ class User(db.Model, UserMixin, SerializerMixin):
     
     def has_role(self, role_name):
         return any(role.name == role_name for role in self.roles)
+
+    @property
+    def seller_average_rating(self):
+        if not self.seller_review_count:
+            return None
+        return self.seller_rating_sum / self.seller_review_count
     
     def __repr__(self):
         return f'<User {self.username}>'
@@ -70,8 +84,41 @@ class Tag(db.Model):
     def __repr__(self):
         return f'<Tag {self.name}>'
 
+class JobLock(db.Model):
+    """One row per periodic job (jobs.py): the lease of the runner executing
+    it and when it last ran, shared by every process."""
+    __tablename__ = 'job_locks'
+    name = db.Column(db.String(64), primary_key=True)
+    locked_by = db.Column(db.String(32), nullable=True)
+    locked_until = db.Column(db.DateTime, nullable=True)
+    last_started_at = db.Column(db.DateTime, nullable=True)
+    last_finished_at = db.Column(db.DateTime, nullable=True)
+    last_error = db.Column(db.Text, nullable=True)
+
+    def __repr__(self):
+        return f'<JobLock {self.name}>'
+
+class Place(db.Model):
+    """A local neighbourhood and its centre point, for offline geocoding (see geo.py)."""
+    __tablename__ = 'places'
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), unique=True, nullable=False)
+    latitude = db.Column(db.Float, nullable=False)
+    longitude = db.Column(db.Float, nullable=False)
+
+    def __repr__(self):
+        return f'<Place {self.name}>'
+
 class Listing(db.Model):
     __tablename__ = 'listings'
+    # Composite indexes matching the all_listings browse query:
+    # status filter, optional category/price filter, sponsored-then-newest order.
+    __table_args__ = (
+        db.Index('ix_listings_status_sponsored_created', 'status', 'is_sponsored', 'created_at'),
+        db.Index('ix_listings_status_category_sponsored_created', 'status', 'category_id', 'is_sponsored', 'created_at'),
+        db.Index('ix_listings_status_price', 'status', 'price'),
+        db.Index('ix_listings_user_id_created_at', 'user_id', 'created_at'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(120), nullable=False)
     description = db.Column(db.Text, nullable=False)
@@ -83,14 +130,21 @@ class Listing(db.Model):
     category = db.relationship('Category', backref=db.backref('listings', lazy=True))
 
     location = db.Column(db.String(120), nullable=True)
+    # Geocoded from location unless set explicitly; indexed in listings_geo (geo.py).
+    latitude = db.Column(db.Float, nullable=True)
+    longitude = db.Column(db.Float, nullable=True)
     contact_email = db.Column(db.String(120), nullable=True)
     contact_phone = db.Column(db.String(60), nullable=True)
     price = db.Column(db.Float, nullable=True)
-    created_at = db.Column(db.DateTime, nullable=False, default=db.func.now())
-    updated_at = db.Column(db.DateTime, nullable=False, default=db.func.now(), onupdate=db.func.now())
+    # Python-side defaults: SQL now() is stored on SQLite without microseconds,
+    # which compares unequal to the datetimes bound from a keyset cursor.
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
     status = db.Column(db.String(20), nullable=False, default='published')
     views_count = db.Column(db.Integer, default=0)
     is_sponsored = db.Column(db.Boolean, default=False, nullable=False)
+    # Set by boost_listing; jobs.expire_boosts clears is_sponsored after it.
+    sponsored_until = db.Column(db.DateTime, nullable=True, index=True)
     
     tags = db.relationship('Tag', secondary=listing_tags, backref=db.backref('listings', lazy='dynamic'))
 
@@ -99,6 +153,11 @@ class Listing(db.Model):
 
 class Message(db.Model):
     __tablename__ = 'messages'
+    # Inbox and conversation lookups filter on one participant plus the listing.
+    __table_args__ = (
+        db.Index('ix_messages_sender_listing_timestamp', 'sender_id', 'listing_id', 'timestamp'),
+        db.Index('ix_messages_recipient_listing_timestamp', 'recipient_id', 'listing_id', 'timestamp'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     sender_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     recipient_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
@@ -113,6 +172,91 @@ class Message(db.Model):
     def __repr__(self):
         return f'<Message {self.id}>'
 
+class Conversation(db.Model):
+    """Summary row per thread (a listing and two users), maintained by
+    messages.inbox.record_message so the inbox never scans messages.
+
+    The pair is stored in canonical order, user_a_id < user_b_id, and each
+    side has its own unread count.
+    """
+    __tablename__ = 'conversations'
+    __table_args__ = (
+        db.UniqueConstraint('listing_id', 'user_a_id', 'user_b_id', name='uq_conversations_listing_id_users'),
+        db.CheckConstraint('user_a_id < user_b_id', name='ck_conversations_user_order'),
+        # One per side of the inbox query, already in recency order.
+        db.Index('ix_conversations_user_a_id_last_message_at', 'user_a_id', 'last_message_at'),
+        db.Index('ix_conversations_user_b_id_last_message_at', 'user_b_id', 'last_message_at'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    listing_id = db.Column(db.Integer, db.ForeignKey('listings.id'), nullable=False)
+    user_a_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    user_b_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    last_message_id = db.Column(db.Integer, db.ForeignKey('messages.id'), nullable=False)
+    last_message_at = db.Column(db.DateTime, nullable=False)
+    unread_a = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    unread_b = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+
+    listing = db.relationship('Listing')
+    user_a = db.relationship('User', foreign_keys=[user_a_id])
+    user_b = db.relationship('User', foreign_keys=[user_b_id])
+    last_message = db.relationship('Message')
+
+    def other_user(self, user_id):
+        return self.user_b if user_id == self.user_a_id else self.user_a
+
+    def unread_for(self, user_id):
+        return self.unread_a if user_id == self.user_a_id else self.unread_b
+
+    def __repr__(self):
+        return f'<Conversation {self.listing_id} {self.user_a_id}/{self.user_b_id}>'
+
+class Notification(db.Model):
+    """Outbox row: something a user should hear about, written in the same
+    transaction as the change that caused it and delivered later by
+    notifications.outbox.OutboxWorker (several at a time, as one digest).
+    """
+    __tablename__ = 'notification_outbox'
+    __table_args__ = (
+        # The worker's scan for due rows.
+        db.Index('ix_notification_outbox_status_next_attempt_at', 'status', 'next_attempt_at'),
+        db.Index('ix_notification_outbox_recipient_id_status', 'recipient_id', 'status'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    recipient_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    kind = db.Column(db.String(32), nullable=False)
+    summary = db.Column(db.String(255), nullable=False)
+    url = db.Column(db.String(255), nullable=True)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    # pending -> sent, or failed once attempts run out.
+    status = db.Column(db.String(16), nullable=False, default='pending', server_default='pending')
+    attempts = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    next_attempt_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    # Lease taken by the worker delivering the row; expired leases are retaken.
+    claimed_by = db.Column(db.String(32), nullable=True)
+    claimed_until = db.Column(db.DateTime, nullable=True)
+    last_error = db.Column(db.Text, nullable=True)
+    delivery_id = db.Column(db.Integer, db.ForeignKey('notification_deliveries.id'), nullable=True)
+
+    recipient = db.relationship('User')
+    delivery = db.relationship('NotificationDelivery', backref='notifications')
+
+    def __repr__(self):
+        return f'<Notification {self.id} {self.kind}>'
+
+class NotificationDelivery(db.Model):
+    """One digest sent to a user, covering one or more Notifications."""
+    __tablename__ = 'notification_deliveries'
+    id = db.Column(db.Integer, primary_key=True)
+    recipient_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
+    transport = db.Column(db.String(32), nullable=False)
+    address = db.Column(db.String(120), nullable=False)
+    subject = db.Column(db.String(255), nullable=False)
+    notification_count = db.Column(db.Integer, nullable=False)
+    sent_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<NotificationDelivery {self.id}>'
+
 class ForumCategory(db.Model):
     __tablename__ = 'forum_categories'
     id = db.Column(db.Integer, primary_key=True)
@@ -125,12 +269,20 @@ class ForumCategory(db.Model):
 
 class ForumPost(db.Model):
     __tablename__ = 'forum_posts'
+    __table_args__ = (
+        db.Index('ix_forum_posts_category_id_timestamp', 'category_id', 'timestamp'),
+        # Thread lists, most recently active first (forum/routes.py).
+        db.Index('ix_forum_posts_category_id_last_activity', 'category_id', 'last_activity'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(100), nullable=False)
     body = db.Column(db.Text, nullable=False)
     timestamp = db.Column(db.DateTime, index=True, default=datetime.utcnow)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     category_id = db.Column(db.Integer, db.ForeignKey('forum_categories.id'), nullable=False)
+    # Maintained by aggregates.record_forum_comment
+    comment_count = db.Column(db.Integer, default=0, nullable=False, server_default='0')
+    last_activity = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
     comments = db.relationship('ForumComment', backref='post', lazy='dynamic')
 
     author = db.relationship('User', backref='forum_posts')
@@ -140,6 +292,9 @@ class ForumPost(db.Model):
 
 class ForumComment(db.Model):
     __tablename__ = 'forum_comments'
+    __table_args__ = (
+        db.Index('ix_forum_comments_post_id_timestamp', 'post_id', 'timestamp'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     body = db.Column(db.Text, nullable=False)
     timestamp = db.Column(db.DateTime, index=True, default=datetime.utcnow)
@@ -151,24 +306,66 @@ class ForumComment(db.Model):
     def __repr__(self):
         return f'<ForumComment {self.id}>'
 
+class BusinessCategory(db.Model):
+    __tablename__ = 'business_categories'
+    __table_args__ = (
+        db.UniqueConstraint('key', name='uq_business_categories_key'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), unique=True, nullable=False)
+    # name.casefold(), so "Bakery" and "bakery" are one category; the conflict
+    # target when a new business names one (directory/routes.py).
+    key = db.Column(db.String(100), nullable=False,
+                    default=lambda context: context.get_current_parameters()['name'].casefold())
+
+    def __repr__(self):
+        return f'<BusinessCategory {self.name}>'
+
 class Business(db.Model):
     __tablename__ = 'businesses'
+    # Directory browse orders, optionally within one category (directory/routes.py).
+    __table_args__ = (
+        db.Index('ix_businesses_category_id_name', 'category_id', 'name'),
+        db.Index('ix_businesses_category_id_rating', 'category_id', 'rating_avg', 'review_count'),
+        db.Index('ix_businesses_name', 'name'),
+        db.Index('ix_businesses_rating', 'rating_avg', 'review_count'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
     description = db.Column(db.Text, nullable=False)
-    category = db.Column(db.String(100), nullable=False)
+    category_id = db.Column(db.Integer, db.ForeignKey('business_categories.id'), nullable=False)
     address = db.Column(db.String(255), nullable=True)
     phone = db.Column(db.String(20), nullable=True)
     website = db.Column(db.String(255), nullable=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    # Geocoded from address unless set explicitly; indexed in businesses_geo (geo.py).
+    latitude = db.Column(db.Float, nullable=True)
+    longitude = db.Column(db.Float, nullable=True)
+    # Maintained by aggregates.record_business_review
+    review_count = db.Column(db.Integer, default=0, nullable=False, server_default='0')
+    rating_sum = db.Column(db.Integer, default=0, nullable=False, server_default='0')
+    # rating_sum / review_count (0 without reviews), kept so "best rated" can use an index.
+    rating_avg = db.Column(db.Float, default=0, nullable=False, server_default='0')
     reviews = db.relationship('Review', backref='business', lazy=True)
     owner = db.relationship('User', backref='businesses')
+    category = db.relationship('BusinessCategory')
+
+    @property
+    def average_rating(self):
+        if not self.review_count:
+            return None
+        return self.rating_sum / self.review_count
 
     def __repr__(self):
         return f'<Business {self.name}>'
 
 class Review(db.Model):
     __tablename__ = 'reviews'
+    # Seller profiles and business pages list reviews newest first.
+    __table_args__ = (
+        db.Index('ix_reviews_seller_id_timestamp', 'seller_id', 'timestamp'),
+        db.Index('ix_reviews_business_id_timestamp', 'business_id', 'timestamp'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     rating = db.Column(db.Integer, nullable=False)
     comment = db.Column(db.Text, nullable=False)
@@ -185,19 +382,53 @@ class Review(db.Model):
 
 class Event(db.Model):
     __tablename__ = 'events'
+    __table_args__ = (
+        # Calendar feed: events overlapping a [start, end) window.
+        db.Index('ix_events_start_time_end_time', 'start_time', 'end_time'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(100), nullable=False)
     description = db.Column(db.Text, nullable=False)
     start_time = db.Column(db.DateTime, nullable=False)
     end_time = db.Column(db.DateTime, nullable=False)
     location = db.Column(db.String(255), nullable=True)
+    # Geocoded from location unless set explicitly; indexed in events_geo (geo.py).
+    latitude = db.Column(db.Float, nullable=True)
+    longitude = db.Column(db.Float, nullable=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    # Drives the feed's since= sync and Last-Modified.
+    updated_at = db.Column(db.DateTime, index=True, default=datetime.utcnow, onupdate=datetime.utcnow)
+    # Recurring events (RRULE subset, see events/recurrence.py). start_time/end_time
+    # are the first occurrence; recurrence_end is the end of the last one
+    # (9999-12-31 if open-ended) and is NULL for one-off events.
+    rrule = db.Column(db.String(255), nullable=True)
+    recurrence_end = db.Column(db.DateTime, nullable=True, index=True)
 
     author = db.relationship('User', backref='events')
+    exceptions = db.relationship('EventException', backref='event', lazy=True, cascade='all, delete-orphan')
 
     def __repr__(self):
         return f'<Event {self.title}>'
 
+class EventException(db.Model):
+    """A cancelled or changed occurrence of a recurring Event, keyed by its original start."""
+    __tablename__ = 'event_exceptions'
+    __table_args__ = (
+        db.UniqueConstraint('event_id', 'original_start', name='uq_event_exceptions_event_id_original_start'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    event_id = db.Column(db.Integer, db.ForeignKey('events.id'), nullable=False)
+    original_start = db.Column(db.DateTime, nullable=False)
+    is_cancelled = db.Column(db.Boolean, default=False, nullable=False)
+    # Overrides; NULL keeps the series' value.
+    start_time = db.Column(db.DateTime, nullable=True)
+    end_time = db.Column(db.DateTime, nullable=True)
+    title = db.Column(db.String(100), nullable=True)
+    location = db.Column(db.String(255), nullable=True)
+
+    def __repr__(self):
+        return f'<EventException {self.event_id} {self.original_start}>'
+
 class Ad(db.Model):
     __tablename__ = 'ads'
     id = db.Column(db.Integer, primary_key=True)
@@ -206,6 +437,8 @@ class Ad(db.Model):
     start_date = db.Column(db.DateTime, nullable=False)
     end_date = db.Column(db.DateTime, nullable=False)
     is_active = db.Column(db.Boolean, default=True, nullable=False)
+    weight = db.Column(db.Integer, default=1, nullable=False, server_default='1')
+    impressions = db.Column(db.Integer, default=0, nullable=False, server_default='0')
 
     def __repr__(self):
         return f'<Ad {self.id}>'
\ No newline at end of file
@@ -0,0 +1,83 @@
+# app/notifications/mailers.py
+
+import importlib
+import os
+import smtplib
+import sys
+import threading
+import uuid
+from datetime import datetime
+
+# Mail transports for notification digests. Each takes an
+# email.message.EmailMessage and raises on failure; the outbox worker retries
+# failed sends. NOTIFICATION_MAILER picks one:
+#
+#   'console'  print messages to stdout (default)
+#   'file'     write one .eml file per message to NOTIFICATION_MAIL_DIR
+#   'smtp'     send through MAIL_SERVER / MAIL_PORT / MAIL_USERNAME /
+#              MAIL_PASSWORD / MAIL_USE_TLS
+#   'package.module:Class'  any class taking the app config, with send(message)
+
+
+class ConsoleMailer:
+    name = 'console'
+
+    def __init__(self, config, stream=None):
+        self.stream = stream or sys.stdout
+        self._lock = threading.Lock()
+
+    def send(self, message):
+        # Sends run on a thread pool; keep each message in one piece.
+        with self._lock:
+            self.stream.write(message.as_string() + '\n' + '-' * 72 + '\n')
+            self.stream.flush()
+
+
+class FileMailer:
+    name = 'file'
+
+    def __init__(self, config):
+        self.directory = config.get('NOTIFICATION_MAIL_DIR') or 'instance/mail'
+
+    def send(self, message):
+        os.makedirs(self.directory, exist_ok=True)
+        filename = f'{datetime.utcnow():%Y%m%dT%H%M%S}-{uuid.uuid4().hex[:8]}.eml'
+        with open(os.path.join(self.directory, filename), 'wb') as f:
+            f.write(bytes(message))
+
+
+class SMTPMailer:
+    name = 'smtp'
+
+    def __init__(self, config):
+        self.host = config.get('MAIL_SERVER') or 'localhost'
+        self.port = int(config.get('MAIL_PORT') or 25)
+        self.username = config.get('MAIL_USERNAME')
+        self.password = config.get('MAIL_PASSWORD')
+        self.use_tls = bool(config.get('MAIL_USE_TLS'))
+        self.timeout = config.get('MAIL_TIMEOUT', 30)
+
+    def send(self, message):
+        with smtplib.SMTP(self.host, self.port, timeout=self.timeout) as smtp:
+            if self.use_tls:
+                smtp.starttls()
+            if self.username:
+                smtp.login(self.username, self.password or '')
+            smtp.send_message(message)
+
+
+MAILERS = {
+    'console': ConsoleMailer,
+    'file': FileMailer,
+    'smtp': SMTPMailer,
+}
+
+
+def create_mailer(config):
+    spec = config.get('NOTIFICATION_MAILER') or 'console'
+    if spec in MAILERS:
+        return MAILERS[spec](config)
+    module_name, _, class_name = spec.partition(':')
+    if not class_name:
+        raise ValueError(f'Unknown NOTIFICATION_MAILER {spec!r}')
+    return getattr(importlib.import_module(module_name), class_name)(config)
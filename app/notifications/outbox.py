@@ -0,0 +1,233 @@
+# app/notifications/outbox.py
+
+import atexit
+import threading
+import time
+import uuid
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from email.message import EmailMessage
+
+import click
+from flask.cli import AppGroup
+from sqlalchemy import func, or_, select, update
+
+from ..models import Notification, NotificationDelivery, User
+from .. import db
+from .mailers import create_mailer
+
+# Transactional outbox for user notifications (new message, review, forum
+# reply). Routes call enqueue() before their commit, so the notification
+# exists exactly when the change that caused it does, and the request pays
+# for one INSERT rather than for talking to a mail server.
+#
+# OutboxWorker delivers them later:
+#   - it leases every due row of up to NOTIFICATION_BATCH_SIZE recipients
+#     with one UPDATE (claimed_by/claimed_until), so several workers, threads
+#     or processes, never send the same row twice;
+#   - a recipient's burst is held until its first row is
+#     NOTIFICATION_DIGEST_DELAY seconds old, then goes out as one digest;
+#   - digests are sent on a small thread pool through the configured mailer
+#     (see mailers.py); database writes stay on the worker thread;
+#   - each sent digest is recorded as a NotificationDelivery; a failed send
+#     is retried with exponential backoff up to NOTIFICATION_MAX_ATTEMPTS,
+#     then the rows are marked failed.
+#
+# The worker runs in a background thread of the web process (started on the
+# first enqueue, NOTIFICATION_WORKER_THREAD) and/or as a separate process:
+#
+#   flask notifications run            # drain every NOTIFICATION_WORKER_INTERVAL seconds
+#   flask notifications drain [--all]  # once; --all skips the digest delay
+
+# A lease outlives any one drain; if a worker dies, its rows are retried after this.
+LEASE_SECONDS = 300
+
+DrainResult = namedtuple('DrainResult', 'digests notifications failed')
+
+
+def enqueue(recipient_id, kind, summary, url=None, actor_id=None):
+    """Queue a notification in the current transaction; the caller commits.
+
+    Nothing is queued when users act on their own things (actor_id == recipient_id).
+    """
+    if recipient_id is None or recipient_id == actor_id:
+        return None
+    # Also the subject of a one-item digest, so keep it on one line.
+    summary = ' '.join(summary.split())
+    if len(summary) > 255:
+        summary = summary[:254] + '…'
+    notification = Notification(recipient_id=recipient_id, kind=kind, summary=summary, url=url)
+    db.session.add(notification)
+    outbox_worker.wake()
+    return notification
+
+
+class OutboxWorker:
+
+    def __init__(self):
+        self.app = None
+        self._mailer = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def init_app(self, app):
+        self.app = app
+        atexit.register(self.shutdown)
+
+    @property
+    def mailer(self):
+        if self._mailer is None:
+            self._mailer = create_mailer(self.app.config)
+        return self._mailer
+
+    def drain(self, flush=False):
+        """Deliver one batch of due notifications (needs an app context)."""
+        config = self.app.config
+        now = datetime.utcnow()
+        token = uuid.uuid4().hex
+        claimable = (
+            Notification.status == 'pending',
+            Notification.next_attempt_at <= now,
+            or_(Notification.claimed_until.is_(None), Notification.claimed_until < now),
+        )
+        recipients = select(Notification.recipient_id).where(*claimable).group_by(Notification.recipient_id)
+        if not flush:
+            oldest = func.min(Notification.created_at)
+            recipients = recipients.having(oldest <= now - timedelta(seconds=config['NOTIFICATION_DIGEST_DELAY']))
+        claimed = db.session.execute(
+            update(Notification)
+            .where(Notification.recipient_id.in_(recipients.limit(config['NOTIFICATION_BATCH_SIZE'])), *claimable)
+            .values(claimed_by=token, claimed_until=now + timedelta(seconds=LEASE_SECONDS))
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        db.session.commit()
+        if not claimed:
+            return DrainResult(0, 0, 0)
+
+        rows = Notification.query.filter_by(claimed_by=token) \
+            .order_by(Notification.recipient_id, Notification.id).all()
+        groups = {}
+        for notification in rows:
+            groups.setdefault(notification.recipient_id, []).append(notification)
+        users = {u.id: u for u in User.query.filter(User.id.in_(list(groups)))}
+        digests = {
+            recipient_id: self._digest(users[recipient_id], group)
+            for recipient_id, group in groups.items()
+            if recipient_id in users and users[recipient_id].email
+        }
+        with ThreadPoolExecutor(max_workers=config['NOTIFICATION_SEND_THREADS']) as pool:
+            sends = {recipient_id: pool.submit(self.mailer.send, message) for recipient_id, message in digests.items()}
+
+        sent = sent_rows = failed = 0
+        transport = getattr(self.mailer, 'name', type(self.mailer).__name__)
+        for recipient_id, group in groups.items():
+            if recipient_id not in sends:
+                error = 'recipient has no email address'
+            else:
+                error = sends[recipient_id].exception()
+            if error is None:
+                delivery = NotificationDelivery(
+                    recipient_id=recipient_id, transport=transport, address=users[recipient_id].email,
+                    subject=digests[recipient_id]['Subject'], notification_count=len(group),
+                    sent_at=datetime.utcnow()
+                )
+                db.session.add(delivery)
+                db.session.flush()
+                db.session.execute(
+                    update(Notification)
+                    .where(Notification.id.in_([n.id for n in group]))
+                    .values(status='sent', delivery_id=delivery.id, last_error=None,
+                            claimed_by=None, claimed_until=None)
+                    .execution_options(synchronize_session=False)
+                )
+                sent += 1
+                sent_rows += len(group)
+            else:
+                self.app.logger.warning('Notification digest for user %s failed: %s', recipient_id, error)
+                for notification in group:
+                    self._retry_later(notification, error, now)
+                failed += len(group)
+        db.session.commit()
+        return DrainResult(sent, sent_rows, failed)
+
+    def _retry_later(self, notification, error, now):
+        config = self.app.config
+        notification.attempts += 1
+        notification.last_error = str(error)
+        notification.claimed_by = None
+        notification.claimed_until = None
+        if notification.attempts >= config['NOTIFICATION_MAX_ATTEMPTS']:
+            notification.status = 'failed'
+        else:
+            delay = config['NOTIFICATION_RETRY_DELAY'] * 2 ** (notification.attempts - 1)
+            notification.next_attempt_at = now + timedelta(seconds=delay)
+
+    def _digest(self, user, group):
+        config = self.app.config
+        message = EmailMessage()
+        message['From'] = config['NOTIFICATION_SENDER']
+        message['To'] = user.email
+        message['Subject'] = group[0].summary if len(group) == 1 else f'{len(group)} new notifications'
+        lines = [f'Hi {user.username},', '']
+        for notification in group:
+            lines.append(f'- {notification.summary}')
+            if notification.url:
+                lines.append(f'  {config["NOTIFICATION_BASE_URL"].rstrip("/")}{notification.url}')
+        message.set_content('\n'.join(lines) + '\n')
+        return message
+
+    def wake(self):
+        # Started lazily so CLI commands and migrations don't spawn a thread.
+        if self._thread is not None or self.app is None or not self.app.config.get('NOTIFICATION_WORKER_THREAD'):
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='notification-outbox', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.app.config['NOTIFICATION_WORKER_INTERVAL']):
+            try:
+                with self.app.app_context():
+                    self.drain()
+            except Exception:
+                self.app.logger.exception('Failed to drain the notification outbox')
+
+    def shutdown(self):
+        self._stop.set()
+
+
+outbox_worker = OutboxWorker()
+
+notifications_cli = AppGroup('notifications', help='Deliver queued notifications.')
+
+
+@notifications_cli.command('drain')
+@click.option('--all', 'flush', is_flag=True, help='Send everything due now, without waiting for the digest delay.')
+def drain_command(flush):
+    """Deliver due notifications, then exit."""
+    totals = [0, 0, 0]
+    while True:
+        result = outbox_worker.drain(flush=flush)
+        if not any(result):
+            break
+        totals = [t + n for t, n in zip(totals, result)]
+    click.echo(f'Sent {totals[0]} digests ({totals[1]} notifications), {totals[2]} failed.')
+
+
+@notifications_cli.command('run')
+def run_command():
+    """Keep delivering notifications until interrupted."""
+    interval = outbox_worker.app.config['NOTIFICATION_WORKER_INTERVAL']
+    click.echo(f'Draining the notification outbox every {interval}s (Ctrl+C to stop).')
+    while True:
+        try:
+            result = outbox_worker.drain()
+            if any(result):
+                click.echo(f'Sent {result.digests} digests ({result.notifications} notifications), {result.failed} failed.')
+        except Exception:
+            db.session.rollback()
+            outbox_worker.app.logger.exception('Failed to drain the notification outbox')
+        time.sleep(interval)
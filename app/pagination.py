@@ -0,0 +1,207 @@
+# app/pagination.py
+
+import base64
+import json
+import threading
+import time
+from datetime import datetime
+
+from flask import request, url_for
+from sqlalchemy import and_, func, literal, or_
+
+from .query_counter import query_counter
+
+
+class KeysetPage:
+    """One page of keyset (cursor) pagination results.
+
+    Unlike Flask-SQLAlchemy's Pagination there are no page numbers: the page
+    only knows whether there is something before or after it and the opaque
+    cursors to get there.
+    """
+
+    def __init__(self, items, first_key, last_key, has_prev, has_next, total=None):
+        self.items = items
+        self.has_prev = has_prev
+        self.has_next = has_next
+        self.prev_cursor = encode_cursor(first_key) if has_prev and first_key else None
+        self.next_cursor = encode_cursor(last_key) if has_next and last_key else None
+        self.total = total
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+    def prev_url(self, endpoint=None, **values):
+        return _page_url(endpoint, 'before', self.prev_cursor, values)
+
+    def next_url(self, endpoint=None, **values):
+        return _page_url(endpoint, 'after', self.next_cursor, values)
+
+
+def _page_url(endpoint, param, cursor, values):
+    """URL for the current view with the current filters and a new cursor."""
+    if cursor is None:
+        return None
+    args = dict(request.view_args or {})
+    # Drop any previous cursor and the legacy page number.
+    args.update((k, v) for k, v in request.args.items() if k not in ('after', 'before', 'page'))
+    args.update(values)
+    args[param] = cursor
+    return url_for(endpoint or request.endpoint, **args)
+
+
+def encode_cursor(key):
+    """Serialise a tuple of key values into an opaque URL-safe token."""
+    payload = [v.isoformat() if isinstance(v, datetime) else v for v in key]
+    raw = json.dumps(payload, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor, columns):
+    """Inverse of encode_cursor. Raises ValueError on a malformed token."""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, TypeError) as e:
+        raise ValueError('Invalid cursor') from e
+    if not isinstance(payload, list) or len(payload) != len(columns):
+        raise ValueError('Invalid cursor')
+    key = []
+    for value, (column, _) in zip(payload, columns):
+        if value is not None and _python_type(column) is datetime:
+            value = datetime.fromisoformat(value)
+        key.append(value)
+    return tuple(key)
+
+
+def _python_type(column):
+    try:
+        return column.type.python_type
+    except NotImplementedError:
+        return None
+
+
+def _seek_condition(columns, key, forward):
+    """WHERE clause selecting rows strictly after (or before) key in sort order.
+
+    Expands the tuple comparison into (c1 > v1) OR (c1 = v1 AND c2 > v2) ...
+    so it works with mixed ASC/DESC columns and on SQLite.
+    """
+    # SQLAlchemy refuses '<' against a bare True/False, so bind booleans explicitly.
+    key = [literal(v, c.type) if isinstance(v, bool) else v for (c, _), v in zip(columns, key)]
+    clauses = []
+    for i, (column, descending) in enumerate(columns):
+        value = key[i]
+        goes_down = descending == forward
+        step = column < value if goes_down else column > value
+        equal = [c == v for (c, _), v in zip(columns[:i], key[:i])]
+        clauses.append(and_(*equal, step))
+    return or_(*clauses)
+
+
+def keyset_paginate(query, columns, per_page=20, after=None, before=None, total=None):
+    """Paginate query by a unique sort key instead of OFFSET.
+
+    columns is a list of (column, descending) pairs that together are unique,
+    e.g. [(Listing.is_sponsored, True), (Listing.created_at, True), (Listing.id, True)].
+    after/before are cursors from a previous KeysetPage. Each page costs one
+    indexed range scan of per_page + 1 rows regardless of how deep it is.
+    """
+    cursor, forward = (before, False) if before else (after, True)
+    key = None
+    if cursor:
+        try:
+            key = decode_cursor(cursor, columns)
+        except ValueError:
+            # Stale or hand-edited cursor: start again from the first page.
+            forward = True
+
+    ordering = [
+        (c.desc() if descending == forward else c.asc()) for c, descending in columns
+    ]
+    q = query.add_columns(*[c for c, _ in columns])
+    if key is not None:
+        q = q.filter(_seek_condition(columns, key, forward))
+    rows = q.order_by(None).order_by(*ordering).limit(per_page + 1).all()
+
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+    if not forward:
+        rows.reverse()
+
+    items = [row[0] for row in rows]
+    first_key = tuple(rows[0][1:]) if rows else None
+    last_key = tuple(rows[-1][1:]) if rows else None
+    if forward:
+        has_prev, has_next = key is not None, has_more
+    else:
+        has_prev, has_next = has_more, True
+    return KeysetPage(items, first_key, last_key, has_prev, has_next, total=total)
+
+
+def page_cursor_for(query, columns, key, per_page=20):
+    """Cursor of the page holding the row with sort key `key`, or None for the first page.
+
+    Pages are counted from the start of query in columns order, so the result
+    lands on the same page boundaries as following "next" links from the
+    first page. Both steps read only the sort key: a COUNT of the rows before
+    key, then the key of the last row of the previous page.
+    """
+    position = query.filter(_seek_condition(columns, key, False)) \
+        .with_entities(func.count()).order_by(None).scalar()
+    start = position - position % per_page
+    if start == 0:
+        return None
+    previous = query.with_entities(*[c for c, _ in columns]) \
+        .order_by(None).order_by(*[(c.desc() if descending else c.asc()) for c, descending in columns]) \
+        .offset(start - 1).limit(1).one()
+    return encode_cursor(tuple(previous))
+
+
+# --- Cached totals ---
+# Exact counts scan the whole filtered set, so they are optional and cached
+# per distinct SQL + parameters for a short while.
+
+COUNT_CACHE_TTL = 60
+COUNT_CACHE_SIZE = 256
+
+_count_cache = {}
+_count_lock = threading.Lock()
+
+
+def cached_count(query, ttl=COUNT_CACHE_TTL):
+    """query.count(), memoised per SQL statement and parameters for ttl seconds."""
+    return cached_query_result(query, 'count', lambda q: q.order_by(None).count(), ttl)
+
+
+def cached_query_result(query, name, compute, ttl=COUNT_CACHE_TTL):
+    """compute(query) memoised like cached_count, for other whole-set aggregates
+    (e.g. facet counts). clear_count_cache() drops these too."""
+    compiled = query.statement.compile()
+    cache_key = (name, str(compiled), repr(sorted(compiled.params.items())))
+    now = time.monotonic()
+    with _count_lock:
+        hit = _count_cache.get(cache_key)
+        if hit and hit[1] > now:
+            return hit[0]
+    with query_counter.uncounted():
+        result = compute(query)
+    with _count_lock:
+        if len(_count_cache) >= COUNT_CACHE_SIZE:
+            oldest = min(_count_cache, key=lambda k: _count_cache[k][1])
+            del _count_cache[oldest]
+        _count_cache[cache_key] = (result, now + ttl)
+    return result
+
+
+def clear_count_cache(*names):
+    """Drop cached results; only those cached under the given names, if any."""
+    with _count_lock:
+        if not names:
+            _count_cache.clear()
+            return
+        for key in [key for key in _count_cache if key[0] in names]:
+            del _count_cache[key]
@@ -0,0 +1,122 @@
+# app/query_counter.py
+
+import threading
+from contextlib import contextmanager
+from collections import Counter, defaultdict, deque
+
+from flask import g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Mapper
+
+
+class QueryCounter:
+    """Debug-mode N+1 detector.
+
+    Counts SQL statements and loaded ORM rows per request and warns when
+
+    * the same SELECT runs more than REPEAT_THRESHOLD times in one request
+      (the classic lazy-load-in-a-loop pattern), or
+    * an endpoint's query count grows with the number of rows it rendered,
+      by at least one query per extra row, compared with earlier requests to
+      the same endpoint.
+
+    Statements run inside uncounted() (cache fills such as cached counts and
+    reference data) go into the header total but not into either check, so a
+    cache miss on a bigger page doesn't look like an N+1.
+
+    Enabled when app.debug is on or QUERY_COUNTER_ENABLED is set. Adds an
+    X-Query-Count response header so counts are easy to pin in tests.
+    """
+
+    REPEAT_THRESHOLD = 5
+    SAMPLES_PER_ENDPOINT = 50
+
+    def __init__(self):
+        self.app = None
+        self._samples = defaultdict(lambda: deque(maxlen=self.SAMPLES_PER_ENDPOINT))
+        self._lock = threading.Lock()
+        self._listening = False
+
+    def init_app(self, app):
+        if not app.config.get('QUERY_COUNTER_ENABLED', app.debug):
+            return
+        self.app = app
+        if not self._listening:
+            event.listen(Engine, 'before_cursor_execute', self._before_cursor_execute)
+            event.listen(Mapper, 'load', self._on_load)
+            self._listening = True
+        app.before_request(self._start)
+        app.after_request(self._finish)
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if has_request_context() and 'query_counter' in g:
+            stats = g.query_counter
+            if stats['paused']:
+                stats['uncounted'] += 1
+            else:
+                stats['statements'][statement] += 1
+
+    def _on_load(self, target, context):
+        if has_request_context() and 'query_counter' in g:
+            g.query_counter['rows'] += 1
+
+    def _start(self):
+        g.query_counter = {'statements': Counter(), 'rows': 0, 'paused': 0, 'uncounted': 0}
+
+    @contextmanager
+    def uncounted(self):
+        """Leave the statements run inside out of the N+1 checks."""
+        stats = g.get('query_counter') if has_request_context() else None
+        if stats is None:
+            yield
+            return
+        stats['paused'] += 1
+        try:
+            yield
+        finally:
+            stats['paused'] -= 1
+
+    def _finish(self, response):
+        stats = g.pop('query_counter', None)
+        if stats is None:
+            return response
+        total = sum(stats['statements'].values())
+        rows = stats['rows']
+        response.headers['X-Query-Count'] = str(total + stats['uncounted'])
+
+        for statement, count in stats['statements'].items():
+            if count > self.REPEAT_THRESHOLD and statement.lstrip().upper().startswith('SELECT'):
+                self.app.logger.warning(
+                    'Possible N+1 on %s: statement ran %d times: %s',
+                    request.endpoint, count, ' '.join(statement.split())[:200]
+                )
+
+        endpoint = request.endpoint
+        # Empty pages skip the selectinload round trips, so they are no baseline.
+        if endpoint and rows:
+            with self._lock:
+                samples = self._samples[endpoint]
+                # An N+1 costs at least one more query for every extra row.
+                grows = any(rows > r and total - t >= rows - r for r, t in samples)
+                samples.append((rows, total))
+            if grows:
+                smallest = min(samples)
+                self.app.logger.warning(
+                    'Query count grows with result size on %s: %d queries for %d rows (was %d for %d)',
+                    endpoint, total, rows, smallest[1], smallest[0]
+                )
+        return response
+
+    def reset(self):
+        """Forget the recorded samples of every endpoint."""
+        with self._lock:
+            self._samples.clear()
+
+    def samples(self, endpoint):
+        """(rows_loaded, query_count) pairs recorded for endpoint."""
+        with self._lock:
+            return list(self._samples.get(endpoint, ()))
+
+
+query_counter = QueryCounter()
@@ -0,0 +1,110 @@
+# app/refdata.py
+
+import threading
+import time
+
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session, object_session
+
+from . import db
+from .query_counter import query_counter
+from .models import BusinessCategory, Category, ForumCategory
+
+# Reference data (categories, business and forum categories) is read on almost
+# every page and changes almost never, so keep it in process memory.
+# Entries are plain Row tuples (attribute access: row.id, row.name), never
+# ORM instances, so they can be shared across requests and sessions.
+# An entry is dropped when its TTL runs out or when a row of its model is
+# inserted, updated or deleted (see _watch below).
+
+
+class ReferenceCache:
+
+    def __init__(self, ttl=300):
+        self.ttl = ttl
+        self._loaders = {}
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.ttl = app.config.get('REFDATA_CACHE_TTL', self.ttl)
+
+    def register(self, name, model, *columns, order_by=None):
+        """Cache SELECT columns FROM model ORDER BY order_by under name."""
+        stmt = select(*columns)
+        if order_by is not None:
+            stmt = stmt.order_by(order_by)
+        self._loaders[name] = stmt
+        _watch(model, self, name)
+
+    def get(self, name):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(name)
+            if entry and entry[1] > now:
+                return entry[0]
+        with query_counter.uncounted():
+            rows = db.session.execute(self._loaders[name]).all()
+        with self._lock:
+            self._entries[name] = (rows, now + self.ttl)
+        return rows
+
+    def invalidate(self, name=None):
+        with self._lock:
+            if name is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(name, None)
+
+
+def _watch(model, cache, name):
+    """Invalidate name whenever model rows change.
+
+    The entry is dropped at flush time and again after commit, so a reader
+    that refilled it from the writer's not yet committed data doesn't keep
+    stale rows around.
+    """
+    def changed(mapper, connection, target):
+        cache.invalidate(name)
+        session = object_session(target)
+        if session is not None:
+            session.info.setdefault('refdata_dirty', set()).add(name)
+
+    for event_name in ('after_insert', 'after_update', 'after_delete'):
+        event.listen(model, event_name, changed)
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_after_commit(session):
+    for name in session.info.pop('refdata_dirty', ()):
+        refdata.invalidate(name)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _invalidate_after_rollback(session):
+    for name in session.info.pop('refdata_dirty', ()):
+        refdata.invalidate(name)
+
+
+refdata = ReferenceCache()
+refdata.register('categories', Category, Category.id, Category.name, order_by=Category.name)
+refdata.register('forum_categories', ForumCategory, ForumCategory.id, ForumCategory.name,
+                 ForumCategory.description, order_by=ForumCategory.id)
+refdata.register('business_categories', BusinessCategory, BusinessCategory.id, BusinessCategory.name,
+                 order_by=BusinessCategory.name)
+
+
+def categories():
+    return refdata.get('categories')
+
+
+def category_choices():
+    return [(c.id, c.name) for c in categories()]
+
+
+def business_categories():
+    return refdata.get('business_categories')
+
+
+def forum_categories():
+    return refdata.get('forum_categories')
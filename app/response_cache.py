@@ -0,0 +1,236 @@
+# app/response_cache.py
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from functools import wraps
+
+from flask import make_response, request, session
+from flask_login import current_user
+
+# Whole-response cache for anonymous GET pages (homepage, listing browse).
+#
+# Entries are keyed by endpoint plus the normalised query string, carry an
+# ETag so browsers can revalidate with If-None-Match, and are grouped under a
+# tag so a write can drop every page that might show it. Logged-in users,
+# requests with pending flash messages and non-200 responses bypass it.
+
+CachedResponse = namedtuple('CachedResponse', 'body headers etag')
+
+
+class NullBackend:
+    def get(self, key):
+        return None
+
+    def set(self, key, value, timeout, tag):
+        pass
+
+    def delete_tag(self, tag):
+        pass
+
+    def clear(self):
+        pass
+
+
+class MemoryBackend:
+    """Per-process LRU bounded by entry count and total body size."""
+
+    def __init__(self, max_entries=500, max_bytes=32 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None:
+                return None
+            expires, tag, value = item
+            if expires <= time.monotonic():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, timeout, tag):
+        size = len(value.body)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (time.monotonic() + timeout, tag, value)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+
+    def delete_tag(self, tag):
+        with self._lock:
+            for key in [k for k, (_, t, _) in self._entries.items() if t == tag]:
+                self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def _remove(self, key):
+        _, _, value = self._entries.pop(key)
+        self._bytes -= len(value.body)
+
+
+class SQLiteBackend:
+    """Cache file shared by every worker process on the host.
+
+    Invalidation from one worker (delete_tag) is seen by all of them, which
+    the in-memory backend can't do.
+    """
+
+    def __init__(self, path, max_entries=5000):
+        self.path = path
+        self.max_entries = max_entries
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS response_cache ("
+                "key TEXT PRIMARY KEY, tag TEXT, expires REAL, "
+                "etag TEXT, headers TEXT, body BLOB)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_response_cache_tag ON response_cache (tag)")
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key):
+        row = self._connect().execute(
+            "SELECT etag, headers, body FROM response_cache WHERE key = ? AND expires > ?",
+            (key, time.time())
+        ).fetchone()
+        if row is None:
+            return None
+        return CachedResponse(bytes(row[2]), json.loads(row[1]), row[0])
+
+    def set(self, key, value, timeout, tag):
+        conn = self._connect()
+        conn.execute(
+            "INSERT OR REPLACE INTO response_cache (key, tag, expires, etag, headers, body) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (key, tag, time.time() + timeout, value.etag, json.dumps(value.headers), value.body)
+        )
+        # Cheap size bound: drop expired rows, then the soonest-to-expire ones.
+        conn.execute("DELETE FROM response_cache WHERE expires <= ?", (time.time(),))
+        conn.execute(
+            "DELETE FROM response_cache WHERE key IN ("
+            "SELECT key FROM response_cache ORDER BY expires DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,)
+        )
+
+    def delete_tag(self, tag):
+        self._connect().execute("DELETE FROM response_cache WHERE tag = ?", (tag,))
+
+    def clear(self):
+        self._connect().execute("DELETE FROM response_cache")
+
+
+# Response headers worth replaying from the cache.
+_STORED_HEADERS = ('Content-Type', 'Content-Language')
+
+
+class ResponseCache:
+
+    def __init__(self):
+        self.backend = NullBackend()
+        self.default_timeout = 60
+
+    def init_app(self, app):
+        """Pick the backend from RESPONSE_CACHE_BACKEND: memory (default), sqlite or null."""
+        kind = app.config.get('RESPONSE_CACHE_BACKEND', 'memory')
+        self.default_timeout = app.config.get('RESPONSE_CACHE_TIMEOUT', 60)
+        if kind == 'sqlite':
+            path = app.config.get('RESPONSE_CACHE_PATH') or os.path.join(app.instance_path, 'response_cache.db')
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            self.backend = SQLiteBackend(path, max_entries=app.config.get('RESPONSE_CACHE_MAX_ENTRIES', 5000))
+        elif kind == 'memory':
+            self.backend = MemoryBackend(
+                max_entries=app.config.get('RESPONSE_CACHE_MAX_ENTRIES', 500),
+                max_bytes=app.config.get('RESPONSE_CACHE_MAX_BYTES', 32 * 1024 * 1024)
+            )
+        else:
+            self.backend = NullBackend()
+
+    def delete_tag(self, tag):
+        self.backend.delete_tag(tag)
+
+    def clear(self):
+        self.backend.clear()
+
+    def cached(self, timeout=None, tag=None):
+        """Decorator caching a view's response for anonymous visitors."""
+        def decorator(view):
+            @wraps(view)
+            def wrapper(*args, **kwargs):
+                if not _cacheable_request():
+                    return view(*args, **kwargs)
+
+                key = cache_key()
+                hit = self.backend.get(key)
+                if hit is not None:
+                    return _replay(hit, 'HIT')
+
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200 or response.direct_passthrough or 'Set-Cookie' in response.headers:
+                    return response
+                body = response.get_data()
+                etag = hashlib.md5(body).hexdigest()
+                headers = [[h, response.headers[h]] for h in _STORED_HEADERS if h in response.headers]
+                entry = CachedResponse(body, headers, etag)
+                self.backend.set(key, entry, timeout or self.default_timeout, tag)
+                return _replay(entry, 'MISS')
+            return wrapper
+        return decorator
+
+
+def _cacheable_request():
+    if request.method not in ('GET', 'HEAD'):
+        return False
+    if current_user.is_authenticated:
+        return False
+    # A pending flash message would be baked into the page for everyone.
+    return '_flashes' not in session
+
+
+def cache_key():
+    """endpoint + view args + query args with empty values dropped and keys sorted.
+
+    So ?q=&category_id=2 and ?category_id=2 share an entry.
+    """
+    args = sorted(
+        (k, v) for k, values in request.args.lists() for v in values if v.strip()
+    )
+    view_args = sorted((request.view_args or {}).items())
+    return json.dumps([request.endpoint, view_args, args], default=str)
+
+
+def _replay(entry, status):
+    response = make_response(entry.body)
+    for name, value in entry.headers:
+        response.headers[name] = value
+    response.set_etag(entry.etag)
+    response.headers['X-Cache'] = status
+    response.headers['Vary'] = 'Cookie'
+    return response.make_conditional(request)
+
+
+response_cache = ResponseCache()
@@ -0,0 +1,47 @@
+# app/schema.py
+
+import time
+
+from sqlalchemy import inspect
+
+from . import db
+
+# The FTS5 and R*Tree tables (fts.py, geo.py) are SQLite-only and created by
+# migrations or `flask ... reindex`, so code that uses them first asks
+# whether they exist. That answer is cached per engine: a table that exists
+# is remembered for good, a missing one is looked up again after
+# RECHECK_INTERVAL seconds, so a worker that was running when the migration
+# ran starts using (and syncing) the table without a restart.
+
+RECHECK_INTERVAL = 30.0
+
+
+class TableCheck:
+    """Cached "does this SQLite table exist on the current engine?"."""
+
+    def __init__(self, table_name, recheck_interval=RECHECK_INTERVAL):
+        self.table_name = table_name
+        self.recheck_interval = recheck_interval
+        # engine URL -> True, or the monotonic time the table was last found missing
+        self._seen = {}
+
+    def __call__(self, connection=None):
+        engine = db.engine
+        if engine.dialect.name != 'sqlite':
+            return False
+        seen = self._seen.get(engine.url)
+        if seen is True:
+            return True
+        now = time.monotonic()
+        if seen is not None and now - seen < self.recheck_interval:
+            return False
+        exists = inspect(connection or engine).has_table(self.table_name)
+        self._seen[engine.url] = True if exists else now
+        return exists
+
+    def mark_present(self):
+        self._seen[db.engine.url] = True
+
+    def forget(self):
+        """Drop every cached answer (e.g. after the table was dropped)."""
+        self._seen.clear()
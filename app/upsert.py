@@ -0,0 +1,29 @@
+# app/upsert.py
+
+from sqlalchemy import insert
+
+from . import db
+
+# INSERT ... ON CONFLICT for the dialects that have it, shared by the code
+# that creates rows two requests may race to add (tags, business
+# categories, inbox threads).
+
+
+def dialect_insert(table):
+    """The dialect's insert(table), with on_conflict_* methods, or None if it has none."""
+    dialect = db.session.get_bind().dialect.name
+    if dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    elif dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    else:
+        return None
+    return dialect_insert(table)
+
+
+def insert_ignoring_duplicates(table, conflict_columns):
+    """INSERT that skips rows clashing on conflict_columns instead of raising."""
+    upsert = dialect_insert(table)
+    if upsert is None:
+        return insert(table).prefix_with('IGNORE')   # MySQL/MariaDB
+    return upsert.on_conflict_do_nothing(index_elements=conflict_columns)
@@ -4,6 +4,10 @@ from flask import Blueprint, render_template, redirect, url_for, flash, request
 from flask_login import login_required, current_user
 from ..models import User, Review
 from .. import db
+from ..pagination import keyset_paginate
+from .. import loading
+from ..aggregates import record_seller_review
+from ..notifications.outbox import enqueue
 from .forms import EditProfileForm
 
 users_bp = Blueprint('users', __name__, url_prefix='/users')
@@ -11,19 +15,28 @@ users_bp = Blueprint('users', __name__, url_prefix='/users')
 @users_bp.route('/<username>')
 def profile(username):
     user = User.query.filter_by(username=username).first_or_404()
-    reviews = Review.query.filter_by(seller_id=user.id).order_by(Review.timestamp.desc()).all()
-    return render_template('users/profile.html', title=f"{user.username}'s Profile", user=user, reviews=reviews)
+    pagination = keyset_paginate(
+        Review.query.options(*loading.REVIEW_ROW).filter_by(seller_id=user.id),
+        [(Review.timestamp, True), (Review.id, True)],
+        per_page=10,
+        after=request.args.get('after'),
+        before=request.args.get('before')
+    )
+    return render_template('users/profile.html', title=f"{user.username}'s Profile", user=user, reviews=pagination.items, pagination=pagination)
 
 
 @users_bp.route('/new_review/<username>', methods=['POST'])
 @login_required
 def new_review(username):
     user = User.query.filter_by(username=username).first_or_404()
-    rating = request.form.get('rating')
+    rating = request.form.get('rating', type=int)
     comment = request.form.get('comment')
     if rating and comment:
         review = Review(rating=rating, comment=comment, user_id=current_user.id, seller_id=user.id)
         db.session.add(review)
+        record_seller_review(user, rating)
+        enqueue(user.id, 'seller_review', f'{current_user.username} left you a {rating}-star review',
+                url_for('users.profile', username=username), actor_id=current_user.id)
         db.session.commit()
         flash('Your review has been posted!', 'success')
     return redirect(url_for('users.profile', username=username))
@@ -0,0 +1,7 @@
+# benchmarks/__init__.py
+
+# Load benchmarks for the hot pages. generate.py seeds a throwaway SQLite
+# database at a chosen scale (up to 100k listings / 1M messages), run.py
+# drives the real routes through Flask's test client and reports latency
+# percentiles and SQL statements per request, optionally saving/comparing a
+# JSON baseline. See README.md ("Benchmarks") for usage.
@@ -0,0 +1,298 @@
+# benchmarks/generate.py
+
+import random
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, insert, text
+from werkzeug.security import generate_password_hash
+
+from app import db, geo
+from app.aggregates import reconcile
+from app.data import populate_db
+from app.events import recurrence
+from app.directory import search as directory_search
+from app.listings import search, tags
+from app.messages import inbox
+from app.models import (
+    Ad, Business, BusinessCategory, Category, Event, ForumCategory, ForumComment, ForumPost,
+    Listing, Message, Review, Role, Tag, User, listing_tags, user_roles,
+)
+
+# Seeded, repeatable data for the benchmarks. Rows go in through Core
+# executemany in chunks (the ORM would take hours at the 'full' scale), so
+# mapper events don't fire: the FTS and R*Tree indexes, the aggregate
+# columns and the conversation summaries are rebuilt at the end instead.
+#
+# Timestamps are relative to the time of generation so "upcoming events" and
+# "recent listings" stay realistic whenever the database is built.
+
+SCALES = {
+    'small': dict(users=500, listings=5_000, tags=300, messages=20_000,
+                  forum_posts=1_000, forum_comments=10_000, businesses=200,
+                  reviews=5_000, events=500, ads=20),
+    'medium': dict(users=5_000, listings=25_000, tags=1_000, messages=200_000,
+                   forum_posts=5_000, forum_comments=50_000, businesses=1_000,
+                   reviews=20_000, events=2_000, ads=50),
+    'full': dict(users=20_000, listings=100_000, tags=2_000, messages=1_000_000,
+                 forum_posts=20_000, forum_comments=200_000, businesses=5_000,
+                 reviews=50_000, events=10_000, ads=100),
+}
+
+CHUNK_SIZE = 5_000
+MAX_TAGS_PER_LISTING = 6
+
+WORDS = (
+    'casa departamento terreno local oficina habitación bicicleta moto auto '
+    'sofá mesa silla cama refrigeradora lavadora laptop teléfono cámara guitarra '
+    'piano clases inglés español matemáticas plomería electricista jardinería '
+    'limpieza mudanza diseño fotografía contabilidad cuidado niños mascotas '
+    'vendo alquilo busco ofrezco nuevo usado excelente estado económico amplio '
+    'céntrico amoblado vista río montaña piscina garaje patio terraza'
+).split()
+
+NEIGHBOURHOODS = (
+    'El Centro', 'San Sebastián', 'El Vergel', 'Totoracocha', 'Gringolandia',
+    'Challuabamba', 'Misicata', 'Ricaurte', 'Baños', 'Turi', 'El Batán',
+    'Yanuncay', 'Monay', 'Puertas del Sol', 'Las Pencas',
+)
+
+_PLACE_POINTS = {name: (lat, lng) for name, lat, lng in geo.LOCAL_PLACES}
+
+BUSINESS_CATEGORIES = (
+    'Restaurant', 'Café', 'Bakery', 'Hardware', 'Pharmacy', 'Salon', 'Gym',
+    'Mechanic', 'Dentist', 'Veterinary', 'Bookstore', 'Tailor',
+)
+
+RECURRING_RULES = (
+    'FREQ=WEEKLY;BYDAY=SA', 'FREQ=WEEKLY;BYDAY=TU,TH', 'FREQ=MONTHLY;BYDAY=1SA',
+    'FREQ=WEEKLY;INTERVAL=2;BYDAY=SU', 'FREQ=DAILY;BYDAY=MO,TU,WE,TH,FR;COUNT=60',
+)
+
+FORUM_CATEGORIES = (
+    ('General', 'Anything about life in town'),
+    ('Housing', 'Rentals, neighbourhoods and landlords'),
+    ('Visas & Paperwork', 'Residency, cedulas and bureaucracy'),
+    ('Health', 'Doctors, clinics and insurance'),
+    ('Food & Drink', 'Restaurants, markets and recipes'),
+    ('Events & Meetups', 'What is on this week'),
+)
+
+
+def _sentence(rng, low, high):
+    return ' '.join(rng.choice(WORDS) for _ in range(rng.randint(low, high)))
+
+
+def _spot(rng):
+    """A neighbourhood and a point within ~700 m of its centre."""
+    name = rng.choice(NEIGHBOURHOODS)
+    lat, lng = _PLACE_POINTS[name]
+    return name, lat + rng.uniform(-0.006, 0.006), lng + rng.uniform(-0.006, 0.006)
+
+
+def _past(rng, now, days):
+    return now - timedelta(seconds=rng.randint(0, days * 86400))
+
+
+def _bulk_insert(table, rows):
+    rows = iter(rows)
+    total = 0
+    while True:
+        chunk = [row for _, row in zip(range(CHUNK_SIZE), rows)]
+        if not chunk:
+            return total
+        db.session.execute(insert(table), chunk)
+        total += len(chunk)
+
+
+def _next_id(model):
+    return (db.session.query(func.max(model.id)).scalar() or 0) + 1
+
+
+def generate(scale='small', seed=1234, log=print):
+    """Populate the (empty, already created) database bound to the app context."""
+    sizes = SCALES[scale]
+    rng = random.Random(seed)
+    now = datetime.utcnow().replace(microsecond=0)
+    started = time.perf_counter()
+
+    def step(name, count):
+        log(f'  {name:<16} {count:>9,}  ({time.perf_counter() - started:.1f}s)')
+
+    populate_db()
+    category_ids = [c.id for c in Category.query.order_by(Category.id)]
+    user_role_id = Role.query.filter_by(name='user').one().id
+
+    # Users: one shared password hash, hashing 20k passwords would dominate.
+    password_hash = generate_password_hash('benchmark')
+    first_user = _next_id(User)
+    user_ids = list(range(first_user, first_user + sizes['users']))
+    def users():
+        for uid in user_ids:
+            premium = rng.random() < 0.1
+            # Some subscriptions have already run out, for jobs.expire_subscriptions.
+            yield dict(id=uid, username=f'user{uid}', email=f'user{uid}@example.com',
+                       password_hash=password_hash, listing_count=0,
+                       subscription_status='premium' if premium else 'free',
+                       subscription_end_date=now + timedelta(days=rng.randint(-10, 30)) if premium else None)
+    step('users', _bulk_insert(User.__table__, users()))
+    _bulk_insert(user_roles, (dict(user_id=uid, role_id=user_role_id) for uid in user_ids))
+
+    # Tags follow a Zipf-like popularity curve, like real tagging does.
+    first_tag = _next_id(Tag)
+    tag_ids = list(range(first_tag, first_tag + sizes['tags']))
+    tag_words = sorted({tags.normalize(word) for word in WORDS})
+    step('tags', _bulk_insert(Tag.__table__, (dict(
+        id=tid, name=f'{tag_words[i % len(tag_words)]}-{i // len(tag_words)}' if i >= len(tag_words) else tag_words[i]
+    ) for i, tid in enumerate(tag_ids))))
+    tag_weights = [1.0 / (rank + 1) for rank in range(len(tag_ids))]
+
+    first_listing = _next_id(Listing)
+    listing_ids = list(range(first_listing, first_listing + sizes['listings']))
+    listing_owner = {}
+
+    def listings():
+        for lid in listing_ids:
+            owner = rng.choice(user_ids)
+            listing_owner[lid] = owner
+            created = _past(rng, now, 730)
+            location, lat, lng = _spot(rng)
+            sponsored = rng.random() < 0.02
+            yield dict(
+                id=lid, title=_sentence(rng, 3, 8).capitalize(),
+                description=_sentence(rng, 20, 80), user_id=owner,
+                category_id=rng.choice(category_ids),
+                location=location, latitude=lat, longitude=lng,
+                contact_email=f'user{owner}@example.com',
+                price=None if rng.random() < 0.1 else round(rng.lognormvariate(5, 1.5), 2),
+                created_at=created, updated_at=created,
+                status='published' if rng.random() < 0.95 else 'draft',
+                views_count=rng.randint(0, 500),
+                is_sponsored=sponsored,
+                sponsored_until=now + timedelta(days=rng.randint(-3, 7)) if sponsored else None,
+            )
+    step('listings', _bulk_insert(Listing.__table__, listings()))
+
+    def tagging():
+        for lid in listing_ids:
+            for tid in set(rng.choices(tag_ids, tag_weights, k=rng.randint(0, MAX_TAGS_PER_LISTING))):
+                yield dict(listing_id=lid, tag_id=tid)
+    step('listing_tags', _bulk_insert(listing_tags, tagging()))
+
+    # Messages come in conversations: a buyer writing to a listing's owner,
+    # alternating back and forth, in time order.
+    def messages():
+        remaining = sizes['messages']
+        while remaining > 0:
+            lid = rng.choice(listing_ids)
+            seller = listing_owner[lid]
+            buyer = rng.choice(user_ids)
+            if buyer == seller:
+                continue
+            length = min(remaining, rng.randint(1, 30))
+            timestamp = _past(rng, now, 365)
+            for i in range(length):
+                sender, recipient = (buyer, seller) if i % 2 == 0 else (seller, buyer)
+                timestamp += timedelta(minutes=rng.randint(1, 600))
+                yield dict(sender_id=sender, recipient_id=recipient, listing_id=lid,
+                           body=_sentence(rng, 3, 30), timestamp=min(timestamp, now))
+            remaining -= length
+    step('messages', _bulk_insert(Message.__table__, messages()))
+
+    first_forum_category = _next_id(ForumCategory)
+    forum_category_ids = list(range(first_forum_category, first_forum_category + len(FORUM_CATEGORIES)))
+    _bulk_insert(ForumCategory.__table__, (
+        dict(id=cid, name=name, description=description)
+        for cid, (name, description) in zip(forum_category_ids, FORUM_CATEGORIES)
+    ))
+    # The first category is the busy one, as "General" usually is.
+    forum_weights = [len(forum_category_ids) - i for i in range(len(forum_category_ids))]
+    first_post = _next_id(ForumPost)
+    post_ids = list(range(first_post, first_post + sizes['forum_posts']))
+    post_times = {}
+
+    def posts():
+        for pid in post_ids:
+            post_times[pid] = _past(rng, now, 730)
+            yield dict(id=pid, title=_sentence(rng, 3, 10).capitalize(), body=_sentence(rng, 20, 150),
+                       timestamp=post_times[pid], last_activity=post_times[pid],
+                       user_id=rng.choice(user_ids),
+                       category_id=rng.choices(forum_category_ids, forum_weights)[0])
+    step('forum_posts', _bulk_insert(ForumPost.__table__, posts()))
+
+    def comments():
+        for _ in range(sizes['forum_comments']):
+            # Some threads get far more replies than others.
+            pid = post_ids[int(rng.paretovariate(1.2)) % len(post_ids)] if rng.random() < 0.5 else rng.choice(post_ids)
+            timestamp = post_times[pid] + timedelta(seconds=rng.randint(60, 60 * 86400))
+            yield dict(body=_sentence(rng, 5, 60), timestamp=min(timestamp, now),
+                       user_id=rng.choice(user_ids), post_id=pid)
+    step('forum_comments', _bulk_insert(ForumComment.__table__, comments()))
+
+    first_business = _next_id(Business)
+    business_ids = list(range(first_business, first_business + sizes['businesses']))
+    db.session.execute(insert(BusinessCategory.__table__), [dict(name=name) for name in BUSINESS_CATEGORIES])
+    business_category_ids = {c.name: c.id for c in BusinessCategory.query}
+
+    def businesses():
+        for bid in business_ids:
+            neighbourhood, lat, lng = _spot(rng)
+            category = rng.choice(BUSINESS_CATEGORIES)
+            yield dict(
+                id=bid, name=f'{_sentence(rng, 1, 3).title()} {category}',
+                description=_sentence(rng, 10, 60), category_id=business_category_ids[category],
+                address=f'{rng.randint(1, 2000)} Calle {neighbourhood}', latitude=lat, longitude=lng,
+                phone=f'07-{rng.randint(2000000, 4999999)}', user_id=rng.choice(user_ids),
+            )
+    step('businesses', _bulk_insert(Business.__table__, businesses()))
+
+    def reviews():
+        for _ in range(sizes['reviews']):
+            row = dict(rating=rng.choices((1, 2, 3, 4, 5), (1, 1, 2, 4, 6))[0],
+                       comment=_sentence(rng, 5, 40), timestamp=_past(rng, now, 730),
+                       user_id=rng.choice(user_ids), seller_id=None, business_id=None)
+            if rng.random() < 0.5:
+                row['business_id'] = rng.choice(business_ids)
+            else:
+                row['seller_id'] = listing_owner[rng.choice(listing_ids)]
+            yield row
+    step('reviews', _bulk_insert(Review.__table__, reviews()))
+
+    def events():
+        for _ in range(sizes['events']):
+            start = now + timedelta(minutes=30 * rng.randint(-180 * 48, 180 * 48))
+            location, lat, lng = _spot(rng)
+            row = dict(title=_sentence(rng, 2, 6).capitalize(), description=_sentence(rng, 10, 60),
+                       start_time=start, end_time=start + timedelta(hours=rng.choice((1, 2, 3, 4, 8, 24, 72))),
+                       location=location, latitude=lat, longitude=lng, user_id=rng.choice(user_ids),
+                       rrule=None, recurrence_end=None)
+            # A few weekly markets and classes, some of them running for years.
+            if rng.random() < 0.02:
+                row['start_time'] = start = start - timedelta(days=rng.randint(0, 3650))
+                row['end_time'] = start + timedelta(hours=rng.choice((2, 3, 4)))
+                row['rrule'] = rng.choice(RECURRING_RULES)
+                row['recurrence_end'] = recurrence.series_end(
+                    start, row['end_time'] - start, recurrence.parse_rrule(row['rrule']))
+            yield row
+    step('events', _bulk_insert(Event.__table__, events()))
+
+    step('ads', _bulk_insert(Ad.__table__, (dict(
+        image_url=f'https://ads.example.com/{i}.png', link_url=f'https://example.com/{i}',
+        start_date=now - timedelta(days=rng.randint(0, 60)), end_date=now + timedelta(days=rng.randint(-10, 60)),
+        is_active=rng.random() < 0.9, weight=rng.randint(1, 10), impressions=0,
+    ) for i in range(sizes['ads']))))
+
+    db.session.execute(db.update(User).values(listing_count=(
+        db.select(func.count(Listing.id)).where(Listing.user_id == User.id).scalar_subquery()
+    )))
+    db.session.commit()
+
+    reconcile()
+    step('conversations', inbox.rebuild())
+    step('fts index', search.rebuild_index())
+    step('directory fts', directory_search.rebuild_index())
+    geo.seed_places()
+    step('geo index', sum(index.rebuild() for index in geo.INDEXES.values()))
+    with db.engine.connect() as connection:
+        connection.execute(text('ANALYZE'))
+    log(f'Generated {scale!r} data set in {time.perf_counter() - started:.1f}s')
@@ -0,0 +1,60 @@
+# benchmarks/recurrence.py
+
+import argparse
+import sys
+import time
+from datetime import datetime, timedelta
+
+# Shows that expanding a recurring event costs the same for a calendar
+# window whatever the length of the series: each rule is started 1, 10, 100
+# and 1000 years before a six-week window, and the time to expand that
+# window should stay flat down each column.
+#
+#   python -m benchmarks.recurrence [--repeat 2000]
+
+RULES = (
+    'FREQ=DAILY',
+    'FREQ=WEEKLY;BYDAY=SA',
+    'FREQ=WEEKLY;INTERVAL=2;BYDAY=MO,WE,FR',
+    'FREQ=MONTHLY;BYDAY=-1FR',
+    'FREQ=MONTHLY;BYMONTHDAY=1,15,-1',
+    'FREQ=YEARLY',
+)
+SERIES_YEARS = (1, 10, 100, 1000)
+WINDOW = timedelta(days=42)
+
+
+def time_window(rule, dtstart, window_start, repeat):
+    from app.events.recurrence import expand
+
+    duration = timedelta(hours=2)
+    count = 0
+    started = time.perf_counter()
+    for _ in range(repeat):
+        count = sum(1 for _ in expand(dtstart, duration, rule, window_start, window_start + WINDOW))
+    return (time.perf_counter() - started) / repeat * 1e6, count
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Time recurring-event expansion per calendar window.')
+    parser.add_argument('--repeat', type=int, default=2000, help='expansions per measurement')
+    args = parser.parse_args(argv)
+
+    from app.events.recurrence import parse_rrule
+
+    window_start = datetime(2026, 10, 1)
+    width = max(len(r) for r in RULES)
+    print(f'{"rule":<{width}}  ' + '  '.join(f'{f"{y}y series":>14}' for y in SERIES_YEARS) + '  occurrences')
+    for text in RULES:
+        rule = parse_rrule(text)
+        cells, count = [], 0
+        for years in SERIES_YEARS:
+            dtstart = window_start.replace(year=window_start.year - years, hour=9)
+            micros, count = time_window(rule, dtstart, window_start, args.repeat)
+            cells.append(f'{micros:>11.1f} µs')
+        print(f'{text:<{width}}  ' + '  '.join(cells) + f'  {count:>11}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,235 @@
+# benchmarks/run.py
+
+import argparse
+import fnmatch
+import json
+import logging
+import os
+import platform
+import random
+import sqlite3
+import sys
+import time
+from collections import Counter, namedtuple
+from datetime import datetime
+from itertools import combinations
+
+# Usage (from the repository root):
+#
+#   python -m benchmarks.run --scale small                # generate if needed, run, print
+#   python -m benchmarks.run --scale full --save benchmarks/results/before.json
+#   python -m benchmarks.run --scale full --compare benchmarks/results/before.json
+#
+# Each case is requested --warmup times untimed, then --iterations times.
+# Latency is wall time around test_client.get(); queries are read from the
+# X-Query-Count header (query_counter.py is switched on for the run).
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+
+# path is a string, or a callable(rng) returning one (e.g. a random listing).
+Case = namedtuple('Case', 'name path login')
+
+
+def create_benchmark_app(db_path):
+    # Set before create_app(): the testing profile reads these via from_prefixed_env().
+    os.environ['FLASK_SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{db_path}'
+    os.environ['FLASK_QUERY_COUNTER_ENABLED'] = 'true'
+    # Record 500s instead of raising, so a broken page shows in the report.
+    os.environ['FLASK_PROPAGATE_EXCEPTIONS'] = 'false'
+    from app import create_app
+    app = create_app('testing')
+    # N+1 warnings, slow-request logs and the 500 tracebacks would drown the
+    # report; failing pages still show up in its status column.
+    app.logger.setLevel(logging.CRITICAL)
+    return app
+
+
+def prepare_database(app, db_path, scale, seed, regenerate=False):
+    from app import db
+    from .generate import generate
+
+    if regenerate and os.path.exists(db_path):
+        os.remove(db_path)
+    if os.path.exists(db_path):
+        return
+    print(f'Generating {scale!r} data set in {db_path}')
+    with app.app_context():
+        db.create_all()
+        generate(scale, seed)
+
+
+def build_cases(app):
+    """The pages worth watching, with ids picked from the generated data."""
+    from sqlalchemy import func
+    from app import db
+    from app.models import Category, ForumPost, Listing, Message, Tag, listing_tags
+
+    with app.app_context():
+        category_id = db.session.query(Listing.category_id).group_by(Listing.category_id) \
+            .order_by(func.count().desc()).limit(1).scalar() or Category.query.first().id
+        popular_tags = [name for name, in db.session.query(Tag.name)
+                        .join(listing_tags, listing_tags.c.tag_id == Tag.id)
+                        .group_by(Tag.id).order_by(func.count().desc()).limit(2)]
+        max_listing = db.session.query(func.max(Listing.id)).scalar() or 1
+        busiest_forum = db.session.query(ForumPost.category_id).group_by(ForumPost.category_id) \
+            .order_by(func.count().desc()).limit(1).scalar() or 1
+        busiest_thread = db.session.query(ForumPost.id).order_by(ForumPost.comment_count.desc()).limit(1).scalar() or 1
+        busiest_user = db.session.query(Message.recipient_id).group_by(Message.recipient_id) \
+            .order_by(func.count().desc()).limit(1).scalar()
+
+    # Every combination of the browse filters, from none to all four.
+    filters = {
+        'q': 'q=casa',
+        'category': f'category_id={category_id}',
+        'price': 'min_price=50&max_price=5000',
+        'tags': 'tags=' + ','.join(popular_tags[:2]),
+    }
+    cases = []
+    for size in range(len(filters) + 1):
+        for names in combinations(filters, size):
+            query = '&'.join(filters[n] for n in names)
+            cases.append(Case('listings.all_listings[' + '+'.join(names or ('none',)) + ']',
+                              '/listings/all' + (f'?{query}' if query else ''), None))
+
+    cases += [
+        Case('listings.all_listings[near]', '/listings/all?near=-2.8974,-79.0045&radius=2', None),
+        Case('directory.businesses', '/directory/', None),
+        Case('directory.businesses[rating]', '/directory/?sort=rating', None),
+        Case('directory.businesses[q]', '/directory/?q=cafe', None),
+        Case('directory.businesses[near]', '/directory/?near=-2.8974,-79.0045&radius=2', None),
+        Case('listings.view_listing', lambda rng: f'/listings/{rng.randint(1, max_listing)}', None),
+        Case('messages.conversations', '/messages/', busiest_user),
+        Case('events.data', '/events/data', None),
+        Case('forum.categories', '/forum/', None),
+        Case('forum.category', f'/forum/category/{busiest_forum}', None),
+        Case('forum.post', f'/forum/post/{busiest_thread}', None),
+        Case('main.index', '/', None),
+    ]
+    return cases
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    rank = max(int(round(pct / 100.0 * len(sorted_values) + 0.5)) - 1, 0)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+
+def run_case(app, case, iterations, warmup, rng):
+    client = app.test_client()
+    if case.login:
+        with client.session_transaction() as session:
+            session['_user_id'] = str(case.login)
+            session['_fresh'] = True
+
+    timings, queries, statuses = [], [], Counter()
+    for i in range(warmup + iterations):
+        path = case.path(rng) if callable(case.path) else case.path
+        started = time.perf_counter()
+        response = client.get(path)
+        elapsed = time.perf_counter() - started
+        if i < warmup:
+            continue
+        timings.append(elapsed * 1000)
+        statuses[response.status_code] += 1
+        if 'X-Query-Count' in response.headers:
+            queries.append(int(response.headers['X-Query-Count']))
+
+    timings.sort()
+    return {
+        'p50_ms': round(percentile(timings, 50), 3),
+        'p95_ms': round(percentile(timings, 95), 3),
+        'mean_ms': round(sum(timings) / len(timings), 3),
+        'queries': round(sum(queries) / len(queries), 1) if queries else None,
+        'status': {str(code): n for code, n in sorted(statuses.items())},
+    }
+
+
+def print_report(results, baseline=None, threshold=0.2):
+    """Print a table; with a baseline, add p50/p95 changes and return regressions."""
+    regressions = []
+    width = max(len(name) for name in results)
+    header = f'{"case":<{width}}  {"status":>10}  {"p50 ms":>9}  {"p95 ms":>9}  {"queries":>7}'
+    if baseline:
+        header += f'  {"Δp50":>7}  {"Δp95":>7}'
+    print(header)
+    print('-' * len(header))
+    for name, r in results.items():
+        status = ','.join(f'{code}x{n}' if len(r['status']) > 1 else code for code, n in r['status'].items())
+        line = f'{name:<{width}}  {status:>10}  {r["p50_ms"]:>9.2f}  {r["p95_ms"]:>9.2f}  {r["queries"] if r["queries"] is not None else "-":>7}'
+        before = (baseline or {}).get(name)
+        if before:
+            changes = [(r[k] - before[k]) / before[k] if before[k] else 0.0 for k in ('p50_ms', 'p95_ms')]
+            line += ''.join(f'  {change:>+7.0%}' for change in changes)
+            if changes[0] > threshold or (r['queries'] or 0) > (before.get('queries') or 0):
+                regressions.append(name)
+                line += '  REGRESSION'
+        print(line)
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the hot pages against generated data.')
+    parser.add_argument('--scale', default='small', help='small, medium or full (default: small)')
+    parser.add_argument('--seed', type=int, default=1234)
+    parser.add_argument('--db', help='SQLite file to use (default: benchmarks/data/<scale>.db)')
+    parser.add_argument('--regenerate', action='store_true', help='rebuild the data set even if the file exists')
+    parser.add_argument('--iterations', type=int, default=50)
+    parser.add_argument('--warmup', type=int, default=5)
+    parser.add_argument('--only', action='append', help='glob of case names to run (repeatable)')
+    parser.add_argument('--save', help='write results to this JSON file')
+    parser.add_argument('--compare', help='compare against a JSON file written by --save')
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help='p50 slowdown that counts as a regression (default: 0.2 = 20%%)')
+    args = parser.parse_args(argv)
+
+    from .generate import SCALES
+    if args.scale not in SCALES:
+        parser.error(f'unknown scale {args.scale!r}, choose from {", ".join(SCALES)}')
+    os.makedirs(DATA_DIR, exist_ok=True)
+    db_path = os.path.abspath(args.db or os.path.join(DATA_DIR, f'{args.scale}.db'))
+
+    app = create_benchmark_app(db_path)
+    prepare_database(app, db_path, args.scale, args.seed, args.regenerate)
+
+    rng = random.Random(args.seed)
+    results = {}
+    for case in build_cases(app):
+        if args.only and not any(fnmatch.fnmatch(case.name, pattern) for pattern in args.only):
+            continue
+        results[case.name] = run_case(app, case, args.iterations, args.warmup, rng)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            saved = json.load(f)
+        baseline = saved['results']
+        if saved['meta'].get('scale') != args.scale:
+            print(f'warning: baseline was recorded at scale {saved["meta"].get("scale")!r}')
+    regressions = print_report(results, baseline, args.threshold)
+
+    if args.save:
+        os.makedirs(os.path.dirname(os.path.abspath(args.save)), exist_ok=True)
+        with open(args.save, 'w') as f:
+            json.dump({
+                'meta': {
+                    'scale': args.scale,
+                    'seed': args.seed,
+                    'iterations': args.iterations,
+                    'recorded_at': datetime.utcnow().isoformat(timespec='seconds'),
+                    'python': platform.python_version(),
+                    'sqlite': sqlite3.sqlite_version,
+                },
+                'results': results,
+            }, f, indent=2)
+        print(f'Saved results to {args.save}')
+
+    if regressions:
+        print(f'{len(regressions)} regression(s): {", ".join(regressions)}')
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -51,6 +51,17 @@ def get_metadata():
     return target_db.metadata
 
 
+# Tables created with raw SQL (FTS5 and R*Tree virtual tables and their
+# shadow tables) have no model, so keep autogenerate from trying to drop them.
+UNMANAGED_TABLE_PREFIXES = ('listings_fts', 'listings_geo', 'businesses_geo', 'events_geo', 'businesses_fts')
+
+
+def include_object(object, name, type_, reflected, compare_to):
+    if type_ == 'table' and reflected and compare_to is None:
+        return not name.startswith(UNMANAGED_TABLE_PREFIXES)
+    return True
+
+
 def run_migrations_offline():
     """Run migrations in 'offline' mode.
 
@@ -65,7 +76,8 @@ def run_migrations_offline():
     """
     url = config.get_main_option("sqlalchemy.url")
     context.configure(
-        url=url, target_metadata=get_metadata(), literal_binds=True
+        url=url, target_metadata=get_metadata(), literal_binds=True,
+        include_object=include_object
     )
 
     with context.begin_transaction():
@@ -93,6 +105,8 @@ def run_migrations_online():
     conf_args = current_app.extensions['migrate'].configure_args
     if conf_args.get("process_revision_directives") is None:
         conf_args["process_revision_directives"] = process_revision_directives
+    if conf_args.get("include_object") is None:
+        conf_args["include_object"] = include_object
 
     connectable = get_engine()
 
@@ -0,0 +1,36 @@
+"""Add listing full-text search index
+
+Revision ID: 3b1f0c9d7a52
+Revises: f888d432fee4
+Create Date: 2026-10-18 09:12:04.118204
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '3b1f0c9d7a52'
+down_revision = 'f888d432fee4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # FTS5 virtual tables are SQLite-only; other backends keep the LIKE fallback.
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    op.execute(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS listings_fts USING fts5("
+        "title, description, location, "
+        "tokenize = 'unicode61 remove_diacritics 2')"
+    )
+    op.execute(
+        "INSERT INTO listings_fts (rowid, title, description, location) "
+        "SELECT id, title, description, COALESCE(location, '') FROM listings"
+    )
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    op.execute("DROP TABLE IF EXISTS listings_fts")
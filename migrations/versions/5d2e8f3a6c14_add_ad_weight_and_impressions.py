@@ -0,0 +1,28 @@
+"""Add ad weight and impressions
+
+Revision ID: 5d2e8f3a6c14
+Revises: a4c7e2d91b08
+Create Date: 2026-10-18 12:20:31.904417
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5d2e8f3a6c14'
+down_revision = 'a4c7e2d91b08'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('ads', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('weight', sa.Integer(), nullable=False, server_default='1'))
+        batch_op.add_column(sa.Column('impressions', sa.Integer(), nullable=False, server_default='0'))
+
+
+def downgrade():
+    with op.batch_alter_table('ads', schema=None) as batch_op:
+        batch_op.drop_column('impressions')
+        batch_op.drop_column('weight')
@@ -0,0 +1,61 @@
+"""Add review and forum aggregates
+
+Revision ID: 7e9a1c4b2f60
+Revises: 5d2e8f3a6c14
+Create Date: 2026-10-18 13:05:12.660198
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7e9a1c4b2f60'
+down_revision = '5d2e8f3a6c14'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('businesses', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('review_count', sa.Integer(), nullable=False, server_default='0'))
+        batch_op.add_column(sa.Column('rating_sum', sa.Integer(), nullable=False, server_default='0'))
+
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('seller_review_count', sa.Integer(), nullable=False, server_default='0'))
+        batch_op.add_column(sa.Column('seller_rating_sum', sa.Integer(), nullable=False, server_default='0'))
+
+    with op.batch_alter_table('forum_posts', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('comment_count', sa.Integer(), nullable=False, server_default='0'))
+        batch_op.add_column(sa.Column('last_activity', sa.DateTime(), nullable=True))
+
+    # Backfill from the existing rows (same queries as `flask reconcile-aggregates`).
+    op.execute(
+        "UPDATE businesses SET "
+        "review_count = (SELECT count(*) FROM reviews WHERE reviews.business_id = businesses.id), "
+        "rating_sum = (SELECT coalesce(sum(rating), 0) FROM reviews WHERE reviews.business_id = businesses.id)"
+    )
+    op.execute(
+        "UPDATE users SET "
+        "seller_review_count = (SELECT count(*) FROM reviews WHERE reviews.seller_id = users.id), "
+        "seller_rating_sum = (SELECT coalesce(sum(rating), 0) FROM reviews WHERE reviews.seller_id = users.id)"
+    )
+    op.execute(
+        "UPDATE forum_posts SET "
+        "comment_count = (SELECT count(*) FROM forum_comments WHERE forum_comments.post_id = forum_posts.id), "
+        "last_activity = coalesce((SELECT max(timestamp) FROM forum_comments WHERE forum_comments.post_id = forum_posts.id), timestamp)"
+    )
+
+
+def downgrade():
+    with op.batch_alter_table('forum_posts', schema=None) as batch_op:
+        batch_op.drop_column('last_activity')
+        batch_op.drop_column('comment_count')
+
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.drop_column('seller_rating_sum')
+        batch_op.drop_column('seller_review_count')
+
+    with op.batch_alter_table('businesses', schema=None) as batch_op:
+        batch_op.drop_column('rating_sum')
+        batch_op.drop_column('review_count')
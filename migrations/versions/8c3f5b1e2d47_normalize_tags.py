@@ -0,0 +1,71 @@
+"""Normalize tag names and make listing_tags pairs unique
+
+Revision ID: 8c3f5b1e2d47
+Revises: 7e9a1c4b2f60
+Create Date: 2026-10-18 14:02:41.318754
+
+"""
+import re
+import unicodedata
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8c3f5b1e2d47'
+down_revision = '7e9a1c4b2f60'
+branch_labels = None
+depends_on = None
+
+
+# Same rules as app/listings/tags.py:normalize, copied so the migration
+# doesn't change meaning if the app code does.
+def _normalize(name):
+    decomposed = unicodedata.normalize('NFKD', name or '')
+    folded = ''.join(c for c in decomposed if not unicodedata.combining(c)).casefold()
+    return re.sub(r'\s+', ' ', folded).strip()[:64].strip()
+
+
+def upgrade():
+    conn = op.get_bind()
+    tags = sa.table('tags', sa.column('id', sa.Integer), sa.column('name', sa.String))
+    listing_tags = sa.table('listing_tags', sa.column('listing_id', sa.Integer), sa.column('tag_id', sa.Integer))
+
+    # Merge tags that normalise to the same name into the lowest id.
+    keep = {}
+    renames, merges = [], []
+    for tag_id, name in conn.execute(sa.select(tags.c.id, tags.c.name).order_by(tags.c.id)):
+        normalized = _normalize(name)
+        if normalized in keep:
+            merges.append((tag_id, keep[normalized]))
+            continue
+        keep[normalized] = tag_id
+        if normalized != name:
+            renames.append((tag_id, normalized))
+
+    for old_id, new_id in merges:
+        conn.execute(listing_tags.update().where(listing_tags.c.tag_id == old_id).values(tag_id=new_id))
+        conn.execute(tags.delete().where(tags.c.id == old_id))
+    for tag_id, normalized in renames:
+        conn.execute(tags.update().where(tags.c.id == tag_id).values(name=normalized))
+
+    # Drop duplicate (listing, tag) pairs, including ones the merge created.
+    conn.execute(sa.text(
+        "DELETE FROM listing_tags WHERE rowid NOT IN ("
+        "SELECT min(rowid) FROM listing_tags GROUP BY listing_id, tag_id)"
+    ) if conn.dialect.name == 'sqlite' else sa.text(
+        "DELETE FROM listing_tags a USING listing_tags b "
+        "WHERE a.ctid > b.ctid AND a.listing_id = b.listing_id AND a.tag_id = b.tag_id"
+    ))
+
+    with op.batch_alter_table('listing_tags', schema=None) as batch_op:
+        batch_op.drop_index('ix_listing_tags_listing_id_tag_id')
+        batch_op.create_index('ix_listing_tags_listing_id_tag_id', ['listing_id', 'tag_id'], unique=True)
+
+
+def downgrade():
+    # Tag renames and merges are not reversed.
+    with op.batch_alter_table('listing_tags', schema=None) as batch_op:
+        batch_op.drop_index('ix_listing_tags_listing_id_tag_id')
+        batch_op.create_index('ix_listing_tags_listing_id_tag_id', ['listing_id', 'tag_id'], unique=False)
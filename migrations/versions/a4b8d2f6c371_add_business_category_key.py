@@ -0,0 +1,46 @@
+"""Add a case-insensitive key to business categories
+
+Revision ID: a4b8d2f6c371
+Revises: f2c4e6a8b017
+Create Date: 2026-10-18 21:14:37.902615
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a4b8d2f6c371'
+down_revision = 'f2c4e6a8b017'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('business_categories', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('key', sa.String(length=100), nullable=True))
+
+    # Backfill in Python: str.casefold() matches what the app writes, SQL lower() is ASCII-only.
+    # Case variants created before the key existed are merged into the oldest one.
+    connection = op.get_bind()
+    kept = {}
+    for category_id, name in connection.execute(sa.text("SELECT id, name FROM business_categories ORDER BY id")):
+        key = name.casefold()
+        if key in kept:
+            connection.execute(sa.text("UPDATE businesses SET category_id = :kept WHERE category_id = :id"),
+                               {'kept': kept[key], 'id': category_id})
+            connection.execute(sa.text("DELETE FROM business_categories WHERE id = :id"), {'id': category_id})
+            continue
+        kept[key] = category_id
+        connection.execute(sa.text("UPDATE business_categories SET key = :key WHERE id = :id"),
+                           {'key': key, 'id': category_id})
+
+    with op.batch_alter_table('business_categories', schema=None) as batch_op:
+        batch_op.alter_column('key', existing_type=sa.String(length=100), nullable=False)
+        batch_op.create_unique_constraint('uq_business_categories_key', ['key'])
+
+
+def downgrade():
+    with op.batch_alter_table('business_categories', schema=None) as batch_op:
+        batch_op.drop_constraint('uq_business_categories_key', type_='unique')
+        batch_op.drop_column('key')
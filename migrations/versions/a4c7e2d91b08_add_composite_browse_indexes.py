@@ -0,0 +1,67 @@
+"""Add composite indexes for browse queries
+
+Revision ID: a4c7e2d91b08
+Revises: 3b1f0c9d7a52
+Create Date: 2026-10-18 10:02:47.530112
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'a4c7e2d91b08'
+down_revision = '3b1f0c9d7a52'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('listings', schema=None) as batch_op:
+        batch_op.create_index('ix_listings_status_sponsored_created', ['status', 'is_sponsored', 'created_at'], unique=False)
+        batch_op.create_index('ix_listings_status_category_sponsored_created', ['status', 'category_id', 'is_sponsored', 'created_at'], unique=False)
+        batch_op.create_index('ix_listings_status_price', ['status', 'price'], unique=False)
+        batch_op.create_index('ix_listings_user_id_created_at', ['user_id', 'created_at'], unique=False)
+
+    with op.batch_alter_table('listing_tags', schema=None) as batch_op:
+        batch_op.create_index('ix_listing_tags_tag_id_listing_id', ['tag_id', 'listing_id'], unique=False)
+        batch_op.create_index('ix_listing_tags_listing_id_tag_id', ['listing_id', 'tag_id'], unique=False)
+
+    with op.batch_alter_table('messages', schema=None) as batch_op:
+        batch_op.create_index('ix_messages_sender_listing_timestamp', ['sender_id', 'listing_id', 'timestamp'], unique=False)
+        batch_op.create_index('ix_messages_recipient_listing_timestamp', ['recipient_id', 'listing_id', 'timestamp'], unique=False)
+
+    with op.batch_alter_table('forum_posts', schema=None) as batch_op:
+        batch_op.create_index('ix_forum_posts_category_id_timestamp', ['category_id', 'timestamp'], unique=False)
+
+    with op.batch_alter_table('forum_comments', schema=None) as batch_op:
+        batch_op.create_index('ix_forum_comments_post_id_timestamp', ['post_id', 'timestamp'], unique=False)
+
+    with op.batch_alter_table('reviews', schema=None) as batch_op:
+        batch_op.create_index('ix_reviews_seller_id_timestamp', ['seller_id', 'timestamp'], unique=False)
+        batch_op.create_index('ix_reviews_business_id_timestamp', ['business_id', 'timestamp'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('reviews', schema=None) as batch_op:
+        batch_op.drop_index('ix_reviews_business_id_timestamp')
+        batch_op.drop_index('ix_reviews_seller_id_timestamp')
+
+    with op.batch_alter_table('forum_comments', schema=None) as batch_op:
+        batch_op.drop_index('ix_forum_comments_post_id_timestamp')
+
+    with op.batch_alter_table('forum_posts', schema=None) as batch_op:
+        batch_op.drop_index('ix_forum_posts_category_id_timestamp')
+
+    with op.batch_alter_table('messages', schema=None) as batch_op:
+        batch_op.drop_index('ix_messages_recipient_listing_timestamp')
+        batch_op.drop_index('ix_messages_sender_listing_timestamp')
+
+    with op.batch_alter_table('listing_tags', schema=None) as batch_op:
+        batch_op.drop_index('ix_listing_tags_listing_id_tag_id')
+        batch_op.drop_index('ix_listing_tags_tag_id_listing_id')
+
+    with op.batch_alter_table('listings', schema=None) as batch_op:
+        batch_op.drop_index('ix_listings_user_id_created_at')
+        batch_op.drop_index('ix_listings_status_price')
+        batch_op.drop_index('ix_listings_status_category_sponsored_created')
+        batch_op.drop_index('ix_listings_status_sponsored_created')
@@ -0,0 +1,109 @@
+"""Add geo coordinates and spatial indexes
+
+Revision ID: a7d3f6b2c941
+Revises: f5c1a9e3b702
+Create Date: 2026-10-18 17:26:53.904417
+
+"""
+import re
+import unicodedata
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a7d3f6b2c941'
+down_revision = 'f5c1a9e3b702'
+branch_labels = None
+depends_on = None
+
+PLACES = (
+    ('Cuenca', -2.9001, -79.0059),
+    ('El Centro', -2.8974, -79.0045),
+    ('San Sebastián', -2.8967, -79.0125),
+    ('El Vergel', -2.9050, -79.0010),
+    ('Totoracocha', -2.8930, -78.9790),
+    ('Gringolandia', -2.8945, -79.0230),
+    ('Challuabamba', -2.8720, -78.9330),
+    ('Misicata', -2.9020, -79.0500),
+    ('Ricaurte', -2.8530, -78.9520),
+    ('Baños', -2.9190, -79.0650),
+    ('Turi', -2.9280, -79.0040),
+    ('El Batán', -2.8990, -79.0190),
+    ('Yanuncay', -2.9120, -79.0200),
+    ('Monay', -2.8960, -78.9700),
+    ('Puertas del Sol', -2.9070, -79.0250),
+    ('Las Pencas', -2.9150, -79.0120),
+)
+
+# (table, free-text column, R*Tree table)
+GEOCODED = (
+    ('listings', 'location', 'listings_geo'),
+    ('businesses', 'address', 'businesses_geo'),
+    ('events', 'location', 'events_geo'),
+)
+
+
+def _fold(value):
+    decomposed = unicodedata.normalize('NFKD', value or '')
+    return ''.join(c for c in decomposed if not unicodedata.combining(c)).lower()
+
+
+def upgrade():
+    places = op.create_table('places',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(length=100), nullable=False),
+    sa.Column('latitude', sa.Float(), nullable=False),
+    sa.Column('longitude', sa.Float(), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('name')
+    )
+    op.bulk_insert(places, [dict(name=name, latitude=lat, longitude=lng) for name, lat, lng in PLACES])
+
+    for table, _, _ in GEOCODED:
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.add_column(sa.Column('latitude', sa.Float(), nullable=True))
+            batch_op.add_column(sa.Column('longitude', sa.Float(), nullable=True))
+
+    # Geocode existing rows the way geo.geocode does: longest place name
+    # found in the folded text wins.
+    gazetteer = [
+        (re.compile(r'\b' + re.escape(_fold(name)) + r'\b'), lat, lng)
+        for name, lat, lng in sorted(PLACES, key=lambda p: -len(p[0]))
+    ]
+    bind = op.get_bind()
+    for table, text_column, _ in GEOCODED:
+        params = []
+        for row_id, value in bind.execute(sa.text(f"SELECT id, {text_column} FROM {table} WHERE {text_column} IS NOT NULL")):
+            folded = _fold(value)
+            for pattern, lat, lng in gazetteer:
+                if pattern.search(folded):
+                    params.append({'row_id': row_id, 'lat': lat, 'lng': lng})
+                    break
+        if params:
+            bind.execute(sa.text(f"UPDATE {table} SET latitude = :lat, longitude = :lng WHERE id = :row_id"), params)
+
+    # R*Tree virtual tables are SQLite-only; other backends filter on the columns.
+    if bind.dialect.name != 'sqlite':
+        return
+    for table, _, rtree in GEOCODED:
+        op.execute(f"CREATE VIRTUAL TABLE IF NOT EXISTS {rtree} USING rtree(id, min_lat, max_lat, min_lng, max_lng)")
+        op.execute(
+            f"INSERT INTO {rtree} (id, min_lat, max_lat, min_lng, max_lng) "
+            f"SELECT id, latitude, latitude, longitude, longitude FROM {table} "
+            "WHERE latitude IS NOT NULL AND longitude IS NOT NULL"
+        )
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'sqlite':
+        for _, _, rtree in GEOCODED:
+            op.execute(f"DROP TABLE IF EXISTS {rtree}")
+
+    for table, _, _ in reversed(GEOCODED):
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.drop_column('longitude')
+            batch_op.drop_column('latitude')
+
+    op.drop_table('places')
@@ -0,0 +1,32 @@
+"""Add event range index and updated_at
+
+Revision ID: b5d9e2a7c318
+Revises: 8c3f5b1e2d47
+Create Date: 2026-10-18 14:47:09.552817
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b5d9e2a7c318'
+down_revision = '8c3f5b1e2d47'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('events', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('updated_at', sa.DateTime(), nullable=True))
+        batch_op.create_index('ix_events_start_time_end_time', ['start_time', 'end_time'], unique=False)
+        batch_op.create_index(batch_op.f('ix_events_updated_at'), ['updated_at'], unique=False)
+
+    op.execute("UPDATE events SET updated_at = CURRENT_TIMESTAMP")
+
+
+def downgrade():
+    with op.batch_alter_table('events', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_events_updated_at'))
+        batch_op.drop_index('ix_events_start_time_end_time')
+        batch_op.drop_column('updated_at')
@@ -0,0 +1,88 @@
+"""Add business categories, rating average and directory search index
+
+Revision ID: c9e2a4d7b153
+Revises: a7d3f6b2c941
+Create Date: 2026-10-18 17:58:21.640913
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c9e2a4d7b153'
+down_revision = 'a7d3f6b2c941'
+branch_labels = None
+depends_on = None
+
+RATING_AVG_SQL = "CASE WHEN review_count > 0 THEN rating_sum * 1.0 / review_count ELSE 0 END"
+
+
+def upgrade():
+    op.create_table('business_categories',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(length=100), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('name')
+    )
+    op.execute(
+        "INSERT INTO business_categories (name) "
+        "SELECT DISTINCT category FROM businesses WHERE category IS NOT NULL ORDER BY category"
+    )
+
+    with op.batch_alter_table('businesses', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('category_id', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('rating_avg', sa.Float(), server_default='0', nullable=False))
+
+    op.execute(
+        "UPDATE businesses SET category_id = "
+        "(SELECT id FROM business_categories WHERE business_categories.name = businesses.category)"
+    )
+    op.execute(f"UPDATE businesses SET rating_avg = {RATING_AVG_SQL}")
+
+    with op.batch_alter_table('businesses', schema=None) as batch_op:
+        batch_op.drop_column('category')
+        batch_op.alter_column('category_id', existing_type=sa.Integer(), nullable=False)
+        batch_op.create_foreign_key('fk_businesses_category_id_business_categories', 'business_categories', ['category_id'], ['id'])
+        batch_op.create_index('ix_businesses_category_id_name', ['category_id', 'name'], unique=False)
+        batch_op.create_index('ix_businesses_category_id_rating', ['category_id', 'rating_avg', 'review_count'], unique=False)
+        batch_op.create_index('ix_businesses_name', ['name'], unique=False)
+        batch_op.create_index('ix_businesses_rating', ['rating_avg', 'review_count'], unique=False)
+
+    # FTS5 virtual tables are SQLite-only; other backends keep the LIKE fallback.
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    op.execute(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS businesses_fts USING fts5("
+        "name, description, address, "
+        "tokenize = 'unicode61 remove_diacritics 2')"
+    )
+    op.execute(
+        "INSERT INTO businesses_fts (rowid, name, description, address) "
+        "SELECT id, name, description, COALESCE(address, '') FROM businesses"
+    )
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'sqlite':
+        op.execute("DROP TABLE IF EXISTS businesses_fts")
+
+    with op.batch_alter_table('businesses', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('category', sa.String(length=100), nullable=True))
+
+    op.execute(
+        "UPDATE businesses SET category = "
+        "(SELECT name FROM business_categories WHERE business_categories.id = businesses.category_id)"
+    )
+
+    with op.batch_alter_table('businesses', schema=None) as batch_op:
+        batch_op.drop_index('ix_businesses_rating')
+        batch_op.drop_index('ix_businesses_name')
+        batch_op.drop_index('ix_businesses_category_id_rating')
+        batch_op.drop_index('ix_businesses_category_id_name')
+        batch_op.drop_constraint('fk_businesses_category_id_business_categories', type_='foreignkey')
+        batch_op.drop_column('rating_avg')
+        batch_op.drop_column('category_id')
+        batch_op.alter_column('category', existing_type=sa.String(length=100), nullable=False)
+
+    op.drop_table('business_categories')
@@ -0,0 +1,45 @@
+"""Add recurring events
+
+Revision ID: d1a6c3f8e920
+Revises: b5d9e2a7c318
+Create Date: 2026-10-18 15:31:27.104663
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd1a6c3f8e920'
+down_revision = 'b5d9e2a7c318'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('event_exceptions',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('event_id', sa.Integer(), nullable=False),
+    sa.Column('original_start', sa.DateTime(), nullable=False),
+    sa.Column('is_cancelled', sa.Boolean(), nullable=False),
+    sa.Column('start_time', sa.DateTime(), nullable=True),
+    sa.Column('end_time', sa.DateTime(), nullable=True),
+    sa.Column('title', sa.String(length=100), nullable=True),
+    sa.Column('location', sa.String(length=255), nullable=True),
+    sa.ForeignKeyConstraint(['event_id'], ['events.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('event_id', 'original_start', name='uq_event_exceptions_event_id_original_start')
+    )
+    with op.batch_alter_table('events', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('rrule', sa.String(length=255), nullable=True))
+        batch_op.add_column(sa.Column('recurrence_end', sa.DateTime(), nullable=True))
+        batch_op.create_index(batch_op.f('ix_events_recurrence_end'), ['recurrence_end'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('events', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_events_recurrence_end'))
+        batch_op.drop_column('recurrence_end')
+        batch_op.drop_column('rrule')
+
+    op.drop_table('event_exceptions')
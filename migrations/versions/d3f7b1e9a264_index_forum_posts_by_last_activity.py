@@ -0,0 +1,35 @@
+"""Index forum posts by last activity
+
+Revision ID: d3f7b1e9a264
+Revises: c9e2a4d7b153
+Create Date: 2026-10-18 18:34:47.302518
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd3f7b1e9a264'
+down_revision = 'c9e2a4d7b153'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Thread lists sort on last_activity, so it can no longer be NULL.
+    op.execute(
+        "UPDATE forum_posts SET last_activity = COALESCE("
+        "(SELECT MAX(timestamp) FROM forum_comments WHERE forum_comments.post_id = forum_posts.id), "
+        "timestamp, CURRENT_TIMESTAMP) "
+        "WHERE last_activity IS NULL"
+    )
+    with op.batch_alter_table('forum_posts', schema=None) as batch_op:
+        batch_op.alter_column('last_activity', existing_type=sa.DateTime(), nullable=False)
+        batch_op.create_index('ix_forum_posts_category_id_last_activity', ['category_id', 'last_activity'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('forum_posts', schema=None) as batch_op:
+        batch_op.drop_index('ix_forum_posts_category_id_last_activity')
+        batch_op.alter_column('last_activity', existing_type=sa.DateTime(), nullable=True)
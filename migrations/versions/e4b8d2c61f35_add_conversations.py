@@ -0,0 +1,58 @@
+"""Add conversations
+
+Revision ID: e4b8d2c61f35
+Revises: d1a6c3f8e920
+Create Date: 2026-10-18 16:02:41.382915
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e4b8d2c61f35'
+down_revision = 'd1a6c3f8e920'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('conversations',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('listing_id', sa.Integer(), nullable=False),
+    sa.Column('user_a_id', sa.Integer(), nullable=False),
+    sa.Column('user_b_id', sa.Integer(), nullable=False),
+    sa.Column('last_message_id', sa.Integer(), nullable=False),
+    sa.Column('last_message_at', sa.DateTime(), nullable=False),
+    sa.Column('unread_a', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('unread_b', sa.Integer(), server_default='0', nullable=False),
+    sa.CheckConstraint('user_a_id < user_b_id', name='ck_conversations_user_order'),
+    sa.ForeignKeyConstraint(['last_message_id'], ['messages.id'], ),
+    sa.ForeignKeyConstraint(['listing_id'], ['listings.id'], ),
+    sa.ForeignKeyConstraint(['user_a_id'], ['users.id'], ),
+    sa.ForeignKeyConstraint(['user_b_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('listing_id', 'user_a_id', 'user_b_id', name='uq_conversations_listing_id_users')
+    )
+    with op.batch_alter_table('conversations', schema=None) as batch_op:
+        batch_op.create_index('ix_conversations_user_a_id_last_message_at', ['user_a_id', 'last_message_at'], unique=False)
+        batch_op.create_index('ix_conversations_user_b_id_last_message_at', ['user_b_id', 'last_message_at'], unique=False)
+
+    # Backfill one row per existing thread (same query as messages.inbox.rebuild).
+    # There is no read tracking before this, so every thread starts as read.
+    user_a = "CASE WHEN sender_id < recipient_id THEN sender_id ELSE recipient_id END"
+    user_b = "CASE WHEN sender_id < recipient_id THEN recipient_id ELSE sender_id END"
+    op.execute(
+        "INSERT INTO conversations (listing_id, user_a_id, user_b_id, last_message_id, last_message_at, unread_a, unread_b) "
+        f"SELECT listing_id, {user_a}, {user_b}, max(id), max(timestamp), 0, 0 FROM messages "
+        f"WHERE sender_id != recipient_id AND timestamp IS NOT NULL "
+        f"GROUP BY listing_id, {user_a}, {user_b}"
+    )
+
+
+def downgrade():
+    with op.batch_alter_table('conversations', schema=None) as batch_op:
+        batch_op.drop_index('ix_conversations_user_b_id_last_message_at')
+        batch_op.drop_index('ix_conversations_user_a_id_last_message_at')
+
+    op.drop_table('conversations')
@@ -0,0 +1,56 @@
+"""Add job locks and boost expiry
+
+Revision ID: e6a8c2f4d913
+Revises: d3f7b1e9a264
+Create Date: 2026-10-18 19:12:36.557201
+
+"""
+from datetime import datetime, timedelta
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e6a8c2f4d913'
+down_revision = 'd3f7b1e9a264'
+branch_labels = None
+depends_on = None
+
+# LISTING_BOOST_DAYS at the time of writing.
+BOOST_DAYS = 7
+
+
+def upgrade():
+    op.create_table('job_locks',
+    sa.Column('name', sa.String(length=64), nullable=False),
+    sa.Column('locked_by', sa.String(length=32), nullable=True),
+    sa.Column('locked_until', sa.DateTime(), nullable=True),
+    sa.Column('last_started_at', sa.DateTime(), nullable=True),
+    sa.Column('last_finished_at', sa.DateTime(), nullable=True),
+    sa.Column('last_error', sa.Text(), nullable=True),
+    sa.PrimaryKeyConstraint('name')
+    )
+    with op.batch_alter_table('listings', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('sponsored_until', sa.DateTime(), nullable=True))
+        batch_op.create_index(batch_op.f('ix_listings_sponsored_until'), ['sponsored_until'], unique=False)
+
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_users_subscription_end_date'), ['subscription_end_date'], unique=False)
+
+    # Boosts given before they could expire get one more full boost period.
+    op.get_bind().execute(
+        sa.text("UPDATE listings SET sponsored_until = :until WHERE is_sponsored"),
+        {'until': datetime.utcnow() + timedelta(days=BOOST_DAYS)}
+    )
+
+
+def downgrade():
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_users_subscription_end_date'))
+
+    with op.batch_alter_table('listings', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_listings_sponsored_until'))
+        batch_op.drop_column('sponsored_until')
+
+    op.drop_table('job_locks')
@@ -0,0 +1,36 @@
+"""Normalise SQLite timestamps written by SQL now()
+
+Revision ID: f2c4e6a8b017
+Revises: e6a8c2f4d913
+Create Date: 2026-10-18 20:05:12.418093
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'f2c4e6a8b017'
+down_revision = 'e6a8c2f4d913'
+branch_labels = None
+depends_on = None
+
+# Columns that got 'YYYY-MM-DD HH:MM:SS' from CURRENT_TIMESTAMP / now().
+# SQLAlchemy stores and binds 'YYYY-MM-DD HH:MM:SS.ffffff' on SQLite, and the
+# text comparison of the two makes keyset cursors repeat rows.
+COLUMNS = (
+    ('listings', 'created_at'),
+    ('listings', 'updated_at'),
+    ('forum_posts', 'last_activity'),
+)
+
+
+def upgrade():
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    for table, column in COLUMNS:
+        op.execute(f"UPDATE {table} SET {column} = {column} || '.000000' WHERE length({column}) = 19")
+
+
+def downgrade():
+    # Both formats read back as the same datetimes.
+    pass
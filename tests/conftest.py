@@ -0,0 +1,100 @@
+# tests/conftest.py
+
+import json
+
+import pytest
+from sqlalchemy import event
+
+from app import create_app, db
+from app.data import populate_db
+from app.pagination import clear_count_cache
+from app.query_counter import query_counter
+from app.refdata import refdata
+
+
+def pytest_configure(config):
+    config.addinivalue_line('markers', 'config(**settings): app config overrides for the test')
+
+
+@pytest.fixture
+def app(request, monkeypatch):
+    """The 'testing' profile on a fresh in-memory database with the seed rows.
+
+    @pytest.mark.config(KEY=value) overrides settings, through the FLASK_*
+    environment variables create_app() reads.
+    """
+    marker = request.node.get_closest_marker('config')
+    for key, value in (marker.kwargs if marker else {}).items():
+        monkeypatch.setenv(f'FLASK_{key}', json.dumps(value))
+    app = create_app('testing')
+    with app.app_context():
+        db.create_all()
+        populate_db()
+    # Process-wide caches would leak rows from the previous test's database.
+    refdata.invalidate()
+    clear_count_cache()
+    query_counter.reset()
+    yield app
+    with app.app_context():
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def statements(app):
+    """SQL statements executed while the test runs, as (sql, parameters)."""
+    executed = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        executed.append((statement, parameters))
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', record)
+    yield executed
+    event.remove(engine, 'before_cursor_execute', record)
+
+
+@pytest.fixture
+def user(app):
+    from app.models import User
+    with app.app_context():
+        user = User(username='seller', email='seller@example.com')
+        user.set_password('secret')
+        db.session.add(user)
+        db.session.commit()
+        return user.id
+
+
+@pytest.fixture
+def login(client):
+    """login(user_id) signs the test client in as that user."""
+    def log_in(user_id):
+        with client.session_transaction() as session:
+            session['_user_id'] = str(user_id)
+            session['_fresh'] = True
+    return log_in
+
+
+@pytest.fixture
+def make_listings(app, user):
+    """make_listings(n, **columns) adds n published listings through the ORM; returns their ids."""
+    from app.models import Category, Listing
+
+    def make(n, **columns):
+        with app.app_context():
+            category_id = columns.pop('category_id', None) or Category.query.first().id
+            listings = [
+                Listing(title=f'Listing {i}', description='Something for sale', user_id=user,
+                        category_id=category_id, price=10 * i, **columns)
+                for i in range(n)
+            ]
+            db.session.add_all(listings)
+            db.session.commit()
+            return [listing.id for listing in listings]
+    return make
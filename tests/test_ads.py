@@ -0,0 +1,48 @@
+# tests/test_ads.py
+
+from datetime import datetime, timedelta
+
+import pytest
+
+from app import db
+from app.ads.pool import ad_pool
+from app.counters import ad_impressions
+from app.models import Ad
+
+
+@pytest.fixture
+def ads(app):
+    now = datetime.utcnow()
+    with app.app_context():
+        ads = [
+            Ad(image_url=f'https://ads.example.com/{i}.png', link_url=f'https://example.com/{i}',
+               start_date=now - timedelta(days=1), end_date=now + timedelta(days=1), weight=weight)
+            for i, weight in enumerate((1, 3))
+        ]
+        db.session.add_all(ads)
+        db.session.commit()
+        ids = [ad.id for ad in ads]
+    ad_pool.invalidate()
+    yield ids
+    # Write the buffered impressions while the tables still exist.
+    with app.app_context():
+        ad_impressions.flush()
+    ad_pool.invalidate()
+
+
+@pytest.mark.config(RESPONSE_CACHE_BACKEND='memory')
+def test_cached_homepage_leaves_ad_to_the_client(client, ads):
+    before = [ad_impressions.pending(i) for i in ads]
+    for _ in range(3):
+        response = client.get('/')
+        assert response.status_code == 200
+        assert 'id="ad-slot"' in response.get_data(as_text=True)
+    # Rendering (or serving from cache) the homepage counts no impression.
+    assert [ad_impressions.pending(i) for i in ads] == before
+
+
+def test_serve_rotates_ads_and_counts_each_impression(client, ads):
+    before = sum(ad_impressions.pending(i) for i in ads)
+    served = [client.get('/ads/serve').get_json()['id'] for _ in range(40)]
+    assert set(served) == set(ads)
+    assert sum(ad_impressions.pending(i) for i in ads) - before == 40
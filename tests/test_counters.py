@@ -0,0 +1,55 @@
+# tests/test_counters.py
+
+import pytest
+
+from app import db
+from app.counters import BufferedCounter, view_counter
+from app.models import Listing
+
+
+@pytest.fixture
+def counter(app):
+    yield view_counter
+    # Nothing left over for the next test's database.
+    view_counter.flush()
+
+
+def views(app, listing_id):
+    with app.app_context():
+        db.session.expire_all()
+        return db.session.get(Listing, listing_id).views_count or 0
+
+
+@pytest.mark.config(VIEW_COUNTER_FLUSH_INTERVAL=3600)
+def test_views_are_buffered_and_flushed_in_one_batch(app, client, counter, statements, make_listings):
+    first, second = make_listings(2)
+    for listing_id in (first, first, first, second):
+        assert client.get(f'/listings/{listing_id}').status_code == 200
+    # Not written yet, but the page already shows the pending views.
+    assert views(app, first) == 0
+    assert 'Views: 4' in client.get(f'/listings/{first}').get_data(as_text=True)
+
+    del statements[:]
+    assert counter.flush() == 2
+    updates = [params for sql, params in statements if sql.startswith('UPDATE listings')]
+    assert len(updates) == 1 and len(updates[0]) == 2
+    assert (views(app, first), views(app, second)) == (4, 1)
+    assert counter.pending(first) == 0 and counter.flush() == 0
+
+
+@pytest.mark.config(VIEW_COUNTER_FLUSH_INTERVAL=3600, VIEW_COUNTER_MAX_PENDING=2)
+def test_flushes_once_enough_rows_are_waiting(app, client, counter, make_listings):
+    first, second = make_listings(2)
+    client.get(f'/listings/{first}')
+    assert views(app, first) == 0
+    client.get(f'/listings/{second}')
+    assert (views(app, first), views(app, second)) == (1, 1)
+
+
+def test_failed_flush_keeps_the_increments(app):
+    counter = BufferedCounter('no_such_table', 'hits')
+    counter.increment(7, 3)
+    with pytest.raises(KeyError):
+        counter.flush()
+    counter.increment(7)
+    assert counter.pending(7) == 4
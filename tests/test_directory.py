@@ -0,0 +1,26 @@
+# tests/test_directory.py
+
+from app import db
+from app.models import Business, BusinessCategory
+
+
+def test_new_business_reuses_category_whatever_the_case(app, client, user):
+    with client.session_transaction() as session:
+        session['_user_id'] = str(user)
+        session['_fresh'] = True
+    for name, category in (('Sol', 'Bakery'), ('Luna', ' bakery '), ('Estrella', 'BAKERY')):
+        response = client.post('/directory/new_business', data={
+            'name': name, 'description': 'Bread', 'category': category,
+        })
+        assert response.status_code == 302
+
+    with app.app_context():
+        assert [(c.name, c.key) for c in BusinessCategory.query] == [('Bakery', 'bakery')]
+        assert {b.category.name for b in Business.query} == {'Bakery'}
+
+
+def test_category_key_is_filled_in_on_insert(app):
+    with app.app_context():
+        db.session.add(BusinessCategory(name='Café Bar'))
+        db.session.commit()
+        assert BusinessCategory.query.one().key == 'café bar'
@@ -0,0 +1,113 @@
+# tests/test_events.py
+
+from datetime import datetime, timedelta
+
+import pytest
+
+from app import db
+from app.models import Event
+
+
+@pytest.fixture
+def logged_in(client, user):
+    with client.session_transaction() as session:
+        session['_user_id'] = str(user)
+        session['_fresh'] = True
+    return client
+
+
+@pytest.fixture
+def weekly_event(app, user):
+    start = datetime.utcnow().replace(hour=10, minute=0, second=0, microsecond=0) + timedelta(days=1)
+    with app.app_context():
+        event = Event(title='Saturday market', description='Local produce', location='Town square',
+                      start_time=start, end_time=start + timedelta(hours=3), rrule='FREQ=WEEKLY', user_id=user)
+        db.session.add(event)
+        db.session.commit()
+        return event.id, start
+
+
+def test_calendar_page_points_at_the_feed(client):
+    response = client.get('/events/')
+    assert response.status_code == 200
+    assert 'data-feed-url="/events/data"' in response.get_data(as_text=True)
+
+
+def test_event_page_lists_upcoming_dates(logged_in, weekly_event):
+    event_id, start = weekly_event
+    page = logged_in.get(f'/events/{event_id}').get_data(as_text=True)
+    assert 'Saturday market' in page
+    assert start.strftime('%a %b %d, %Y %H:%M') in page
+    assert 'Cancel this date' in page
+
+
+def test_cancelled_date_can_be_restored(logged_in, weekly_event):
+    event_id, start = weekly_event
+    response = logged_in.post(f'/events/{event_id}/occurrence',
+                              data={'original_start': start.isoformat(), 'action': 'cancel'}, follow_redirects=True)
+    assert response.status_code == 200
+    page = response.get_data(as_text=True)
+    assert 'Restore' in page
+    assert f'value="{start.isoformat()}"' in page
+
+
+def test_new_event(logged_in, app):
+    assert logged_in.get('/events/new').status_code == 200
+    response = logged_in.post('/events/new', data={
+        'title': 'Concert', 'description': 'Live music', 'location': 'Park',
+        'start_time': '2030-05-01T19:00', 'end_time': '2030-05-01T21:00',
+    })
+    assert response.status_code == 302
+    with app.app_context():
+        assert Event.query.filter_by(title='Concert').count() == 1
+
+
+def test_new_event_keeps_input_on_invalid_rule(logged_in):
+    response = logged_in.post('/events/new', data={
+        'title': 'Concert', 'description': 'Live music',
+        'start_time': '2030-05-01T19:00', 'end_time': '2030-05-01T21:00', 'rrule': 'FREQ=HOURLY',
+    })
+    assert response.status_code == 200
+    assert 'value="Concert"' in response.get_data(as_text=True)
+
+
+def add_one_off(app, user, title, start, end):
+    with app.app_context():
+        db.session.add(Event(title=title, description='-', start_time=start, end_time=end, user_id=user))
+        db.session.commit()
+
+
+def test_feed_returns_events_overlapping_the_window(app, client, user):
+    add_one_off(app, user, 'Festival', datetime(2030, 4, 20), datetime(2030, 5, 10))
+    add_one_off(app, user, 'Concert', datetime(2030, 5, 3, 19), datetime(2030, 5, 3, 21))
+    add_one_off(app, user, 'Old fair', datetime(2030, 1, 1), datetime(2030, 1, 2))
+    feed = client.get('/events/data?start=2030-05-01&end=2030-05-08').get_json()
+    assert [item['title'] for item in feed] == ['Festival', 'Concert']
+
+
+def test_feed_bounds_start_time_from_below(app, client, statements):
+    client.get('/events/data?start=2030-05-01&end=2030-05-08')
+    one_off = next(sql for sql, _ in statements if 'events.rrule IS NULL' in sql and 'count(' not in sql)
+    assert one_off.count('events.start_time >') == 1
+
+
+@pytest.mark.parametrize('end_time', ['2030-05-01T18:00', '2030-06-15T19:00'])
+def test_new_event_rejects_bad_durations(logged_in, app, end_time):
+    response = logged_in.post('/events/new', data={
+        'title': 'Concert', 'description': 'Live music',
+        'start_time': '2030-05-01T19:00', 'end_time': end_time,
+    })
+    assert response.status_code == 200
+    with app.app_context():
+        assert Event.query.count() == 0
+
+
+def test_feed_applies_cancelled_occurrences(logged_in, weekly_event):
+    event_id, start = weekly_event
+    window = f'start={start.date().isoformat()}&end={(start + timedelta(days=21)).date().isoformat()}'
+    before = [item['start'] for item in logged_in.get(f'/events/data?{window}').get_json()]
+    assert len(before) == 3
+    logged_in.post(f'/events/{event_id}/occurrence', data={
+        'original_start': (start + timedelta(days=7)).isoformat(), 'action': 'cancel'})
+    after = [item['start'] for item in logged_in.get(f'/events/data?{window}').get_json()]
+    assert after == [before[0], before[2]]
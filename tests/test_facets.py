@@ -0,0 +1,55 @@
+# tests/test_facets.py
+
+import pytest
+
+from app import db
+from app.listings import facets, tags
+from app.models import Category, Listing
+
+
+@pytest.fixture
+def catalogue(app, make_listings):
+    """Six 'Real Estate' listings priced 0..50 and two 'Services' ones priced 0 and 10."""
+    with app.app_context():
+        real_estate, services = (Category.query.filter_by(name=name).one().id for name in ('Real Estate', 'Services'))
+    homes = make_listings(6, category_id=real_estate)
+    jobs = make_listings(2, category_id=services)
+    with app.app_context():
+        for listing_id, raw in zip(homes, ('pets, garden', 'pets', 'garden', 'pets', '', '')):
+            tags.set_listing_tags(db.session.get(Listing, listing_id), raw)
+        db.session.commit()
+    return real_estate, services, homes, jobs
+
+
+def test_counts_for_every_facet(app, catalogue):
+    real_estate, services, _, _ = catalogue
+    with app.app_context():
+        result = facets.compute(Listing.query)
+        assert result.total == 8
+        assert [(c.id, c.count) for c in result.categories] == [(real_estate, 6), (services, 2)]
+        assert [(p.min, p.max, p.count) for p in result.prices] == [(0, 50, 7), (50, 100, 1)]
+        assert [(t.name, t.count) for t in result.tags] == [('pets', 3), ('garden', 2)]
+
+
+def test_counts_follow_the_filter_and_skip_required_tags(app, catalogue):
+    real_estate, _, _, _ = catalogue
+    with app.app_context():
+        query = tags.apply_filter(Listing.query.filter(Listing.category_id == real_estate),
+                                  tags.TagFilter(['pets'], [], []))
+        result = facets.compute(query, exclude_tags=['pets'])
+        assert result.total == 3
+        assert [(t.name, t.count) for t in result.tags] == [('garden', 1)]
+
+
+def test_cached_counts_are_dropped_when_a_listing_changes(app, catalogue):
+    _, _, homes, _ = catalogue
+    with app.app_context():
+        assert facets.compute(Listing.query).total == 8
+        db.session.delete(db.session.get(Listing, homes[0]))
+        db.session.commit()
+        assert facets.compute(Listing.query).total == 7
+
+
+def test_browse_page_shows_the_counts(client, catalogue):
+    html = client.get('/listings/all').get_data(as_text=True)
+    assert '8 listings found' in html
@@ -0,0 +1,75 @@
+# tests/test_forum.py
+
+import re
+from datetime import datetime, timedelta
+
+import pytest
+
+from app import db, pagination
+from app.models import ForumCategory, ForumComment, ForumPost, Listing
+
+
+@pytest.fixture
+def logged_in(client, user):
+    with client.session_transaction() as session:
+        session['_user_id'] = str(user)
+        session['_fresh'] = True
+    return client
+
+
+@pytest.fixture
+def forum_categories(app):
+    with app.app_context():
+        categories = [ForumCategory(name='General'), ForumCategory(name='Housing')]
+        db.session.add_all(categories)
+        db.session.commit()
+        return [category.id for category in categories]
+
+
+def test_new_thread_keeps_other_cached_counts(app, logged_in, forum_categories, make_listings):
+    general, housing = forum_categories
+    make_listings(3)
+    with app.app_context():
+        assert pagination.cached_count(Listing.query) == 3
+    assert '0 threads' in logged_in.get(f'/forum/category/{general}').get_data(as_text=True)
+
+    response = logged_in.post(f'/forum/new_post/{general}', data={'title': 'Hello', 'body': 'First post'})
+    assert response.status_code == 302
+
+    assert '1 thread' in logged_in.get(f'/forum/category/{general}').get_data(as_text=True)
+    assert '0 threads' in logged_in.get(f'/forum/category/{housing}').get_data(as_text=True)
+    # The listings count cached above was not thrown away by forum traffic.
+    assert any(key[0] == 'count' for key in pagination._count_cache)
+
+
+@pytest.mark.config(FORUM_COMMENT_PAGE_SIZE=3)
+def test_comment_permalink_lands_on_its_page(app, client, user, forum_categories):
+    general, _ = forum_categories
+    start = datetime(2026, 1, 1)
+    with app.app_context():
+        post = ForumPost(title='Hello', body='First post', user_id=user, category_id=general)
+        db.session.add(post)
+        db.session.flush()
+        # Two comments share a timestamp, so the id tie-break decides their page.
+        timestamps = [start, start + timedelta(minutes=1), start + timedelta(minutes=2), start + timedelta(minutes=2),
+                      start + timedelta(minutes=3), start + timedelta(minutes=4), start + timedelta(minutes=5)]
+        comments = [ForumComment(body=f'Comment {i}', user_id=user, post_id=post.id, timestamp=timestamp)
+                    for i, timestamp in enumerate(timestamps)]
+        db.session.add_all(comments)
+        db.session.commit()
+        post_id, comment_ids = post.id, [comment.id for comment in comments]
+
+    pages = []
+    for index, comment_id in enumerate(comment_ids):
+        response = client.get(f'/forum/comment/{comment_id}')
+        assert response.status_code == 302
+        location = response.headers['Location']
+        assert location.startswith(f'/forum/post/{post_id}') and location.endswith(f'#comment-{comment_id}')
+        assert ('after=' in location) == (index >= 3)
+        shown = re.findall(r'id="comment-(\d+)"', client.get(location).get_data(as_text=True))
+        assert str(comment_id) in shown
+        pages.append(tuple(shown))
+    # 7 comments at 3 per page: the same pages the "next" links walk through.
+    assert [len(set(pages[i:i + 3])) for i in (0, 3, 6)] == [1, 1, 1]
+    assert [len(page) for page in pages[::3]] == [3, 3, 1]
+    assert client.get('/forum/comment/999').status_code == 404
@@ -0,0 +1,54 @@
+# tests/test_geo.py
+
+import re
+
+import pytest
+
+from app import db, geo
+from app.models import Listing
+
+
+@pytest.fixture
+def places(app):
+    with app.app_context():
+        geo.seed_places()
+    yield
+    geo._forget_places()
+
+
+def listing_titles(client, url):
+    html = client.get(url).get_data(as_text=True)
+    return set(re.findall(r'alt="(Listing \d+)"', html)), html
+
+
+@pytest.fixture
+def spread_listings(app, places, make_listings):
+    # Listing 0 in El Centro, Listing 1 in Challuabamba (~8 km east); geocoded on save.
+    ids = make_listings(2)
+    with app.app_context():
+        for listing_id, location in zip(ids, ('El Centro', 'Challuabamba')):
+            db.session.get(Listing, listing_id).location = location
+        db.session.commit()
+
+
+def test_near_coordinates(client, spread_listings):
+    found, _ = listing_titles(client, '/listings/all?near=-2.8974,-79.0045&radius=2')
+    assert found == {'Listing 0'}
+    found, _ = listing_titles(client, '/listings/all?near=-2.8974,-79.0045&radius=10')
+    assert found == {'Listing 0', 'Listing 1'}
+
+
+def test_near_place_name(client, spread_listings):
+    found, _ = listing_titles(client, '/listings/all?near=challuabamba&radius=1')
+    assert found == {'Listing 1'}
+
+
+@pytest.mark.parametrize('near', ['Atlantis', '95,-79'])
+def test_unusable_near_shows_nothing_and_says_why(client, spread_listings, near):
+    found, html = listing_titles(client, f'/listings/all?near={near}')
+    assert found == set()
+    assert 'text-danger' in html
+
+
+def test_events_feed_rejects_unknown_place(client, places):
+    assert client.get('/events/data?near=Atlantis').status_code == 400
@@ -0,0 +1,67 @@
+# tests/test_indexes.py
+
+import pytest
+
+from app import db
+from app.models import Category, Message, Review, listing_tags
+
+
+def query_plan(statement, parameters=()):
+    with db.engine.connect() as connection:
+        rows = connection.exec_driver_sql(f'EXPLAIN QUERY PLAN {statement}', parameters).all()
+    return [row[-1] for row in rows]
+
+
+def assert_uses_index(plan, table):
+    details = [d for d in plan if f' {table} ' in f'{d} ' or d.endswith(f' {table}')]
+    assert details, f'{table} not in plan {plan}'
+    for detail in details:
+        assert 'INDEX' in detail or 'PRIMARY KEY' in detail, f'full scan of {table}: {plan}'
+
+
+def compiled(stmt):
+    compiled = stmt.compile(db.engine)
+    return str(compiled), tuple(compiled.params[name] for name in compiled.positiontup)
+
+
+@pytest.mark.parametrize('args', ['', '?category_id={category_id}', '?min_price=5&max_price=50'])
+def test_browse_page_query_uses_index(app, client, make_listings, statements, args):
+    make_listings(30)
+    with app.app_context():
+        category_id = Category.query.first().id
+    statements.clear()
+    assert client.get('/listings/all' + args.format(category_id=category_id)).status_code == 200
+
+    # The page itself: the SELECT ordered by the keyset columns.
+    pages = [(sql, params) for sql, params in statements
+             if sql.startswith('SELECT listings.') and 'ORDER BY listings.is_sponsored DESC' in sql]
+    assert pages
+    with app.app_context():
+        for sql, params in pages:
+            plan = query_plan(sql, params)
+            assert_uses_index(plan, 'listings')
+            if 'price' not in args:
+                # The index already returns rows in sort order.
+                assert not any('TEMP B-TREE FOR ORDER BY' in d for d in plan), plan
+
+
+def test_lookup_queries_use_indexes(app):
+    with app.app_context():
+        by_tag = db.select(listing_tags.c.listing_id).where(listing_tags.c.tag_id == 1)
+        assert_uses_index(query_plan(*compiled(by_tag)), 'listing_tags')
+
+        thread = db.select(Message.id).where(
+            Message.sender_id == 1, Message.listing_id == 2
+        ).order_by(Message.timestamp)
+        assert_uses_index(query_plan(*compiled(thread)), 'messages')
+
+        received = db.select(Message.id).where(
+            Message.recipient_id == 1, Message.listing_id == 2
+        ).order_by(Message.timestamp)
+        assert_uses_index(query_plan(*compiled(received)), 'messages')
+
+        for column in (Review.seller_id, Review.business_id):
+            reviews = db.select(Review.id).where(column == 1).order_by(Review.timestamp.desc())
+            plan = query_plan(*compiled(reviews))
+            assert_uses_index(plan, 'reviews')
+            assert not any('TEMP B-TREE' in d for d in plan), plan
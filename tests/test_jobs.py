@@ -0,0 +1,78 @@
+# tests/test_jobs.py
+
+from datetime import datetime, timedelta
+
+import pytest
+
+from app import db
+from app.jobs import scheduler
+from app.models import JobLock, User
+
+
+@pytest.fixture
+def counting_job(app):
+    """An exclusive job, due hourly, that counts its runs."""
+    runs = []
+
+    @scheduler.job('test-count', interval=3600)
+    def count():
+        runs.append(1)
+        return len(runs)
+
+    yield runs
+    del scheduler.jobs['test-count']
+
+
+def test_job_runs_once_per_interval(app, counting_job):
+    with app.app_context():
+        assert scheduler.run('test-count') == (True, 1)
+        # A second runner (or the next tick) finds the interval not yet elapsed.
+        assert scheduler.run('test-count') == (False, None)
+        assert 'test-count' not in scheduler.run_pending()
+    assert len(counting_job) == 1
+
+
+def test_held_lease_blocks_other_runners_until_it_expires(app, counting_job):
+    now = datetime.utcnow()
+    with app.app_context():
+        db.session.add(JobLock(name='test-count', locked_by='other', locked_until=now + timedelta(minutes=5)))
+        db.session.commit()
+        assert scheduler.run('test-count', force=True) == (False, None)
+
+        # The other runner died: once its lease has run out the job is free again.
+        db.session.get(JobLock, 'test-count').locked_until = now - timedelta(seconds=1)
+        db.session.commit()
+        assert scheduler.run('test-count', force=True) == (True, 1)
+        lock = db.session.get(JobLock, 'test-count')
+        db.session.refresh(lock)
+        assert lock.locked_by is None and lock.last_finished_at is not None
+
+
+def test_failed_job_releases_its_lease(app):
+    @scheduler.job('test-fail', interval=3600)
+    def fail():
+        raise RuntimeError('boom')
+
+    try:
+        with app.app_context():
+            assert 'test-fail' not in scheduler.run_pending()
+            lock = db.session.get(JobLock, 'test-fail')
+            assert lock.locked_by is None
+            assert 'boom' in lock.last_error
+    finally:
+        del scheduler.jobs['test-fail']
+
+
+@pytest.mark.config(JOBS_BATCH_SIZE=2)
+def test_expire_subscriptions_in_batches(app):
+    now = datetime.utcnow()
+    with app.app_context():
+        db.session.add_all(
+            User(username=f'user{i}', email=f'user{i}@example.com', subscription_status='premium',
+                 subscription_end_date=now + timedelta(days=1 if i == 4 else -1))
+            for i in range(5)
+        )
+        db.session.commit()
+        ran, expired = scheduler.run('expire-subscriptions', force=True)
+        assert (ran, expired) == (True, 4)
+        assert User.query.filter_by(subscription_status='premium').count() == 1
@@ -0,0 +1,137 @@
+# tests/test_messages.py
+
+import threading
+import time
+
+import pytest
+
+from app import db
+from app.messages import inbox
+from app.messages.broker import NotificationBroker
+from app.models import Conversation, User
+
+
+@pytest.fixture
+def buyer(app):
+    with app.app_context():
+        user = User(username='buyer', email='buyer@example.com')
+        user.set_password('secret')
+        db.session.add(user)
+        db.session.commit()
+        return user.id
+
+
+@pytest.fixture
+def thread(user, buyer, make_listings):
+    """(listing_id, seller_id, buyer_id) for a listing by `user`."""
+    listing_id, = make_listings(1)
+    return listing_id, user, buyer
+
+
+def send(client, login, sender, listing_id, recipient, body):
+    login(sender)
+    response = client.post(f'/messages/send/{listing_id}/{recipient}', data={'body': body})
+    assert response.status_code == 302
+
+
+def unread(app, thread, user_id):
+    listing_id, seller, buyer = thread
+    with app.app_context():
+        return inbox.find(listing_id, seller, buyer).unread_for(user_id)
+
+
+def test_sends_upsert_one_conversation_row(app, client, login, thread):
+    listing_id, seller, buyer = thread
+    send(client, login, buyer, listing_id, seller, 'Is it still available?')
+    send(client, login, buyer, listing_id, seller, 'Hello?')
+    assert unread(app, thread, seller) == 2
+    assert unread(app, thread, buyer) == 0
+
+    # Replying means the seller has read the thread; the buyer has one unread.
+    send(client, login, seller, listing_id, buyer, 'Yes it is')
+    assert (unread(app, thread, seller), unread(app, thread, buyer)) == (0, 1)
+    with app.app_context():
+        conversation = Conversation.query.one()
+        assert (conversation.user_a_id, conversation.user_b_id) == tuple(sorted((seller, buyer)))
+        assert conversation.last_message.body == 'Yes it is'
+
+
+def test_opening_the_conversation_resets_unread(app, client, login, thread):
+    listing_id, seller, buyer = thread
+    send(client, login, buyer, listing_id, seller, 'Hi')
+    login(seller)
+    assert client.get(f'/messages/conversation/{listing_id}/{buyer}').status_code == 200
+    assert unread(app, thread, seller) == 0
+
+
+def test_inbox_lists_threads_by_recency(app, client, login, thread, make_listings):
+    listing_id, seller, buyer = thread
+    other_listing, = make_listings(1)
+    send(client, login, buyer, listing_id, seller, 'First thread')
+    send(client, login, buyer, other_listing, seller, 'Second thread')
+    with app.app_context():
+        threads = inbox.for_user(seller).order_by(Conversation.last_message_at.desc(), Conversation.id.desc()).all()
+        assert [c.listing_id for c in threads] == [other_listing, listing_id]
+
+
+def test_rebuild_recreates_the_rows(app, client, login, thread):
+    listing_id, seller, buyer = thread
+    send(client, login, buyer, listing_id, seller, 'Hi')
+    send(client, login, seller, listing_id, buyer, 'Hello')
+    with app.app_context():
+        before = [(c.listing_id, c.user_a_id, c.user_b_id, c.last_message_id) for c in Conversation.query]
+        assert inbox.rebuild() == 1
+        after = [(c.listing_id, c.user_a_id, c.user_b_id, c.last_message_id) for c in Conversation.query]
+        assert after == before
+
+
+# --- Long poll ---
+
+def test_broker_wakes_only_newer_publishes_on_the_key():
+    broker = NotificationBroker()
+    token = broker.token('a')
+    assert broker.wait('a', token, 0.01) is False
+    broker.publish('b')
+    assert broker.wait('a', token, 0.01) is False
+    # Published between token() and wait(): returns at once, nothing is missed.
+    broker.publish('a')
+    assert broker.wait('a', token, 5) is True
+    assert broker.wait('a', broker.token('a'), 0.01) is False
+
+
+def test_poll_returns_as_soon_as_a_message_is_sent(app, client, login, thread):
+    listing_id, seller, buyer = thread
+    send(client, login, buyer, listing_id, seller, 'First')
+    login(seller)
+    first = client.get(f'/messages/conversation/{listing_id}/{buyer}/poll?after_id=0&timeout=0').get_json()
+    assert [m['body'] for m in first['messages']] == ['First']
+
+    result = {}
+    poller = app.test_client()
+    with poller.session_transaction() as session:
+        session['_user_id'] = str(seller)
+        session['_fresh'] = True
+
+    def poll():
+        started = time.monotonic()
+        result['json'] = poller.get(
+            f'/messages/conversation/{listing_id}/{buyer}/poll?after_id={first["last_id"]}&timeout=10').get_json()
+        result['waited'] = time.monotonic() - started
+
+    poller_thread = threading.Thread(target=poll)
+    poller_thread.start()
+    time.sleep(0.3)
+    assert poller_thread.is_alive()   # nothing new yet: the poll is waiting
+    send(client, login, buyer, listing_id, seller, 'Second')
+    poller_thread.join(10)
+    assert [m['body'] for m in result['json']['messages']] == ['Second']
+    assert result['waited'] < 5
+
+
+def test_poll_times_out_empty(client, login, thread):
+    listing_id, seller, buyer = thread
+    login(seller)
+    started = time.monotonic()
+    response = client.get(f'/messages/conversation/{listing_id}/{buyer}/poll?after_id=0&timeout=0.2').get_json()
+    assert response == {'messages': [], 'last_id': 0}
+    assert time.monotonic() - started >= 0.2
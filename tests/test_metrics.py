@@ -0,0 +1,43 @@
+# tests/test_metrics.py
+
+import pytest
+
+from app import db
+from app.models import Role, User
+
+
+@pytest.fixture
+def admin(app, user):
+    with app.app_context():
+        account = db.session.get(User, user)
+        account.roles.append(Role.query.filter_by(name='admin').one())
+        db.session.commit()
+    return user
+
+
+def test_anonymous_and_plain_users_are_refused(client, login, user):
+    assert client.get('/metrics').status_code == 403
+    login(user)
+    assert client.get('/metrics').status_code == 403
+
+
+def test_admins_see_the_metrics(client, login, admin):
+    client.get('/listings/all')
+    login(admin)
+    response = client.get('/metrics')
+    assert response.status_code == 200 and response.mimetype == 'text/plain'
+    text = response.get_data(as_text=True)
+    assert 'http_requests_total{endpoint="listings.all_listings",status="200"}' in text
+    assert 'db_statements_per_request_count{endpoint="listings.all_listings"}' in text
+
+
+@pytest.mark.config(METRICS_TOKEN='s3cret')
+def test_scrapers_need_the_token(client):
+    assert client.get('/metrics', headers={'Authorization': 'Bearer s3cret'}).status_code == 200
+    assert client.get('/metrics', headers={'Authorization': 'Bearer wrong'}).status_code == 403
+    assert client.get('/metrics', headers={'Authorization': 's3cret'}).status_code == 403
+
+
+def test_no_token_configured_means_no_token_access(client):
+    assert client.get('/metrics', headers={'Authorization': 'Bearer '}).status_code == 403
+    assert client.get('/metrics', headers={'Authorization': 'Bearer None'}).status_code == 403
@@ -0,0 +1,118 @@
+# tests/test_notifications.py
+
+from datetime import datetime, timedelta
+
+import pytest
+
+from app import db
+from app.models import Notification, NotificationDelivery, User
+from app.notifications.outbox import enqueue, outbox_worker
+
+
+class FakeMailer:
+    name = 'fake'
+
+    def __init__(self):
+        self.sent = []
+        self.fail = False
+
+    def send(self, message):
+        if self.fail:
+            raise OSError('mail server down')
+        self.sent.append(message)
+
+
+@pytest.fixture
+def mailer(app):
+    fake = FakeMailer()
+    outbox_worker._mailer = fake
+    yield fake
+    outbox_worker._mailer = None
+
+
+@pytest.fixture
+def recipient(app):
+    with app.app_context():
+        user = User(username='reader', email='reader@example.com')
+        db.session.add(user)
+        db.session.commit()
+        return user.id
+
+
+def queue(app, recipient, *summaries, age=timedelta(0)):
+    with app.app_context():
+        for summary in summaries:
+            notification = enqueue(recipient, 'test', summary, url='/somewhere')
+            notification.created_at = datetime.utcnow() - age
+        db.session.commit()
+
+
+def statuses(app):
+    with app.app_context():
+        return [(n.status, n.attempts) for n in Notification.query.order_by(Notification.id)]
+
+
+def test_burst_goes_out_as_one_digest_after_the_delay(app, mailer, recipient):
+    queue(app, recipient, 'First', 'Second')
+    with app.app_context():
+        # Younger than NOTIFICATION_DIGEST_DELAY: held back.
+        assert tuple(outbox_worker.drain()) == (0, 0, 0)
+        assert tuple(outbox_worker.drain(flush=True)) == (1, 2, 0)
+        delivery = NotificationDelivery.query.one()
+        assert (delivery.notification_count, delivery.subject) == (2, '2 new notifications')
+    assert statuses(app) == [('sent', 0), ('sent', 0)]
+    assert len(mailer.sent) == 1 and '- Second' in mailer.sent[0].get_content()
+
+
+def test_old_enough_rows_are_sent_without_flush(app, mailer, recipient):
+    queue(app, recipient, 'Hello', age=timedelta(seconds=app.config['NOTIFICATION_DIGEST_DELAY'] + 1))
+    with app.app_context():
+        assert tuple(outbox_worker.drain()) == (1, 1, 0)
+    assert mailer.sent[0]['Subject'] == 'Hello'
+
+
+def test_leased_rows_wait_for_the_lease_to_expire(app, mailer, recipient):
+    queue(app, recipient, 'Hello')
+    with app.app_context():
+        notification = Notification.query.one()
+        notification.claimed_by, notification.claimed_until = 'other', datetime.utcnow() + timedelta(minutes=5)
+        db.session.commit()
+        assert tuple(outbox_worker.drain(flush=True)) == (0, 0, 0)
+
+        # The other worker died; its lease runs out and the row is delivered once.
+        notification.claimed_until = datetime.utcnow() - timedelta(seconds=1)
+        db.session.commit()
+        assert tuple(outbox_worker.drain(flush=True)) == (1, 1, 0)
+        assert tuple(outbox_worker.drain(flush=True)) == (0, 0, 0)
+    assert len(mailer.sent) == 1
+
+
+@pytest.mark.config(NOTIFICATION_MAX_ATTEMPTS=2)
+def test_failed_sends_back_off_then_fail(app, mailer, recipient):
+    mailer.fail = True
+    queue(app, recipient, 'Hello')
+    with app.app_context():
+        assert tuple(outbox_worker.drain(flush=True)) == (0, 0, 1)
+        notification = Notification.query.one()
+        assert notification.next_attempt_at > datetime.utcnow()
+        assert 'mail server down' in notification.last_error
+        # Not due again until the backoff has passed.
+        assert tuple(outbox_worker.drain(flush=True)) == (0, 0, 0)
+
+        notification.next_attempt_at = datetime.utcnow() - timedelta(seconds=1)
+        db.session.commit()
+        assert tuple(outbox_worker.drain(flush=True)) == (0, 0, 1)
+    assert statuses(app) == [('failed', 2)]
+
+
+def test_nothing_is_queued_for_your_own_actions(app, recipient):
+    with app.app_context():
+        assert enqueue(recipient, 'test', 'Hello', actor_id=recipient) is None
+
+
+def test_message_notification_leaves_out_the_body(app, client, login, user, recipient, make_listings):
+    listing_id, = make_listings(1)
+    login(recipient)
+    client.post(f'/messages/send/{listing_id}/{user}', data={'body': 'My phone number is 555-0100'})
+    with app.app_context():
+        assert Notification.query.one().summary == 'New message from reader'
@@ -0,0 +1,67 @@
+# tests/test_pagination.py
+
+import re
+from datetime import datetime
+
+LISTING_LINK = re.compile(r'href="/listings/(\d+)"')
+NEXT_LINK = re.compile(r'href="([^"]*[?&]after=[^"]*)"')
+
+
+def walk_pages(client, url, limit=50):
+    """Follow "Next" from url; returns the listing ids of each page in order."""
+    pages = []
+    while url and len(pages) < limit:
+        response = client.get(url)
+        assert response.status_code == 200
+        html = response.get_data(as_text=True)
+        # Each card links to its listing twice (title and button).
+        pages.append(list(dict.fromkeys(int(i) for i in LISTING_LINK.findall(html))))
+        match = NEXT_LINK.search(html)
+        url = match.group(1).replace('&amp;', '&') if match else None
+    assert url is None, 'pagination did not end'
+    return pages
+
+
+def test_next_pages_have_no_duplicates_or_gaps(client, make_listings):
+    # Created through the ORM in one go, so many share the same second.
+    ids = make_listings(30)
+    pages = walk_pages(client, '/listings/all')
+    seen = [i for page in pages for i in page]
+    assert [len(page) for page in pages] == [12, 12, 6]
+    assert seen == sorted(ids, reverse=True)
+
+
+def test_next_pages_break_created_at_ties_by_id(client, make_listings):
+    ids = make_listings(30, created_at=datetime(2026, 1, 1, 12, 0, 0))
+    pages = walk_pages(client, '/listings/all')
+    assert [i for page in pages for i in page] == sorted(ids, reverse=True)
+
+
+def test_business_reviews_are_paged_with_their_authors(app, client, user, statements):
+    from app import db
+    from app.models import Business, BusinessCategory, Review, User
+
+    with app.app_context():
+        business = Business(name='Bakery', description='Bread', category=BusinessCategory(name='Food'), user_id=user)
+        reviewers = [User(username=f'reviewer{i}', email=f'reviewer{i}@example.com') for i in range(25)]
+        db.session.add_all([business, *reviewers])
+        db.session.flush()
+        db.session.add_all(
+            Review(rating=5, comment=f'Review {i}', user_id=reviewer.id, business_id=business.id,
+                   timestamp=datetime(2026, 1, 1, 12, 0, 0))
+            for i, reviewer in enumerate(reviewers)
+        )
+        db.session.commit()
+        url = f'/directory/business/{business.id}'
+
+    seen = []
+    while url:
+        del statements[:]
+        html = client.get(url).get_data(as_text=True)
+        seen.append(re.findall(r'<p>Review (\d+)</p>', html))
+        # business, one page of reviews joined to their authors, the current user at most
+        assert len(statements) <= 3
+        match = NEXT_LINK.search(html)
+        url = match.group(1).replace('&amp;', '&') if match else None
+    assert [len(page) for page in seen] == [10, 10, 5]
+    assert sorted(int(i) for page in seen for i in page) == list(range(25))
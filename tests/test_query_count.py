@@ -0,0 +1,48 @@
+# tests/test_query_count.py
+
+import logging
+
+import pytest
+
+from app.pagination import clear_count_cache
+from app.query_counter import query_counter
+
+pytestmark = pytest.mark.config(QUERY_COUNTER_ENABLED=True)
+
+# The page SELECT (author and category joined in) plus one selectinload for
+# the tags of the whole page. Facet counts and categories are cached.
+LISTINGS_PAGE_QUERIES = 2
+
+
+def query_count(response):
+    assert response.status_code == 200
+    return int(response.headers['X-Query-Count'])
+
+
+def test_listing_page_query_count_is_pinned(client, make_listings):
+    make_listings(30)
+    client.get('/listings/all')   # fill the facet and reference data caches
+    first = client.get('/listings/all')
+    assert query_count(first) == LISTINGS_PAGE_QUERIES
+    html = first.get_data(as_text=True)
+    assert html.count('View Details') == 12
+
+
+def test_query_count_does_not_grow_with_page_size(client, make_listings):
+    make_listings(18)
+    client.get('/listings/all')
+    full = query_count(client.get('/listings/all'))                 # 12 listings
+    short = query_count(client.get('/listings/all?min_price=100'))  # 6 listings, cold facets
+    client.get('/listings/all?min_price=100')
+    assert query_count(client.get('/listings/all?min_price=100')) == full
+    assert short >= full
+
+
+def test_cache_miss_on_bigger_page_is_not_reported(client, make_listings, caplog):
+    make_listings(30)
+    client.get('/listings/all?min_price=250')   # 5 listings
+    clear_count_cache()
+    with caplog.at_level(logging.WARNING):
+        client.get('/listings/all')             # 12 listings, facet cache miss
+    assert not [r for r in caplog.records if 'grows with result size' in r.getMessage()]
+    assert query_counter.samples('listings.all_listings')
@@ -0,0 +1,97 @@
+# tests/test_recurrence.py
+
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.events import recurrence
+from app.models import Event, EventException
+
+HOUR = timedelta(hours=1)
+
+
+def starts(rrule, dtstart, window_start, window_end, duration=HOUR):
+    rule = recurrence.parse_rrule(rrule)
+    end = recurrence.series_end(dtstart, duration, rule)
+    last_start = None if end == recurrence.FOREVER else end - duration
+    return list(recurrence.expand(dtstart, duration, rule, window_start, window_end, last_start))
+
+
+def test_weekly_by_day():
+    found = starts('FREQ=WEEKLY;BYDAY=SA', datetime(2030, 1, 5, 10), datetime(2030, 2, 1), datetime(2030, 3, 1))
+    assert [d.day for d in found] == [2, 9, 16, 23]
+    assert all(d.hour == 10 for d in found)
+
+
+def test_window_far_from_dtstart():
+    # Jumps straight to the window; a series started decades ago still lands on Saturdays.
+    found = starts('FREQ=WEEKLY;BYDAY=SA', datetime(2000, 1, 1, 10), datetime(2030, 2, 1), datetime(2030, 2, 10))
+    assert found == [datetime(2030, 2, 2, 10), datetime(2030, 2, 9, 10)]
+
+
+def test_monthly_last_friday():
+    found = starts('FREQ=MONTHLY;BYDAY=-1FR', datetime(2030, 1, 1, 18), datetime(2030, 1, 1), datetime(2030, 4, 1))
+    assert [(d.month, d.day) for d in found] == [(1, 25), (2, 22), (3, 29)]
+
+
+def test_monthly_by_month_day_skips_short_months():
+    found = starts('FREQ=MONTHLY;BYMONTHDAY=31', datetime(2030, 1, 31, 9), datetime(2030, 1, 1), datetime(2030, 6, 1))
+    assert [d.month for d in found] == [1, 3, 5]
+
+
+def test_count_and_until_end_the_series():
+    dtstart = datetime(2030, 1, 1, 9)
+    assert len(starts('FREQ=DAILY;COUNT=3', dtstart, dtstart, dtstart + timedelta(days=30))) == 3
+    # A date-only UNTIL includes that whole day.
+    found = starts('FREQ=DAILY;UNTIL=20300105', dtstart, dtstart, dtstart + timedelta(days=30))
+    assert found[-1] == datetime(2030, 1, 5, 9)
+
+
+def test_occurrence_overlapping_window_start_is_included():
+    found = starts('FREQ=DAILY', datetime(2030, 1, 1, 22), datetime(2030, 1, 3), datetime(2030, 1, 4), duration=4 * HOUR)
+    assert found == [datetime(2030, 1, 2, 22), datetime(2030, 1, 3, 22)]
+
+
+@pytest.mark.parametrize('rrule', [
+    '', 'FREQ=HOURLY', 'FREQ=DAILY;INTERVAL=0', 'FREQ=DAILY;COUNT=2;UNTIL=20300101',
+    'FREQ=WEEKLY;BYDAY=1SA', 'FREQ=WEEKLY;BYMONTHDAY=1', 'FREQ=DAILY;BYSETPOS=1', 'FREQ=MONTHLY;BYMONTHDAY=0',
+])
+def test_rejects_unsupported_rules(rrule):
+    with pytest.raises(ValueError):
+        recurrence.parse_rrule(rrule)
+
+
+def weekly_event():
+    return Event(title='Market', location='Square', rrule='FREQ=WEEKLY',
+                 start_time=datetime(2030, 1, 5, 10), end_time=datetime(2030, 1, 5, 13))
+
+
+def test_exceptions_cancel_and_move_occurrences():
+    event = weekly_event()
+    exceptions = [
+        EventException(original_start=datetime(2030, 1, 12, 10), is_cancelled=True),
+        # The 19th moves to the afternoon, somewhere else.
+        EventException(original_start=datetime(2030, 1, 19, 10), is_cancelled=False,
+                       start_time=datetime(2030, 1, 19, 15), location='Park'),
+    ]
+    found = recurrence.occurrences(event, datetime(2030, 1, 1), datetime(2030, 1, 27), exceptions)
+    assert [(o.start, o.end, o.location) for o in found] == [
+        (datetime(2030, 1, 5, 10), datetime(2030, 1, 5, 13), 'Square'),
+        (datetime(2030, 1, 19, 15), datetime(2030, 1, 19, 18), 'Park'),
+        (datetime(2030, 1, 26, 10), datetime(2030, 1, 26, 13), 'Square'),
+    ]
+
+
+def test_override_moved_into_the_window_is_included():
+    event = weekly_event()
+    moved = EventException(original_start=datetime(2030, 1, 26, 10), is_cancelled=False,
+                           start_time=datetime(2030, 1, 22, 10), end_time=datetime(2030, 1, 22, 12))
+    found = recurrence.occurrences(event, datetime(2030, 1, 20), datetime(2030, 1, 25), [moved])
+    assert [(o.original_start, o.start) for o in found] == [(datetime(2030, 1, 26, 10), datetime(2030, 1, 22, 10))]
+
+
+def test_is_occurrence():
+    event = weekly_event()
+    event.recurrence_end = recurrence.FOREVER
+    assert recurrence.is_occurrence(event, datetime(2030, 3, 2, 10))
+    assert not recurrence.is_occurrence(event, datetime(2030, 3, 2, 11))
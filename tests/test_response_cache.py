@@ -0,0 +1,48 @@
+# tests/test_response_cache.py
+
+import pytest
+
+from app.response_cache import response_cache
+
+pytestmark = pytest.mark.config(RESPONSE_CACHE_BACKEND='memory')
+
+
+@pytest.fixture
+def cache(app):
+    yield response_cache
+    response_cache.clear()
+
+
+def test_second_visit_is_served_from_the_cache(client, cache, make_listings):
+    make_listings(2)
+    first = client.get('/listings/all')
+    assert first.headers['X-Cache'] == 'MISS' and first.headers['ETag']
+    second = client.get('/listings/all')
+    assert second.headers['X-Cache'] == 'HIT'
+    assert second.get_data() == first.get_data()
+    # Empty query args share the entry.
+    assert client.get('/listings/all?q=&category_id=').headers['X-Cache'] == 'HIT'
+    assert client.get('/listings/all?q=listing').headers['X-Cache'] == 'MISS'
+
+
+def test_matching_etag_gets_304(client, cache):
+    etag = client.get('/listings/all').headers['ETag']
+    response = client.get('/listings/all', headers={'If-None-Match': etag})
+    assert response.status_code == 304 and not response.get_data()
+    assert client.get('/listings/all', headers={'If-None-Match': '"stale"'}).status_code == 200
+
+
+def test_listing_write_drops_the_tagged_pages(client, cache, make_listings):
+    make_listings(1)
+    before = client.get('/listings/all')
+    assert client.get('/').headers['X-Cache'] == 'MISS'
+    make_listings(1)
+    after = client.get('/listings/all')
+    assert after.headers['X-Cache'] == 'MISS' and after.headers['ETag'] != before.headers['ETag']
+    assert client.get('/').headers['X-Cache'] == 'MISS'
+
+
+def test_logged_in_visitors_bypass_the_cache(client, cache, login, user):
+    client.get('/listings/all')
+    login(user)
+    assert 'X-Cache' not in client.get('/listings/all').headers
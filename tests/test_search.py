@@ -0,0 +1,70 @@
+# tests/test_search.py
+
+import pytest
+
+from app import db
+from app.directory import search as directory_search
+from app.listings import search as listing_search
+from app.models import Business, BusinessCategory, Listing
+
+
+@pytest.fixture
+def fts(app):
+    with app.app_context():
+        listing_search.rebuild_index()
+        directory_search.rebuild_index()
+    yield
+    # The next test's in-memory database has no FTS tables.
+    for module in (listing_search, directory_search):
+        module.index.exists.forget()
+
+
+def test_listing_writes_keep_the_index_in_sync(app, fts, make_listings):
+    listing_id, = make_listings(1, location='El Centro')
+    with app.app_context():
+        base = Listing.query
+        assert listing_search.search(base, 'centro')[0].count() == 1
+        listing = db.session.get(Listing, listing_id)
+        listing.title = 'Café con leche'
+        db.session.commit()
+        assert listing_search.search(base, 'cafe')[0].one().id == listing_id
+        db.session.delete(listing)
+        db.session.commit()
+        assert listing_search.search(base, 'cafe')[0].count() == 0
+
+
+def test_directory_ranks_name_hits_first(app, fts, user, client):
+    with app.app_context():
+        category = BusinessCategory(name='Food')
+        db.session.add_all([
+            Business(name='Corner shop', description='Fresh bread from the bakery', category=category, user_id=user),
+            Business(name='Bakery Sol', description='Cakes', category=category, user_id=user),
+        ])
+        db.session.commit()
+        query, rank = directory_search.search(Business.query, 'baker')
+        assert [b.name for b in query.order_by(rank)] == ['Bakery Sol', 'Corner shop']
+    html = client.get('/directory/?q=baker').get_data(as_text=True)
+    assert html.index('Bakery Sol') < html.index('Corner shop')
+
+
+def test_like_fallback_without_the_fts_table(app, make_listings):
+    make_listings(2)
+    with app.app_context():
+        query, rank = listing_search.search(Listing.query, 'Listing 1')
+        assert rank is None
+        assert [listing.title for listing in query] == ['Listing 1']
+
+
+def test_index_created_after_startup_is_picked_up(app, make_listings, monkeypatch):
+    index = listing_search.index
+    with app.app_context():
+        assert not listing_search.is_enabled()
+        # Another process (the migration) creates the table; the missing answer expires.
+        with db.engine.begin() as connection:
+            connection.exec_driver_sql(index.create_sql)
+        monkeypatch.setattr(index.exists, 'recheck_interval', 0)
+        try:
+            make_listings(1, location='El Centro')
+            assert listing_search.search(Listing.query, 'centro')[0].count() == 1
+        finally:
+            index.exists.forget()
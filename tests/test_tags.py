@@ -0,0 +1,80 @@
+# tests/test_tags.py
+
+import pytest
+from werkzeug.datastructures import MultiDict
+
+from app import db
+from app.listings import tags
+from app.models import Listing, Tag
+
+
+@pytest.mark.parametrize('raw, names', [
+    ('Pet  Friendly, pet friendly, Pét friendly', ['pet friendly']),
+    (' Furnished ,, NEW ,', ['furnished', 'new']),
+    ('Straße', ['strasse']),
+    ('', []),
+])
+def test_parse_normalises_and_deduplicates(raw, names):
+    assert tags.parse(raw) == names
+
+
+def test_normalize_truncates_long_names():
+    assert len(tags.normalize('x' * 200)) == tags.MAX_TAG_LENGTH
+
+
+def test_set_listing_tags_writes_only_the_difference(app, make_listings, statements):
+    listing_id, = make_listings(1)
+    with app.app_context():
+        listing = db.session.get(Listing, listing_id)
+        added, removed = tags.set_listing_tags(listing, 'garden, Pets, parking')
+        db.session.commit()
+        assert (len(added), removed) == (3, set())
+        assert sorted(tag.name for tag in listing.tags) == ['garden', 'parking', 'pets']
+
+        del statements[:]
+        added, removed = tags.set_listing_tags(listing, 'pets, parking, Wifi')
+        db.session.commit()
+        assert len(added) == len(removed) == 1
+        assert sorted(tag.name for tag in listing.tags) == ['parking', 'pets', 'wifi']
+        # One INSERT for the new tag, one DELETE and one INSERT for the links.
+        writes = [sql for sql, _ in statements if sql.startswith(('INSERT', 'DELETE'))]
+        assert len(writes) == 3
+
+        # Unchanged input writes nothing.
+        del statements[:]
+        assert tags.set_listing_tags(listing, 'Parking, pets, wifi') == (set(), set())
+        assert not [sql for sql, _ in statements if sql.startswith(('INSERT', 'DELETE'))]
+
+
+def test_resolve_reuses_existing_tags(app):
+    with app.app_context():
+        first = tags.resolve(['garden'], create=True)
+        db.session.commit()
+        assert tags.resolve(['garden', 'missing'], create=False) == first
+        assert Tag.query.count() == 1
+
+@pytest.fixture
+def tagged(app, make_listings):
+    """Listings 0-3 tagged so every filter below has a distinct answer."""
+    ids = make_listings(4)
+    with app.app_context():
+        for listing_id, raw in zip(ids, ('pets, garden', 'pets', 'garden, parking', '')):
+            tags.set_listing_tags(db.session.get(Listing, listing_id), raw)
+        db.session.commit()
+    return ids
+
+
+@pytest.mark.parametrize('args, expected', [
+    ({'tags': 'pets,garden'}, [0]),
+    ({'tags': 'pets'}, [0, 1]),
+    ({'tags_any': 'garden,parking'}, [0, 2]),
+    ({'tags_not': 'pets'}, [2, 3]),
+    ({'tags': 'garden', 'tags_not': 'parking'}, [0]),
+    ({'tags': 'unknown'}, []),
+    ({'tags_any': 'unknown'}, []),
+    ({'tags_not': 'unknown'}, [0, 1, 2, 3]),
+])
+def test_apply_filter(app, tagged, args, expected):
+    with app.app_context():
+        query = tags.apply_filter(Listing.query, tags.parse_filter(MultiDict(args)))
+        assert sorted(listing.id for listing in query) == [tagged[i] for i in expected]